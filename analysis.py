@@ -0,0 +1,214 @@
+# Whole program analyses the optimization passes are based on
+from typing import Dict, List, Set
+
+from astnodes import AST, Assign, Block, Var, Compound, Condition, NoOp, Program, ProcedureDecl, FunctionDecl, ProcedureCall, FunctionCall, children, \
+    declared_variables
+
+
+def routine_declarations(block: Block):
+    return [declaration for declaration in block.declarations
+            if isinstance(declaration, (ProcedureDecl, FunctionDecl))]
+
+
+def calls(node: AST):
+    """Generate the procedure and function calls in node."""
+    # walk iteratively, statement lists and expressions can be long
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ProcedureCall, FunctionCall)):
+            yield node
+        stack.extend(children(node))
+
+
+def call_name(node: AST) -> str:
+    return node.proc_name if isinstance(node, ProcedureCall) else node.func_name
+
+
+def identifiers(node: AST) -> Set[str]:
+    """Return every name declared or used in node."""
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Var):
+            names.add(node.name)
+        elif isinstance(node, (ProcedureDecl, FunctionDecl)):
+            names.add(node.token.value)
+        elif isinstance(node, (ProcedureCall, FunctionCall)):
+            names.add(call_name(node))
+        stack.extend(children(node))
+    return names
+
+
+def used_names(node: AST) -> Set[str]:
+    """Return the names of the variables read or assigned in node."""
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Var):
+            names.add(node.name)
+        stack.extend(children(node))
+    return names
+
+
+def local_names(routine: AST) -> Set[str]:
+    """Return the names of the parameters and variables of a routine, and of a function's result."""
+    names = {param.var_node.name for param in routine.params}
+    names.update(declared_variables(routine.block))
+    if isinstance(routine, FunctionDecl):
+        names.add(routine.token.value)
+    return names
+
+
+def assigned_names(node: AST) -> Set[str]:
+    """Return the names of the variables assigned in the statements of node."""
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Assign):
+            names.add(node.left.name)
+        stack.extend(children(node))
+    return names
+
+
+def tail_statements(node: AST):
+    """Generate the statements of node after which nothing else runs."""
+    if isinstance(node, Compound):
+        for child in reversed(node.childrens):
+            if not isinstance(child, NoOp):
+                yield from tail_statements(child)
+                return
+    elif isinstance(node, Condition):
+        yield from tail_statements(node.then_node.child)
+        if node.else_node is not None:
+            yield from tail_statements(node.else_node.child)
+    else:
+        yield node
+
+
+def mark_tail_calls(program: Program):
+    """Mark the calls a routine makes to itself as its last statement, in a checked program.
+
+    A function calls itself last when its last statement assigns it the
+    result of the call: f := f(n - 1, acc).
+    """
+    pending = [(program.block, 1)]
+    while pending:
+        block, level = pending.pop()
+        for routine in routine_declarations(block):
+            for statement in tail_statements(routine.block.compound_statement):
+                if isinstance(routine, ProcedureDecl):
+                    call = statement if isinstance(statement, ProcedureCall) else None
+                elif (isinstance(statement, Assign) and statement.left.name == routine.token.value
+                      and isinstance(statement.right, FunctionCall)):
+                    call = statement.right
+                else:
+                    call = None
+                # the routine itself is declared in the slot the call resolved to
+                if call is not None and (call.scope_level, call.slot) == (level, routine.slot):
+                    call.tail = True
+            pending.append((routine.block, level + 1))
+
+
+class CallGraph(object):
+    """
+    CallGraph maps the program and every procedure and function
+    declaration to the declarations it calls, the called names are
+    resolved in the lexical scopes as the semantic analyzer does.
+    The body of a routine is only walked when its calls are asked for
+    """
+
+    def __init__(self, program: Program):
+        self.program = program
+        # caller declaration -> routines visible from its body, innermost scope last
+        self.scopes: Dict[AST, List[Dict[str, AST]]] = {}
+        # caller declaration -> called declarations, the program is a caller too
+        self._calls: Dict[AST, Set[AST]] = {}
+        # routine declaration -> names it may assign, see assigned()
+        self._assigned: Dict[AST, Set[str]] = {}
+        self.add_scopes(program, program.block, [])
+
+    def add_scopes(self, owner: AST, block: Block, enclosing: List[Dict[str, AST]]):
+        routines = routine_declarations(block)
+        scopes = enclosing + [{routine.token.value: routine for routine in routines}]
+        self.scopes[owner] = scopes
+        for routine in routines:
+            self.add_scopes(routine, routine.block, scopes)
+
+    def callees(self, owner: AST) -> Set[AST]:
+        """Return the declarations called from the body of owner."""
+        called = self._calls.get(owner)
+        if called is None:
+            called = self._calls[owner] = set()
+            scopes = self.scopes[owner]
+            for call in calls(owner.block.compound_statement):
+                callee = self.resolve(scopes, call_name(call))
+                if callee is not None:
+                    called.add(callee)
+        return called
+
+    @property
+    def calls(self) -> Dict[AST, Set[AST]]:
+        return {owner: self.callees(owner) for owner in self.scopes}
+
+    @staticmethod
+    def resolve(scopes: List[Dict[str, AST]], name: str):
+        for scope in reversed(scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def assigned(self, routine: AST) -> Set[str]:
+        """Return the names of the variables a call of routine may assign, in its body or the routines it calls.
+
+        Names are not resolved, a local variable shadowing an outer one counts as
+        the outer one too, which is too much but never too little.
+        """
+        names = self._assigned.get(routine)
+        if names is None:
+            names = self._assigned[routine] = set()
+            reached = {routine}
+            pending = [routine]
+            while pending:
+                caller = pending.pop()
+                names |= assigned_names(caller.block.compound_statement)
+                for callee in self.callees(caller):
+                    if callee not in reached:
+                        reached.add(callee)
+                        pending.append(callee)
+        return names
+
+    def pure_routines(self) -> Set[AST]:
+        """Return the routines which only use their own variables and only call pure routines.
+
+        The result of a call of a pure function only depends on its arguments,
+        and the call changes nothing else.
+        """
+        pure = {routine for routine in self.scopes
+                if routine is not self.program
+                and used_names(routine.block.compound_statement) <= local_names(routine)}
+        # a routine is impure as soon as one of its callees is, until nothing changes
+        changed = True
+        while changed:
+            changed = False
+            for routine in list(pure):
+                scopes = self.scopes[routine]
+                if any(self.resolve(scopes, call_name(call)) not in pure
+                       for call in calls(routine.block.compound_statement)):
+                    pure.discard(routine)
+                    changed = True
+        return pure
+
+    def reachable(self) -> Set[AST]:
+        """Return the declarations called, directly or not, from the program's body."""
+        reached = set()
+        pending = [self.program]
+        while pending:
+            for callee in self.callees(pending.pop()):
+                if callee not in reached:
+                    reached.add(callee)
+                    pending.append(callee)
+        return reached
@@ -3,125 +3,202 @@ from typing import List
 
 
 class AST(object):
-    pass
+    # nodes use __slots__, a large program holds millions of them
+    __slots__ = ()
 
 
 class BinOp(AST):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left: AST, op: Token, right: AST):
         self.left = left
-        self.token = op
         self.op = op
         self.right = right
 
+    @property
+    def token(self) -> Token:
+        return self.op
+
 
 class UnaryOp(AST):
+    __slots__ = ('op', 'factor')
+
     def __init__(self, op: Token, factor: AST):
-        self.token = self.op = op
+        self.op = op
         self.factor = factor
 
+    @property
+    def token(self) -> Token:
+        return self.op
+
 
 class Num(AST):
+    __slots__ = ('token', 'value')
+
     def __init__(self, token: Token):
         self.token = token
         self.value = token.value
 
 
 class Boolean(AST):
+    __slots__ = ('token', 'value')
+
     def __init__(self, token: Token):
         self.token = token
-        self.value = True if token.value is 'TRUE' else False
+        self.value = token.value == 'TRUE'
 
 
 class Compound(AST):
+    __slots__ = ('childrens',)
+
     def __init__(self):
         self.childrens = []  # use list to combine many compound
 
 
 class Var(AST):
+    __slots__ = ('token', 'name', 'scope_level', 'slot')
+
     def __init__(self, token: Token):
         self.token = token
         self.name = token.value  # self.value holds the variable's name
+        # resolved by the semantic analyzer: level of the scope declaring
+        # the variable and index of the variable in its frames
+        self.scope_level = None
+        self.slot = None
 
 
 class Assign(AST):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left: Var, op: Token, right: AST):
         self.left = left
-        self.token = self.op = op
+        self.op = op
         self.right = right
 
+    @property
+    def token(self) -> Token:
+        return self.op
+
 
 class Type(AST):
+    __slots__ = ('token', 'name')
+
     def __init__(self, token: Token):
         self.token = token
         self.name = token.value
 
 
 class VarDecl(AST):
+    __slots__ = ('var_node', 'type_node')
+
     def __init__(self, var_node: Var, type_node: Type):
         self.var_node = var_node
         self.type_node = type_node
 
 
+class TemporaryDecl(VarDecl):
+    """A variable the optimizer introduces, it isn't one of the program's results"""
+    __slots__ = ()
+
+
 class Block(AST):
+    __slots__ = ('declarations', 'compound_statement', 'slot_names', 'slot_indexes')
+
     def __init__(self, declarations: List[VarDecl], compound_statement: Compound):
         self.declarations = declarations
         self.compound_statement = compound_statement
+        # names of the frame slots of the block's scope, and the slot of each name,
+        # set by the semantic analyzer
+        self.slot_names = None
+        self.slot_indexes = None
 
 
 class Program(AST):
+    __slots__ = ('name', 'block')
+
     def __init__(self, name: str, block: Block):
         self.name = name
         self.block = block
 
 
 class Param(AST):
+    __slots__ = ('var_node', 'type_node')
+
     def __init__(self, var_node: Var, type_node: Type):
         self.var_node = var_node
         self.type_node = type_node
 
 
 class ProcedureDecl(AST):
+    __slots__ = ('token', 'block', 'params', 'slot')
+
     def __init__(self, token: Token, params: List[Param], block: Block):
         self.token = token
         self.block = block
         self.params = params
+        # slot of the procedure in the enclosing frame
+        self.slot = None
 
 
 class FunctionDecl(AST):
+    __slots__ = ('token', 'params', 'block', 'return_type', 'slot')
+
     def __init__(self, token: Token, params: List[Param], block: Block, return_type: Type):
         self.token = token
         self.params = params
         self.block = block
-        self.retun_type = return_type
+        self.return_type = return_type
+        # slot of the function in the enclosing frame
+        self.slot = None
 
 
 class ProcedureCall(AST):
+    __slots__ = ('proc_name', 'actual_params', 'token', 'scope_level', 'slot', 'tail')
+
     def __init__(self, proc_name: str, actual_params: List[AST], token: Token):
         self.proc_name = proc_name
         self.actual_params = actual_params  # a list of AST nodes
         self.token = token
+        # where the procedure is declared, resolved as for Var
+        self.scope_level = None
+        self.slot = None
+        # whether the call is the last statement of the procedure it calls
+        self.tail = False
 
 
 class FunctionCall(AST):
+    __slots__ = ('func_name', 'actual_params', 'token', 'scope_level', 'slot', 'tail')
+
     def __init__(self, func_name: str, actual_params: List[AST], token: Token):
         self.func_name = func_name
         self.actual_params = actual_params
         self.token = token
+        # where the function is declared, resolved as for Var
+        self.scope_level = None
+        self.slot = None
+        # whether the call's result is the result of the function it calls, as the last statement
+        self.tail = False
 
 
 class Then(AST):
+    __slots__ = ('token', 'child')
+
     def __init__(self, token: Token, child: AST):
         self.token = token
         self.child = child
 
 
 class Else(AST):
+    __slots__ = ('token', 'child')
+
     def __init__(self, token: Token, child: AST):
         self.token = token
         self.child = child
 
 
 class Condition(AST):
+    __slots__ = ('token', 'condition_node', 'then_node', 'else_node')
+
     def __init__(self, token: Token, condition_node: AST, then_node: Then, else_node: Else):
         self.token = token
         self.condition_node = condition_node
@@ -130,6 +207,8 @@ class Condition(AST):
 
 
 class WhileLoop(AST):
+    __slots__ = ('token', 'conditon_node', 'body_node')
+
     def __init__(self, token: Token, condition_node: AST, body_node: AST):
         self.token = token
         self.conditon_node = condition_node
@@ -137,14 +216,92 @@ class WhileLoop(AST):
 
 
 class Continue(AST):
+    __slots__ = ('token',)
+
     def __init__(self, token: Token):
         self.token = token
 
 
 class Break(AST):
+    __slots__ = ('token',)
+
     def __init__(self, token: Token):
         self.token = token
 
 
 class NoOp(AST):
-    pass
+    __slots__ = ()
+
+
+def declared_variables(block: Block, temporaries: bool = True) -> List[str]:
+    """Return the names of the variables declared in the block, the optimizer's temporaries included if asked."""
+    return [declaration.var_node.name
+            for declaration in block.declarations
+            if isinstance(declaration, VarDecl) and (temporaries or not isinstance(declaration, TemporaryDecl))]
+
+
+def variable_values(block: Block, slots: list) -> dict:
+    """Return the values of the program's own variables, in the slots of the block's frame."""
+    slot_indexes = block.slot_indexes
+    return {name: slots[slot_indexes[name]] for name in declared_variables(block, temporaries=False)}
+
+
+# node class -> names of its fields, in declaration order
+_FIELD_NAMES = {}
+
+
+def field_names(cls) -> tuple:
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = _FIELD_NAMES[cls] = tuple(field for base in reversed(cls.__mro__)
+                                          for field in base.__dict__.get('__slots__', ()))
+    return names
+
+
+def fields(node: AST):
+    """Generate the (name, value) of every field of the node."""
+    for field in field_names(type(node)):
+        yield field, getattr(node, field, None)
+
+
+def children(node: AST):
+    """Generate the child nodes of the node, in the order of its fields."""
+    for field in field_names(type(node)):
+        value = getattr(node, field, None)
+        if isinstance(value, AST):
+            yield value
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, AST):
+                    yield item
+
+
+def dump_tree(node: AST, indent: str = '  ') -> str:
+    """Return an indented listing of the tree, one node per line, with its plain fields.
+
+    The token a node was built from is left out, the operators are shown by their lexeme.
+    """
+    lines = []
+
+    def dump(node, depth: int, label: str):
+        attributes, children = [], []
+        for field, value in fields(node):
+            if field == 'token':
+                continue
+            if isinstance(value, AST) or (isinstance(value, list) and value and isinstance(value[0], AST)):
+                children.append((field, value))
+            elif isinstance(value, Token):
+                attributes.append(f'{field}={value.value!r}')
+            elif value is not None:
+                attributes.append(f'{field}={value!r}')
+        lines.append(f'{indent * depth}{label}{type(node).__name__}({", ".join(attributes)})')
+        for field, value in children:
+            if isinstance(value, list):
+                lines.append(f'{indent * (depth + 1)}{field}:')
+                for child in value:
+                    dump(child, depth + 2, '')
+            else:
+                dump(value, depth + 1, f'{field}: ')
+
+    dump(node, 0, '')
+    return '\n'.join(lines)
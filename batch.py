@@ -0,0 +1,135 @@
+# Runs the programs of a directory in a pool of processes and reports each
+# of them as a JSON line as soon as it is done
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List
+
+from budget import make_budget
+from cache import ProgramCache, load_program
+from errors import Error
+from interpreter import Interpreter
+from tokenizer import TOKENIZERS
+from tracing import Tracer, TraceLevel
+
+PROGRAM_SUFFIX = '.pas'
+
+# exit status of a program
+OK = 0
+# it raised one of the errors of errors.py
+FAILED = 1
+# the interpreter itself raised another exception
+CRASHED = 2
+
+# programs handed to the pool per worker, ahead of the finished ones
+PENDING_PER_WORKER = 4
+
+# the cache of the analyzed programs of a worker process, shared on disk
+_cache: ProgramCache = None
+
+
+def find_programs(directory: str) -> List[str]:
+    """Return the paths of the programs in the directory and its subdirectories, in a stable order."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(PROGRAM_SUFFIX))
+    return paths
+
+
+def init_worker(cache_directory: str, version: str):
+    global _cache
+    if cache_directory is not None:
+        _cache = ProgramCache(cache_directory, version=version)
+
+
+def run_file(path: str, engine: str = 'tree', optimize: bool = False, memoize: bool = False,
+             trace: str = 'off', tokenizer: str = 'regex', **limits) -> dict:
+    """Run the program in the file at path within the limits of a Budget, return its record."""
+    output = io.StringIO()
+    record = {'file': path}
+    start = time.perf_counter()
+    try:
+        interpreter = Interpreter(None, engine=engine, tracer=Tracer(TraceLevel[trace.upper()], output),
+                                  optimize=optimize, memoize=memoize, budget=make_budget(**limits))
+        record['cached'] = load_program(interpreter, path, TOKENIZERS[tokenizer], _cache)
+        record['result'] = interpreter.interpret()
+        record['status'] = OK
+    except Error as error:
+        record['status'] = FAILED
+        record['error'] = {'type': error.__class__.__name__, 'message': str(error)}
+    except Exception as error:
+        record['status'] = CRASHED
+        record['error'] = {'type': error.__class__.__name__, 'message': str(error)}
+    record['time'] = (time.perf_counter() - start) * 1000
+    record['output'] = output.getvalue()
+    return record
+
+
+def crashed_record(path: str, error: Exception) -> dict:
+    """Return the record of a program whose worker process died running it."""
+    return {'file': path, 'status': CRASHED, 'error': {'type': error.__class__.__name__, 'message': str(error)},
+            'time': 0.0, 'output': ''}
+
+
+def run_batch(paths: List[str], jobs: int = None, cache_directory: str = None, **options) -> Iterator[dict]:
+    """Run the programs in a pool of jobs processes, generate their records as they finish."""
+    jobs = jobs or os.cpu_count() or 1
+    # computed once rather than by every worker
+    version = ProgramCache(cache_directory).version if cache_directory is not None else None
+
+    def make_pool(workers: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                   initargs=(cache_directory, version))
+
+    paths = iter(paths)
+    executor = make_pool(jobs)
+    try:
+        # a bounded number of programs is submitted ahead, a corpus of any
+        # size only holds that many futures; future -> path of its program
+        pending = {}
+        while True:
+            for path in paths:
+                pending[executor.submit(run_file, path, **options)] = path
+                if len(pending) >= jobs * PENDING_PER_WORKER:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    record = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    pending[future] = path
+                    continue
+                yield record
+            if broken:
+                # a worker died (killed, out of memory, crashed) and took the pool
+                # with it, the programs it held are run again each in a pool of its own
+                executor.shutdown(wait=False)
+                suspects = list(pending.values())
+                pending.clear()
+                yield from run_alone(suspects, make_pool, options)
+                executor = make_pool(jobs)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def run_alone(paths: List[str], make_pool, options: dict) -> Iterator[dict]:
+    """Run the programs one at a time, those whose worker dies are CRASHED."""
+    executor = make_pool(1)
+    try:
+        for path in paths:
+            try:
+                yield executor.submit(run_file, path, **options).result()
+            except BrokenProcessPool as error:
+                yield crashed_record(path, error)
+                executor.shutdown(wait=False)
+                executor = make_pool(1)
+    finally:
+        executor.shutdown()
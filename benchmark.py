@@ -0,0 +1,701 @@
+"""
+Benchmarks of the interpreter's phases on generated Pascal programs
+
+usage: python benchmark.py [benchmark ...]
+"""
+import asyncio
+import io
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from batch import find_programs, run_batch
+from budget import Budget
+from cache import ProgramCache, CACHE_DIRECTORY
+from astnodes import AST, BinOp, Num, Var, Assign, Compound, WhileLoop, Continue, Break, Boolean
+from callstack import Frame, FrameType
+from interpreter import Interpreter, resolve_slots
+from optimizer import Optimizer
+from parser import Parser
+from profiler import ProfilingInterpreter
+from scheduler import Scheduler
+from semantic_analyzer import SemanticAnalyzer
+from service import CompileService
+from source import open_source
+from stack_evaluator import StackEvaluator
+from token_stream import TokenStream
+from tokenizer import Token, Tokenizer, RegexTokenizer
+from tokens import TokenType
+from tracing import Tracer, TraceLevel
+from visitor import Visitor
+
+
+def generate_program(statements: int) -> str:
+    """Generate a straight line program with `statements` assignments."""
+    lines = [
+        'program generated;',
+        'var a, b, result : integer;',
+        '    ratio : real;',
+        'begin',
+        '    a := 1; b := 2; ratio := 0.5;',
+    ]
+    for i in range(statements):
+        # statements are grouped in blocks to keep the parser's recursion shallow
+        if i % 50 == 0:
+            lines.append('    begin')
+        lines.append(
+            f'    result := (a + {i}) * b - {i} // 3 + a % 7; {{statement {i}}}'
+        )
+        lines.append(f'    if result >= {i} then ratio := ratio / 2.0 else b := b + 1;')
+        if i % 50 == 49 or i == statements - 1:
+            lines.append('    end;')
+    lines.append('end.')
+    return '\n'.join(lines) + '\n'
+
+
+def best_of(repeat: int, func, *args, **kwargs):
+    """Return the best wall time of `repeat` runs of func(*args, **kwargs)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def drain(tokenizer_class, text: str) -> int:
+    tokenizer = tokenizer_class(text)
+    count = 0
+    while tokenizer.get_next_token().type is not TokenType.EOF:
+        count += 1
+    return count
+
+
+def bench_tokenizer():
+    text = generate_program(20000)
+    megabytes = len(text.encode()) / 2 ** 20
+    tokens = drain(Tokenizer, text)
+    print(f'tokenizer: {megabytes:.2f} MB, {tokens} tokens')
+    for name, tokenizer_class in (('char', Tokenizer), ('regex', RegexTokenizer)):
+        elapsed = best_of(3, drain, tokenizer_class, text)
+        print(f'  {name:<8} {megabytes / elapsed:8.2f} MB/s {tokens / elapsed:12.0f} tokens/s')
+
+
+def peak_memory(func, *args) -> int:
+    """Return the peak of memory allocated while running func(*args)."""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def lex_file(tokenizer_class, path: str, streaming: bool):
+    if streaming:
+        with open_source(path) as source:
+            for _ in tokenizer_class(source):
+                pass
+    else:
+        with open(path, 'r') as file:
+            for _ in tokenizer_class(file.read()):
+                pass
+
+
+def bench_source():
+    with tempfile.NamedTemporaryFile('w', suffix='.pas', delete=False) as file:
+        file.write(generate_program(20000))
+    try:
+        megabytes = os.path.getsize(file.name) / 2 ** 20
+        print(f'source: {megabytes:.2f} MB file, peak memory while lexing')
+        for name, tokenizer_class in (('char', Tokenizer), ('regex', RegexTokenizer)):
+            for streaming in (False, True):
+                peak = peak_memory(lex_file, tokenizer_class, file.name, streaming)
+                mode = 'mmap' if streaming else 'read()'
+                print(f'  {name:<8} {mode:<8} {peak / 2 ** 20:8.2f} MB')
+    finally:
+        os.remove(file.name)
+
+
+def parse(tokens: TokenStream):
+    tokens.pos = 0
+    Parser(tokens).parse()
+
+
+def bench_parser():
+    text = generate_program(20000)
+    tracemalloc.start()
+    tokens = TokenStream(RegexTokenizer(text))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'parser: {len(tokens)} tokens, {len(tokens.value_table)} distinct values, '
+          f'{size / len(tokens):.1f} bytes/token buffered')
+    elapsed = best_of(3, parse, tokens)
+    print(f'  parse    {len(tokens) / elapsed:12.0f} tokens/s')
+
+
+def expression_program(statements: int) -> str:
+    """Generate a program of assignments of long expressions mixing every precedence level."""
+    lines = ['program expressions;', 'var a, b, c : integer;', '    found : boolean;', 'begin']
+    for i in range(statements):
+        lines.append(f'    a := (a + {i}) * -b - c // 3 + a % 7 * (b - (c + {i}) / 2.0);')
+        lines.append(f'    found := a > {i} and not (b <= c) or a + b = c * 2 and b <> {i} or found;')
+    lines.append('    c := 0')
+    lines.append('end.')
+    return '\n'.join(lines) + '\n'
+
+
+def bench_expressions():
+    tokens = TokenStream(RegexTokenizer(expression_program(10000)))
+    elapsed = best_of(3, parse, tokens)
+    print(f'expressions: {len(tokens)} tokens')
+    print(f'  parse    {len(tokens) / elapsed:12.0f} tokens/s')
+
+
+def count_nodes(root: AST) -> int:
+    """Count the AST nodes reachable from root."""
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        for value in node_fields(node):
+            if isinstance(value, AST):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(child for child in value if isinstance(child, AST))
+    return count
+
+
+def node_fields(node: AST) -> list:
+    if hasattr(node, '__dict__'):
+        return list(vars(node).values())
+    return [getattr(node, name) for cls in type(node).__mro__
+            for name in getattr(cls, '__slots__', ()) if hasattr(node, name)]
+
+
+def bench_memory():
+    text = generate_program(20000)
+    tokens = TokenStream(RegexTokenizer(text))
+    # ru_maxrss is in kilobytes on linux
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+    ast = Parser(tokens).parse()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+    nodes = count_nodes(ast)
+    del ast
+
+    tokens.pos = 0
+    tracemalloc.start()
+    ast = Parser(tokens).parse()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'memory: {nodes} nodes, {size / nodes:.1f} bytes/node (tokens included), '
+          f'peak RSS {peak_rss:.1f} MB ({peak_rss - rss_before:.1f} MB parsing)')
+
+
+def visit_all(visitor: Visitor, nodes: list):
+    visit = visitor.visit
+    for node in nodes:
+        visit(node)
+
+
+def bench_dispatch():
+    one = Num(Token(TokenType.INTEGER_CONST, 1))
+    var = Var(Token(TokenType.ID, 'a'))
+    samples = {
+        'BinOp': BinOp(one, Token(TokenType.PLUS, '+'), one),
+        'Num': one,
+        'Var': var,
+        'Assign': Assign(var, Token(TokenType.ASSIGN, ':='), one),
+        'Compound': Compound(),
+        'WhileLoop': WhileLoop(None, one, Compound()),
+        'Break': Break(None),
+        'Boolean': Boolean(Token(TokenType.TRUE, 'TRUE')),
+    }
+    visitor = type('NullVisitor', (Visitor,), {})()
+    count = 100000
+    print('dispatch: Visitor.visit cost per node')
+    for name, node in samples.items():
+        nodes = [node] * count
+        try:
+            elapsed = best_of(3, visit_all, visitor, nodes)
+        except Exception as e:
+            print(f'  {name:<10} {e}')
+            continue
+        print(f'  {name:<10} {elapsed / count * 1e9:8.1f} ns')
+
+
+LOOP_PROGRAM = """\
+program loop;
+var i, total : integer;
+begin
+    i := 0;
+    total := 0;
+    while i < 100000 do
+    begin
+        i := i + 1;
+        if i % 3 = 0 then total := total + i * 2 else total := total - 1
+    end
+end.
+"""
+
+CALL_PROGRAM = """\
+program calls;
+var result : integer;
+
+function fibonacci(n : integer) : integer;
+begin
+    if n < 2 then fibonacci := n
+    else fibonacci := fibonacci(n - 1) + fibonacci(n - 2)
+end;
+
+begin
+    result := fibonacci(16)
+end.
+"""
+
+
+def run_program(text: str, **options) -> dict:
+    return Interpreter(Parser(RegexTokenizer(text)), **options).interpret()
+
+
+def bench_engines():
+    print('engines: run time of loop and call heavy programs')
+    for name, text in (('loop', LOOP_PROGRAM), ('calls', CALL_PROGRAM)):
+        baseline = None
+        for engine in Interpreter.ENGINES:
+            elapsed = best_of(3, run_program, text, engine=engine)
+            baseline = baseline or elapsed
+            print(f'  {name:<6} {engine:<8} {elapsed * 1000:9.1f} ms  x{baseline / elapsed:.2f}')
+
+
+CONTINUE_PROGRAM = """\
+program skip;
+var i, odds : integer;
+begin
+    i := 0;
+    odds := 0;
+    while i < 100000 do
+    begin
+        i := i + 1;
+        if i % 2 = 0 then continue;
+        odds := odds + 1;
+        if i > 1000000 then break
+    end
+end.
+"""
+
+
+class LoopExit(Exception):
+    pass
+
+
+class LoopNext(Exception):
+    pass
+
+
+class ExceptionLoopInterpreter(Interpreter):
+    """The tree walker as it was, leaving loop bodies by raising exceptions"""
+
+    def visit_compound(self, node: Compound):
+        for child in node.childrens:
+            self.visit(child)
+
+    def visit_while(self, node: WhileLoop):
+        while self.visit(node.conditon_node) is True:
+            try:
+                self.visit(node.body_node)
+            except LoopNext:
+                continue
+            except LoopExit:
+                break
+
+    def visit_continue(self, node: Continue):
+        raise LoopNext()
+
+    def visit_break(self, node: Break):
+        raise LoopExit()
+
+
+def run_with(interpreter_class, text: str) -> dict:
+    return interpreter_class(Parser(RegexTokenizer(text))).interpret()
+
+
+def bench_loop_control():
+    print('loop control: a WHILE loop continuing every other iteration')
+    baseline = best_of(5, run_with, ExceptionLoopInterpreter, CONTINUE_PROGRAM)
+    print(f'  exceptions {baseline * 1000:9.1f} ms')
+    elapsed = best_of(5, run_with, Interpreter, CONTINUE_PROGRAM)
+    print(f'  signals    {elapsed * 1000:9.1f} ms  x{baseline / elapsed:.2f}')
+
+
+DEEP_PROGRAM = """\
+program deep;
+var total, calls : integer;
+
+function depth(n : integer) : integer;
+begin
+    calls := calls + 1;
+    total := total + n;
+    if n = 0 then depth := 0
+    else depth := depth(n - 1) + 1
+end;
+
+begin
+    total := 0;
+    calls := 0;
+    while calls < 3100 do total := total + depth(30)
+end.
+"""
+
+
+def bench_scoping():
+    print('scoping: global variable reads from deep recursion')
+    interpreter = Interpreter(None)
+    callstack = interpreter.callstack
+    program = Frame(name='deep', type=FrameType.PROGRAM, slot_names=['total'])
+    callstack.push(program)
+    var = Var(Token(TokenType.ID, 'total'))
+    var.scope_level, var.slot = 1, 0
+    nodes = [var] * 100000
+    for depth in (1, 30):
+        while callstack.peek().nesting_level < depth:
+            callstack.push(Frame(name='depth', type=FrameType.FUNCTION, slot_names=['n'], scope_level=2))
+        elapsed = best_of(3, visit_all, interpreter, nodes)
+        print(f'  read at call depth {depth:<3} {elapsed / len(nodes) * 1e9:8.1f} ns')
+    for engine in Interpreter.ENGINES:
+        elapsed = best_of(3, run_program, DEEP_PROGRAM, engine=engine)
+        print(f'  depth(30) x100 {engine:<8} {elapsed * 1000:9.1f} ms')
+
+
+def bench_tracing():
+    print('tracing: run time of the call heavy program at each trace level')
+    for level in TraceLevel:
+        for engine in ('tree', 'closure'):
+            # the trace is written to memory, formatting it is what is measured
+            elapsed = best_of(3, lambda: run_program(CALL_PROGRAM, engine=engine, tracer=Tracer(level, io.StringIO())))
+            print(f'  {level.name.lower():<8} {engine:<8} {elapsed * 1000:9.1f} ms')
+
+
+FOLD_PROGRAM = """\
+program fold;
+var i, total : integer;
+begin
+    i := 0;
+    total := 0;
+    while i < 50000 do
+    begin
+        i := i + 1 * 1;
+        total := total + (2 + 3) * 4 - 10 // 3 + i * 1 + 0
+    end
+end.
+"""
+
+
+def bench_optimizer():
+    print('optimizer: run time of a loop over constant expressions, with and without the passes')
+    baseline = best_of(3, run_program, FOLD_PROGRAM)
+    print(f'  plain      {baseline * 1000:9.1f} ms')
+    elapsed = best_of(3, run_program, FOLD_PROGRAM, optimize=True)
+    print(f'  optimized  {elapsed * 1000:9.1f} ms  x{baseline / elapsed:.2f}')
+
+
+
+def dead_code_program(routines: int = 300, statements: int = 20) -> str:
+    """Return a program with a disabled debug section in its loop and many routines it never calls."""
+    body = ';\n'.join(f'        total := total + {n} * i' for n in range(statements))
+    declarations = ''.join(f"""
+procedure unused{n}(i : integer);
+begin
+{body}
+end;
+""" for n in range(routines))
+    return f"""\
+program pruning;
+var i, total : integer;
+{declarations}
+begin
+    i := 0;
+    total := 0;
+    while i < 20000 do
+    begin
+        i := i + 1;
+        if 1 = 0 then
+        begin
+{body}
+        end;
+        while false do total := 0
+    end
+end.
+"""
+
+
+def bench_pruning():
+    print('pruning: analysis, optimization and run time of a program with dead code, with and without the passes')
+    text = dead_code_program()
+    for optimize in (False, True):
+        analysis = execution = None
+        for _ in range(3):
+            tree = Parser(RegexTokenizer(text)).parse()
+            start = time.perf_counter()
+            SemanticAnalyzer().visit(tree)
+            if optimize:
+                tree = Optimizer().optimize(tree)
+                resolve_slots(tree)
+            middle = time.perf_counter()
+            Interpreter(parser=None).visit(tree)
+            end = time.perf_counter()
+            analysis = min(analysis or middle - start, middle - start)
+            execution = min(execution or end - middle, end - middle)
+        label = 'optimized' if optimize else 'plain'
+        print(f'  {label:<10} analysis {analysis * 1000:8.1f} ms  run {execution * 1000:8.1f} ms')
+
+
+INVARIANT_PROGRAM = """\
+program invariant;
+var i, j, n, width, height, total : integer;
+    scale : real;
+begin
+    n := 200; width := 7; height := 9; total := 0; scale := 0.0;
+    i := 0;
+    while i < n do
+    begin
+        i := i + 1;
+        j := 0;
+        while j < n do
+        begin
+            j := j + 1;
+            total := total + width * height + i * (width - 1) + j;
+            if j > n - width * 2 then continue
+        end;
+        scale := scale + width / 2
+    end
+end.
+"""
+
+
+def bench_licm():
+    print('licm: run time of nested loops over invariant expressions, with and without the passes')
+    for engine in Interpreter.ENGINES:
+        baseline = best_of(3, run_program, INVARIANT_PROGRAM, engine=engine)
+        elapsed = best_of(3, run_program, INVARIANT_PROGRAM, engine=engine, optimize=True)
+        print(f'  {engine:<8} plain {baseline * 1000:8.1f} ms  optimized {elapsed * 1000:8.1f} ms  x{baseline / elapsed:.2f}')
+
+
+def bench_memoize():
+    print('memoize: run time of the naive fibonacci, with and without caching its results')
+    for engine in Interpreter.MEMOIZING_ENGINES:
+        baseline = best_of(3, run_program, CALL_PROGRAM, engine=engine)
+        elapsed = best_of(3, run_program, CALL_PROGRAM, engine=engine, memoize=True)
+        print(f'  {engine:<8} plain {baseline * 1000:8.1f} ms  memoized {elapsed * 1000:8.1f} ms  x{baseline / elapsed:.1f}')
+
+
+TAIL_PROGRAM = """\
+program tail;
+var result : integer;
+
+function sum(n, acc : integer) : integer;
+begin
+    if n = 0 then sum := acc
+    else sum := sum(n - 1, acc + n)
+end;
+
+begin
+    result := sum(20000, 0)
+end.
+"""
+
+
+def bench_tail_calls():
+    print('tail_calls: run time and peak memory of a tail recursion 20000 calls deep, beyond the recursion limit')
+    for engine in Interpreter.ENGINES:
+        elapsed = best_of(3, run_program, TAIL_PROGRAM, engine=engine)
+        tracemalloc.start()
+        run_program(TAIL_PROGRAM, engine=engine)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'  {engine:<8} {elapsed * 1000:9.1f} ms  peak {peak / 1024:8.1f} KiB')
+
+
+def recursion_program(depth: int) -> str:
+    return f"""\
+program recursion;
+var result : integer;
+
+function depth(n : integer) : integer;
+begin
+    if n = 0 then depth := 0
+    else depth := depth(n - 1) + 1
+end;
+
+begin
+    result := depth({depth})
+end.
+"""
+
+
+def bench_stack():
+    print('stack: the explicit stack evaluator on recursions deeper than python\'s limit')
+    peaks = {}
+    for depth in (10 ** 4, 10 ** 5):
+        ast = Interpreter(Parser(RegexTokenizer(recursion_program(depth))), engine='stack').analyze()
+        start = time.perf_counter()
+        StackEvaluator().run(ast)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        StackEvaluator().run(ast)
+        peaks[depth] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'  depth {depth:<7} {elapsed * 1000:9.1f} ms  peak {peaks[depth] / 1024:9.1f} KiB')
+    per_frame = (peaks[10 ** 5] - peaks[10 ** 4]) / (10 ** 5 - 10 ** 4)
+    print(f'  memory per pascal frame {per_frame:6.0f} bytes')
+
+
+def analyze_file(path: str):
+    with open_source(path) as source:
+        return Interpreter(Parser(RegexTokenizer(source))).analyze()
+
+
+def bench_cache():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'generated.pas')
+        with open(path, 'w') as file:
+            file.write(generate_program(20000))
+        cache = ProgramCache(os.path.join(directory, CACHE_DIRECTORY))
+        key = cache.key(path)
+        cache.store(key, analyze_file(path))
+        size = os.path.getsize(cache.path(key))
+        print(f'cache: {os.path.getsize(path) / 2 ** 20:.2f} MB program, {size / 2 ** 20:.2f} MB cached')
+        analyzed = best_of(3, analyze_file, path)
+        loaded = best_of(3, lambda: cache.load(cache.key(path)))
+        print(f'  analyzed {analyzed * 1000:9.1f} ms')
+        print(f'  cached   {loaded * 1000:9.1f} ms  x{analyzed / loaded:.1f}')
+
+
+def bench_service():
+    text = generate_program(20)
+    requests = 200
+    print(f'service: {requests} requests of a {len(text)} bytes program')
+    fresh = best_of(3, lambda: [run_program(text) for _ in range(requests)]) / requests
+    print(f'  fresh interpreter {fresh * 1000:8.3f} ms/request')
+    service = CompileService()
+    service.run(text)
+    cached = best_of(3, lambda: [service.run(text) for _ in range(requests)]) / requests
+    print(f'  service, cached   {cached * 1000:8.3f} ms/request  x{fresh / cached:.1f}  '
+          f'hit rate {service.stats()["hit_rate"]:.3f}')
+
+
+def bench_batch():
+    programs = 400
+    jobs = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as directory:
+        for index in range(programs):
+            with open(os.path.join(directory, f'program{index}.pas'), 'w') as file:
+                file.write(generate_program(100 + index % 100))
+        paths = find_programs(directory)
+        print(f'batch: {programs} programs, {jobs} cores')
+        for count in sorted({1, jobs}):
+            elapsed = best_of(1, lambda: list(run_batch(paths, jobs=count)))
+            print(f'  {count:>3} jobs  {elapsed:8.2f} s  {programs / elapsed:8.1f} programs/s')
+        cache = os.path.join(directory, CACHE_DIRECTORY)
+        list(run_batch(paths, jobs=jobs, cache_directory=cache))
+        elapsed = best_of(1, lambda: list(run_batch(paths, jobs=jobs, cache_directory=cache)))
+        print(f'  {jobs:>3} jobs  {elapsed:8.2f} s  {programs / elapsed:8.1f} programs/s  cached')
+
+
+def bench_budget():
+    print('budget: run time without a budget and with limits never reached')
+    for name, text in (('loop', LOOP_PROGRAM), ('calls', CALL_PROGRAM)):
+        for engine in Interpreter.BUDGETED_ENGINES:
+            free = best_of(3, run_program, text, engine=engine)
+            budget = Budget(max_steps=10 ** 9, max_depth=10 ** 6, max_time=3600, max_memory=2 ** 40)
+            held = best_of(3, run_program, text, engine=engine, budget=budget)
+            print(f'  {name:<6} {engine:<8} {free * 1000:9.1f} ms  budget {held * 1000:9.1f} ms  '
+                  f'+{(held / free - 1) * 100:4.1f}%  {budget.steps} steps')
+
+
+def analyzed_program(text: str):
+    return Interpreter(Parser(RegexTokenizer(text))).analyze()
+
+
+def bench_scheduler():
+    # a few long programs sent first, then many short ones
+    long_program = analyzed_program(LOOP_PROGRAM)
+    short_program = analyzed_program(LOOP_PROGRAM.replace('100000', '500'))
+    programs = [long_program] * 4 + [short_program] * 40
+    print(f'scheduler: {len(programs)} programs, 4 long ones sent before 40 short ones')
+
+    start = time.perf_counter()
+    finished = []
+    for program in programs:
+        Interpreter(None, engine='stack', program=program).interpret()
+        finished.append(time.perf_counter() - start)
+    total = finished[-1]
+    print(f'  one at a time    {total * 1000:8.1f} ms  {len(programs) / total:6.1f} programs/s  '
+          f'mean completion {sum(finished) / len(finished) * 1000:8.1f} ms')
+
+    for slice_steps in (100, 1000, 10000):
+        finished = []
+
+        async def run(scheduler: Scheduler, program, start: float):
+            await scheduler.run(Interpreter(None, engine='stack', program=program))
+            finished.append(time.perf_counter() - start)
+
+        async def run_all():
+            scheduler = Scheduler(slice_steps)
+            start = time.perf_counter()
+            await asyncio.gather(*(run(scheduler, program, start) for program in programs))
+            return time.perf_counter() - start
+
+        total = asyncio.run(run_all())
+        print(f'  slices of {slice_steps:<6} {total * 1000:8.1f} ms  {len(programs) / total:6.1f} programs/s  '
+              f'mean completion {sum(finished) / len(finished) * 1000:8.1f} ms')
+
+
+def bench_profiler():
+    print('profiler: run time of the tree engine without and with profiling')
+    for name, text in (('loop', LOOP_PROGRAM), ('calls', CALL_PROGRAM)):
+        program = analyzed_program(text)
+        free = best_of(3, lambda: Interpreter(None, program=program).interpret())
+        profiled = best_of(3, lambda: ProfilingInterpreter(None, program=program).interpret())
+        print(f'  {name:<6} {free * 1000:9.1f} ms  profiled {profiled * 1000:9.1f} ms  x{profiled / free:.2f}')
+
+
+BENCHMARKS = {
+    'tokenizer': bench_tokenizer,
+    'source': bench_source,
+    'parser': bench_parser,
+    'expressions': bench_expressions,
+    'memory': bench_memory,
+    'dispatch': bench_dispatch,
+    'engines': bench_engines,
+    'scoping': bench_scoping,
+    'loop_control': bench_loop_control,
+    'tracing': bench_tracing,
+    'optimizer': bench_optimizer,
+    'pruning': bench_pruning,
+    'licm': bench_licm,
+    'memoize': bench_memoize,
+    'tail_calls': bench_tail_calls,
+    'stack': bench_stack,
+    'cache': bench_cache,
+    'service': bench_service,
+    'batch': bench_batch,
+    'budget': bench_budget,
+    'scheduler': bench_scheduler,
+    'profiler': bench_profiler,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
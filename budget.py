@@ -0,0 +1,104 @@
+# Limits on what a single run may use, so that untrusted programs can share a process
+import struct
+import sys
+import time
+
+from callstack import Frame, FrameType
+from errors import RuntimeError, ErrorCode
+
+# steps between two looks at the clock
+CLOCK_INTERVAL = 1024
+# estimated bytes of a frame, besides the pointers of its slots
+FRAME_OVERHEAD = sys.getsizeof(Frame('', FrameType.PROGRAM)) + sys.getsizeof([])
+SLOT_SIZE = struct.calcsize('P')
+# the options of a Budget
+LIMITS = ('max_steps', 'max_depth', 'max_time', 'max_memory')
+
+
+def frame_size(slot_count: int) -> int:
+    """Estimate the bytes of a frame of slot_count slots, the values themselves aside."""
+    return FRAME_OVERHEAD + SLOT_SIZE * slot_count
+
+
+class Budget(object):
+    """
+    Budget bounds the steps of a run, the loop iterations entered and the
+    routines called, its call depth, its wall time and the memory of its
+    active frames. The engines count a step with step(), which mostly
+    decrements a counter: the limits are only compared every few steps,
+    and a RuntimeError is raised once one of them is exceeded
+    """
+
+    def __init__(self, max_steps: int = None, max_depth: int = None, max_time: float = None,
+                 max_memory: int = None):
+        self.max_steps = max_steps
+        self.max_depth = max_depth
+        # seconds
+        self.max_time = max_time
+        # bytes
+        self.max_memory = max_memory
+        # the limits compared on every call, infinite when unset
+        self.depth_limit = max_depth if max_depth is not None else float('inf')
+        self.memory_limit = max_memory if max_memory is not None else float('inf')
+        self.start()
+
+    def start(self):
+        """Start a run, with all of the budget left."""
+        self.deadline = time.perf_counter() + self.max_time if self.max_time is not None else None
+        # steps counted until the last check, and before the next one
+        self.checked_steps = 0
+        self.interval = self.ticks = self.next_interval()
+        self.depth = 0
+        self.memory = 0
+
+    @property
+    def steps(self) -> int:
+        return self.checked_steps + self.interval - self.ticks
+
+    def next_interval(self) -> int:
+        if self.max_steps is None:
+            return CLOCK_INTERVAL
+        # the step past the budget is always checked
+        return max(1, min(CLOCK_INTERVAL, self.max_steps + 1 - self.checked_steps))
+
+    def exceeded(self, error_code: ErrorCode, where):
+        raise RuntimeError(
+            error_code=error_code,
+            token=where,
+            message=f'{error_code.value} -> {where}',
+        )
+
+    def step(self, where):
+        self.ticks -= 1
+        if self.ticks <= 0:
+            self.check(where)
+
+    def check(self, where):
+        self.checked_steps += self.interval
+        self.interval = self.ticks = self.next_interval()
+        if self.max_steps is not None and self.checked_steps > self.max_steps:
+            self.exceeded(ErrorCode.STEP_BUDGET_EXCEEDED, where)
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            self.exceeded(ErrorCode.TIME_BUDGET_EXCEEDED, where)
+
+    def enter(self, slot_count: int, where):
+        """Count the call of a routine and the frame it gets."""
+        depth = self.depth = self.depth + 1
+        memory = self.memory = self.memory + FRAME_OVERHEAD + SLOT_SIZE * slot_count
+        if depth > self.depth_limit:
+            self.exceeded(ErrorCode.DEPTH_BUDGET_EXCEEDED, where)
+        if memory > self.memory_limit:
+            self.exceeded(ErrorCode.MEMORY_BUDGET_EXCEEDED, where)
+        self.ticks -= 1
+        if self.ticks <= 0:
+            self.check(where)
+
+    def leave(self, slot_count: int):
+        self.depth -= 1
+        self.memory -= FRAME_OVERHEAD + SLOT_SIZE * slot_count
+
+
+def make_budget(**limits) -> Budget:
+    """Return a Budget of the limits which are set, None when none is."""
+    limits = {name: value for name, value in limits.items() if value is not None}
+    return Budget(**limits) if limits else None
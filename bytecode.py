@@ -0,0 +1,375 @@
+# Compiler from the checked AST to a compact bytecode executed by vm.VirtualMachine
+from array import array
+from enum import IntEnum
+from typing import List
+
+from astnodes import BinOp, Num, UnaryOp, Compound, Var, Assign, NoOp, Program, Block, VarDecl, \
+    ProcedureDecl, ProcedureCall, Boolean, Condition, Then, Else, FunctionDecl, FunctionCall, WhileLoop, \
+    Continue, Break, declared_variables
+from errors import SemanticError, ErrorCode
+from tokens import TokenType
+from visitor import Visitor
+
+
+class Opcode(IntEnum):
+    # every instruction is an opcode followed by one integer operand
+    LOAD_CONST = 1  # push constants[operand]
+    LOAD_LOCAL = 2  # push locals[operand]
+    STORE_LOCAL = 3  # pop into locals[operand]
+    LOAD_NONLOCAL = 4  # push display[level][slot], operand is slot << 16 | level
+    STORE_NONLOCAL = 5  # pop into display[level][slot]
+    ADD = 6
+    SUB = 7
+    MUL = 8
+    INTEGER_DIV = 9
+    FLOAT_DIV = 10
+    MOD = 11
+    AND = 12
+    OR = 13
+    EQUALS = 14
+    NOT_EQUALS = 15
+    GREATER = 16
+    GREATER_EQUALS = 17
+    LESS = 18
+    LESS_EQUALS = 19
+    POS = 20
+    NEG = 21
+    NOT = 22
+    JUMP = 23  # continue at the instruction whose index is the operand
+    POP_JUMP_IF_FALSE = 24  # pop, jump when the value is falsy (IF)
+    POP_JUMP_IF_NOT_TRUE = 25  # pop, jump unless the value is True (WHILE)
+    CALL = 26  # call routines[operand], its arguments are on the stack
+    RETURN = 27  # leave a procedure or the program
+    RETURN_VALUE = 28  # leave a function, push its result
+
+
+BINARY_OPCODES = {
+    TokenType.PLUS: Opcode.ADD,
+    TokenType.MINUS: Opcode.SUB,
+    TokenType.MUL: Opcode.MUL,
+    TokenType.INTEGER_DIV: Opcode.INTEGER_DIV,
+    TokenType.FLOAT_DIV: Opcode.FLOAT_DIV,
+    TokenType.MOD: Opcode.MOD,
+    TokenType.AND: Opcode.AND,
+    TokenType.OR: Opcode.OR,
+    TokenType.EQUALS: Opcode.EQUALS,
+    TokenType.NOT_EQUALS: Opcode.NOT_EQUALS,
+    TokenType.GREATER: Opcode.GREATER,
+    TokenType.GREATER_EQUALS: Opcode.GREATER_EQUALS,
+    TokenType.LESS: Opcode.LESS,
+    TokenType.LESS_EQUALS: Opcode.LESS_EQUALS,
+}
+
+UNARY_OPCODES = {
+    TokenType.PLUS: Opcode.POS,
+    TokenType.MINUS: Opcode.NEG,
+    TokenType.NOT: Opcode.NOT,
+}
+
+# operands of the nonlocal accesses pack the slot with the scope level in
+# the low bits, 64 bit operands leave 47 bits to the slot
+LEVEL_BITS = 16
+LEVEL_MASK = (1 << LEVEL_BITS) - 1
+
+
+def nonlocal_operand(level: int, slot: int) -> int:
+    if level > LEVEL_MASK:
+        raise ValueError(f'scopes nested deeper than {LEVEL_MASK} levels')
+    return slot << LEVEL_BITS | level
+
+
+class Code(object):
+    """Code is the compiled form of the program, a procedure or a function"""
+
+    def __init__(self, name: str, kind: str, enclosing_code=None, token=None):
+        self.name = name
+        self.kind = kind  # 'program', 'procedure' or 'function'
+        # code of the routine or program this routine is declared in
+        self.enclosing_code = enclosing_code
+        # lexical scope level, the program is at level 1
+        self.level = 1 if enclosing_code is None else enclosing_code.level + 1
+        self.token = token
+        self.instructions = array('q')
+        self.param_count = 0
+        # names of the parameters then of the variables, indexed by slot;
+        # a function's result lives in the slot after them
+        self.local_names = []
+        self.result_slot = None
+
+    @property
+    def local_count(self) -> int:
+        return len(self.local_names) + (self.result_slot is not None)
+
+    def emit(self, opcode: Opcode, operand: int = 0) -> int:
+        """Append an instruction and return its index, jumps target these indexes."""
+        index = len(self)
+        self.instructions.append(opcode)
+        self.instructions.append(operand)
+        return index
+
+    def patch(self, index: int, operand: int):
+        """Set the operand of an emitted instruction, e.g. a forward jump target."""
+        self.instructions[2 * index + 1] = operand
+
+    def __len__(self):
+        """Number of instructions."""
+        return len(self.instructions) // 2
+
+
+class Module(object):
+    """Module holds every compiled routine of a program and their constants"""
+
+    def __init__(self):
+        self.constants = []
+        # the program's code is always routines[0]
+        self.routines: List[Code] = []
+        # the program's variables returned when it ends
+        self.variables: List[str] = []
+        self.__constant_index = {}
+
+    def constant(self, value) -> int:
+        """Return the index of value in the constant pool, adding it if needed."""
+        key = (type(value), value)
+        index = self.__constant_index.get(key)
+        if index is None:
+            index = self.__constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+
+class LoopLabels(object):
+    """Jump targets of the innermost WHILE loop being compiled"""
+
+    def __init__(self, start: int):
+        self.start = start
+        # indexes of the jumps to patch with the loop's exit
+        self.breaks = []
+
+
+class Compiler(Visitor):
+    """
+    Compiler translates a checked AST into bytecode, resolving every
+    variable to a frame slot and every call to a routine index
+    """
+
+    def __init__(self):
+        self.module = Module()
+        self.code: Code = None
+        # lexical scopes, each maps ('var', name) to (level, slot)
+        # and ('routine', name) to the routine index
+        self.scopes = []
+        self.loops: List[LoopLabels] = []
+
+    def compile(self, node: Program) -> Module:
+        self.visit(node)
+        return self.module
+
+    def lookup(self, name: str, kind: str):
+        # inside a function its name is both a routine and its result variable
+        for scope in reversed(self.scopes):
+            entry = scope.get((kind, name))
+            if entry is not None:
+                return entry
+        raise SemanticError(
+            error_code=ErrorCode.ID_NOT_FOUND,
+            message=f'{ErrorCode.ID_NOT_FOUND.value} -> {name}',
+        )
+
+    def new_code(self, name: str, kind: str, token=None) -> Code:
+        code = Code(name, kind, enclosing_code=self.code, token=token)
+        self.module.routines.append(code)
+        return code
+
+    def visit_program(self, node: Program):
+        self.code = self.new_code(node.name, 'program')
+        self.module.variables = declared_variables(node.block, temporaries=False)
+        self.scopes.append({})
+        self.visit(node.block)
+        self.code.emit(Opcode.RETURN)
+        self.scopes.pop()
+
+    def visit_block(self, node: Block):
+        scope = self.scopes[-1]
+        routines = []
+        for declaration in node.declarations:
+            if isinstance(declaration, VarDecl):
+                self.visit(declaration)
+            else:
+                # declare every routine of the block first, they may call each other
+                kind = 'function' if isinstance(declaration, FunctionDecl) else 'procedure'
+                name = declaration.token.value
+                routine = self.new_code(name, kind, token=declaration.token)
+                scope['routine', name] = len(self.module.routines) - 1
+                routines.append((declaration, routine))
+        for declaration, routine in routines:
+            self.compile_routine(declaration, routine)
+        self.visit(node.compound_statement)
+
+    def visit_vardecl(self, node: VarDecl):
+        self.declare_local(node.var_node.name)
+
+    def declare_local(self, name: str) -> int:
+        slot = len(self.code.local_names)
+        self.code.local_names.append(name)
+        self.scopes[-1]['var', name] = (self.code.level, slot)
+        return slot
+
+    def compile_routine(self, node, code: Code):
+        enclosing_code, enclosing_loops = self.code, self.loops
+        self.code, self.loops = code, []
+        self.scopes.append({})
+        for param in node.params:
+            self.declare_local(param.var_node.name)
+        code.param_count = len(node.params)
+        if code.kind == 'function':
+            # the function's name is its result variable inside its body
+            code.result_slot = len(node.params) + sum(
+                isinstance(declaration, VarDecl) for declaration in node.block.declarations
+            )
+            self.scopes[-1]['var', code.name] = (code.level, code.result_slot)
+        self.visit(node.block)
+        code.emit(Opcode.RETURN_VALUE if code.kind == 'function' else Opcode.RETURN)
+        self.scopes.pop()
+        self.code, self.loops = enclosing_code, enclosing_loops
+
+    def visit_procdecl(self, node: ProcedureDecl):
+        pass
+
+    def visit_funcdecl(self, node: FunctionDecl):
+        pass
+
+    def load(self, name: str):
+        level, slot = self.lookup(name, 'var')
+        if level == self.code.level:
+            self.code.emit(Opcode.LOAD_LOCAL, slot)
+        else:
+            self.code.emit(Opcode.LOAD_NONLOCAL, nonlocal_operand(level, slot))
+
+    def store(self, name: str):
+        level, slot = self.lookup(name, 'var')
+        if level == self.code.level:
+            self.code.emit(Opcode.STORE_LOCAL, slot)
+        else:
+            self.code.emit(Opcode.STORE_NONLOCAL, nonlocal_operand(level, slot))
+
+    def visit_binop(self, node: BinOp):
+        self.visit(node.left)
+        self.visit(node.right)
+        self.code.emit(BINARY_OPCODES[node.op.type])
+
+    def visit_unaryop(self, node: UnaryOp):
+        self.visit(node.factor)
+        self.code.emit(UNARY_OPCODES[node.op.type])
+
+    def visit_num(self, node: Num):
+        self.code.emit(Opcode.LOAD_CONST, self.module.constant(node.value))
+
+    def visit_boolean(self, node: Boolean):
+        self.code.emit(Opcode.LOAD_CONST, self.module.constant(node.value))
+
+    def visit_var(self, node: Var):
+        self.load(node.name)
+
+    def visit_assign(self, node: Assign):
+        self.visit(node.right)
+        self.store(node.left.name)
+
+    def visit_compound(self, node: Compound):
+        for child in node.childrens:
+            self.visit(child)
+
+    def visit_noop(self, node: NoOp):
+        pass
+
+    def call(self, name: str, actual_params: List):
+        for actual_param in actual_params:
+            self.visit(actual_param)
+        index = self.lookup(name, 'routine')
+        self.code.emit(Opcode.CALL, index)
+
+    def visit_proccall(self, node: ProcedureCall):
+        self.call(node.proc_name, node.actual_params)
+
+    def visit_funccall(self, node: FunctionCall):
+        self.call(node.func_name, node.actual_params)
+
+    def visit_condition(self, node: Condition):
+        self.visit(node.condition_node)
+        jump_to_else = self.code.emit(Opcode.POP_JUMP_IF_FALSE)
+        self.visit(node.then_node)
+        if node.else_node is None:
+            self.code.patch(jump_to_else, len(self.code))
+        else:
+            jump_to_end = self.code.emit(Opcode.JUMP)
+            self.code.patch(jump_to_else, len(self.code))
+            self.visit(node.else_node)
+            self.code.patch(jump_to_end, len(self.code))
+
+    def visit_then(self, node: Then):
+        self.visit(node.child)
+
+    def visit_else(self, node: Else):
+        self.visit(node.child)
+
+    def visit_while(self, node: WhileLoop):
+        loop = LoopLabels(start=len(self.code))
+        self.loops.append(loop)
+        self.visit(node.conditon_node)
+        exit_jump = self.code.emit(Opcode.POP_JUMP_IF_NOT_TRUE)
+        self.visit(node.body_node)
+        self.code.emit(Opcode.JUMP, loop.start)
+        end = len(self.code)
+        self.code.patch(exit_jump, end)
+        for index in loop.breaks:
+            self.code.patch(index, end)
+        self.loops.pop()
+
+    def visit_continue(self, node: Continue):
+        self.code.emit(Opcode.JUMP, self.loops[-1].start)
+
+    def visit_break(self, node: Break):
+        self.loops[-1].breaks.append(self.code.emit(Opcode.JUMP))
+
+
+def disassemble(module: Module) -> str:
+    """Return a readable listing of every routine of the module."""
+    lines = []
+    for index, code in enumerate(module.routines):
+        names = list(code.local_names)
+        if code.result_slot is not None:
+            names.append(code.name)
+        lines.append(
+            f'routine {index}: {code.kind} {code.name} '
+            f'(level {code.level}, {code.param_count} params, locals: {", ".join(names) or "-"})'
+        )
+        instructions = code.instructions
+        for index in range(len(code)):
+            opcode, operand = Opcode(instructions[2 * index]), instructions[2 * index + 1]
+            lines.append(f'  {index:>5} {opcode.name:<22} {describe(module, code, opcode, operand)}'.rstrip())
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def describe(module: Module, code: Code, opcode: Opcode, operand: int) -> str:
+    if opcode is Opcode.LOAD_CONST:
+        return f'{operand} ({module.constants[operand]!r})'
+    if opcode in (Opcode.LOAD_LOCAL, Opcode.STORE_LOCAL):
+        return f'{operand} ({local_name(code, operand)})'
+    if opcode in (Opcode.LOAD_NONLOCAL, Opcode.STORE_NONLOCAL):
+        level, slot = operand & LEVEL_MASK, operand >> LEVEL_BITS
+        owner = code
+        while owner.level != level:
+            owner = owner.enclosing_code
+        return f'{level}:{slot} ({local_name(owner, slot)})'
+    if opcode in (Opcode.JUMP, Opcode.POP_JUMP_IF_FALSE, Opcode.POP_JUMP_IF_NOT_TRUE):
+        return f'-> {operand}'
+    if opcode is Opcode.CALL:
+        return f'{operand} ({module.routines[operand].name})'
+    return ''
+
+
+def local_name(code: Code, slot: int) -> str:
+    if slot == code.result_slot:
+        return code.name
+    return code.local_names[slot]
+
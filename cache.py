@@ -0,0 +1,205 @@
+# On-disk cache of the analyzed programs, like python's __pycache__: a
+# program run again is neither tokenized, parsed nor analyzed again
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+
+from astnodes import Program
+from interpreter import Interpreter
+from parser import Parser
+from source import open_source
+
+VERSION = '1.0'
+
+# directory of the cache, next to the programs by default
+CACHE_DIRECTORY = '__spicache__'
+# bytes the cached programs may take before the least recently used are evicted
+DEFAULT_MAX_SIZE = 64 * 2 ** 20
+# share of the size an eviction trims the cache to, so the next stores do not evict again
+LOW_WATER_MARK = 0.75
+# stores after which the directory is listed again, other processes sharing it store too
+RESCAN_INTERVAL = 256
+
+MAGIC = b'SPI\x00'
+CHECKSUM_SIZE = hashlib.sha256().digest_size
+SUFFIX = '.pickle'
+CHUNK_SIZE = 1 << 16
+
+
+def interpreter_version() -> str:
+    """Hash the interpreter's own modules, a cached tree is only valid for the code which built it."""
+    digest = hashlib.sha256(VERSION.encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.py') and not name.startswith('test_'):
+            digest.update(name.encode())
+            with open(os.path.join(directory, name), 'rb') as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+class ProgramCache(object):
+    """
+    ProgramCache stores analyzed trees in a directory, one file per
+    source content, interpreter version and options. A file is written
+    aside and renamed in place, and is checked and dropped when it does
+    not load back
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE, version: str = None):
+        self.directory = directory
+        self.max_size = max_size
+        self.version = version if version is not None else interpreter_version()
+        # estimate of the bytes cached, counting the stores since the directory was last listed
+        self.size = None
+        self.stores = 0
+
+    def key(self, path: str, **options) -> str:
+        """Return the key of the program in the file at path, run with the given options."""
+        digest = hashlib.sha256(self.version.encode())
+        digest.update(repr(sorted(options.items())).encode())
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def load(self, key: str) -> Program:
+        """Return the program cached under key, None when there is no valid one."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        try:
+            program = self.decode(key, data)
+        except Exception:
+            program = None
+        if program is None:
+            self.remove(path)
+            return None
+        # the eviction goes by the time of the last use
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return program
+
+    def decode(self, key: str, data: bytes) -> Program:
+        header_size = len(MAGIC) + CHECKSUM_SIZE
+        if data[:len(MAGIC)] != MAGIC:
+            return None
+        payload = data[header_size:]
+        if hashlib.sha256(payload).digest() != data[len(MAGIC):header_size]:
+            return None
+        # every node loaded stays alive, collecting while they are built
+        # only walks them again and again
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            version, stored_key, program = pickle.loads(payload)
+        finally:
+            if collecting:
+                gc.enable()
+        if version != self.version or stored_key != key or not isinstance(program, Program):
+            return None
+        return program
+
+    def store(self, key: str, program: Program) -> bool:
+        """Cache the program under key, return whether it could be written."""
+        try:
+            payload = pickle.dumps((self.version, key, program), protocol=pickle.HIGHEST_PROTOCOL)
+        except (RecursionError, pickle.PicklingError):
+            # too deep a tree, it is analyzed again next time
+            return False
+        data = MAGIC + hashlib.sha256(payload).digest() + payload
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=self.directory, prefix='.', suffix='.tmp')
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            # readers see either no file or the whole of it
+            os.replace(temporary, self.path(key))
+        except OSError:
+            self.remove(temporary)
+            return False
+        # listing and sorting the directory on every store fills it in quadratic time
+        self.stores += 1
+        if self.size is None or self.stores >= RESCAN_INTERVAL:
+            self.size = sum(entry[1] for entry in self.entries())
+            self.stores = 0
+        else:
+            self.size += len(data)
+        if self.size > self.max_size:
+            self.evict(int(self.max_size * LOW_WATER_MARK))
+        return True
+
+    def entries(self) -> list:
+        """(last use, size, path) of the cached programs."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self, size: int = None):
+        """Remove the least recently used programs until the cache fits in size, its max_size by default."""
+        if size is None:
+            size = self.max_size
+        entries = sorted(self.entries())
+        total = sum(entry[1] for entry in entries)
+        for _, entry_size, path in entries:
+            if total <= size:
+                break
+            self.remove(path)
+            total -= entry_size
+        self.size = total
+        self.stores = 0
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self.remove(path)
+        self.size = None
+
+    @staticmethod
+    def remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_program(interpreter: Interpreter, path: str, tokenizer_class, cache: ProgramCache = None) -> bool:
+    """Give the interpreter the program in the file at path, analyzed or found in the cache,
+    and return whether it was found."""
+    if cache is not None:
+        key = cache.key(path, optimize=interpreter.optimizer is not None)
+        program = cache.load(key)
+        if program is not None:
+            # the source isn't even read
+            interpreter.program = program
+            return True
+    with open_source(path) as source:
+        interpreter.parser = Parser(tokenizer_class(source))
+        interpreter.analyze()
+    if cache is not None:
+        cache.store(key, interpreter.program)
+    return False
@@ -8,32 +8,36 @@ class FrameType(Enum):
 
 
 class Frame(object):
-    def __init__(self, name: str, type: FrameType):
+    """
+    Frame holds the values of a scope's variables and routines in a
+    fixed size list, indexed by the slots the semantic analyzer resolved
+    """
+
+    # a deep recursion holds as many frames
+    __slots__ = ('enclosing_frame', 'scope_level', 'saved_display', 'name', 'type', 'nesting_level',
+                 'return_val', 'slot_names', 'slots')
+
+    def __init__(self, name: str, type: FrameType, slot_names=(), scope_level=1):
+        # frame of the caller
         self.enclosing_frame = None
+        # level of the frame's scope, the program's is 1
+        self.scope_level = scope_level
+        # display entry of that level while the frame is active
+        self.saved_display = None
         self.name = name
         self.type = type
         self.nesting_level = None
         self.return_val = None
-        self.members = {}
-
-    def define(self, key):
-        self.members[key] = None
-
-    def get_value(self, key):
-        if key in self.members.keys():
-            return self.members[key]
-        elif self.enclosing_frame is not None:
-            return self.enclosing_frame.get_value(key)
-        else:
-            raise Exception('undefined id: %s' % key)
-
-    def set_value(self, key, value):
-        if key in self.members.keys():
-            self.members[key] = value
-        elif self.enclosing_frame is not None:
-            self.enclosing_frame.set_value(key, value)
-        else:
-            raise Exception('undefined id: %s' % key)
+        self.slot_names = slot_names
+        self.slots = [None] * len(slot_names)
+
+    def restart(self, actual_param_values: list):
+        """Reuse the frame for another call of its routine, as a new frame would start."""
+        slots = self.slots
+        count = len(actual_param_values)
+        slots[:count] = actual_param_values
+        slots[count:] = [None] * (len(slots) - count)
+        self.return_val = None
 
     def __str__(self):
         lines = [
@@ -43,7 +47,7 @@ class Frame(object):
                 name=self.name,
             )
         ]
-        for name, val in self.members.items():
+        for name, val in zip(self.slot_names, self.slots):
             lines.append(f'   {name:<20}: {val}')
 
         s = '\n'.join(lines)
@@ -54,10 +58,18 @@ class Frame(object):
 
 
 class CallStack(object):
-    def __init__(self):
+    def __init__(self, budget=None):
         self.__frames = []
+        # Budget charged with the depth and the frames of the calls, None is unlimited
+        self.budget = budget
+        # display[level] is the innermost active frame of the scope at
+        # that level, a variable is found in one index whatever the
+        # depth of the calls or of the scopes
+        self.display = [None]
 
     def push(self, frame: Frame):
+        if self.budget is not None:
+            self.budget.enter(len(frame.slots), frame.name)
         current_frame: Frame = self.peek()
         if current_frame is None:
             frame.nesting_level = 1
@@ -65,13 +77,22 @@ class CallStack(object):
         else:
             frame.enclosing_frame = current_frame
             frame.nesting_level = current_frame.nesting_level + 1
+        display = self.display
+        level = frame.scope_level
+        while len(display) <= level:
+            display.append(None)
+        frame.saved_display = display[level]
+        display[level] = frame
         self.__frames.append(frame)
 
     def pop(self):
-        self.__frames.pop()
+        frame = self.__frames.pop()
+        self.display[frame.scope_level] = frame.saved_display
+        if self.budget is not None:
+            self.budget.leave(len(frame.slots))
 
     def peek(self):
-        if len(self.__frames) is 0:
+        if len(self.__frames) == 0:
             return None
         return self.__frames[-1]
 
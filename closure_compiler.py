@@ -0,0 +1,367 @@
+import operator
+from typing import Callable
+
+from astnodes import BinOp, Num, UnaryOp, Compound, Var, Assign, NoOp, Program, Block, VarDecl, \
+    ProcedureDecl, ProcedureCall, Boolean, Condition, Then, Else, FunctionDecl, FunctionCall, WhileLoop, \
+    Continue, Break, variable_values
+from budget import Budget
+from callstack import CallStack, Frame, FrameType
+from errors import RuntimeError, ErrorCode, Signal
+from memo import Memoizer, memo_key
+from tracing import Tracer
+from tokens import TokenType
+from visitor import Visitor
+
+
+BINARY_OPERATORS = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.MUL: operator.mul,
+    TokenType.INTEGER_DIV: operator.floordiv,
+    TokenType.FLOAT_DIV: operator.truediv,
+    TokenType.MOD: operator.mod,
+    TokenType.AND: lambda left, right: left and right,
+    TokenType.OR: lambda left, right: left or right,
+    TokenType.EQUALS: operator.eq,
+    TokenType.NOT_EQUALS: operator.ne,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUALS: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUALS: operator.le,
+}
+
+UNARY_OPERATORS = {
+    TokenType.PLUS: operator.pos,
+    TokenType.MINUS: operator.neg,
+    TokenType.NOT: operator.not_,
+}
+
+
+class ClosureCompiler(Visitor):
+    """
+    ClosureCompiler compiles a checked AST once into a tree of python
+    closures, one for each node, with the operators resolved and the
+    routine bodies compiled ahead of time. Running the closures gives
+    the same results and the same trace as visiting the tree with Interpreter.
+
+    Expression closures return their value, statement closures return
+    None or a Signal when a BREAK or CONTINUE is executed
+    """
+
+    def __init__(self, tracer: Tracer = None, memoizer: Memoizer = None, budget: Budget = None):
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.memoizer = memoizer
+        self.budget = budget
+        self.callstack = CallStack(budget)
+        # name of the function whose body is being compiled
+        self.function_name = None
+        # declaration node -> compiled block of every procedure and function
+        self.routines = {}
+
+    def compile(self, node: Program) -> Callable[[], dict]:
+        """Compile the program, the returned closure runs it and returns its globals."""
+        return self.visit(node)
+
+    def error(self, error_code: ErrorCode, token):
+        raise RuntimeError(
+            error_code=error_code,
+            token=token,
+            message=f'{error_code.value} -> {token}',
+        )
+
+    def visit_binop(self, node: BinOp):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        op = BINARY_OPERATORS[node.op.type]
+        if isinstance(node.right, Num):
+            value = node.right.value
+            return lambda: op(left(), value)
+        return lambda: op(left(), right())
+
+    def visit_num(self, node: Num):
+        value = node.value
+        return lambda: value
+
+    def visit_boolean(self, node: Boolean):
+        value = node.value
+        return lambda: value
+
+    def visit_unaryop(self, node: UnaryOp):
+        factor = self.visit(node.factor)
+        op = UNARY_OPERATORS[node.op.type]
+        return lambda: op(factor())
+
+    def visit_compound(self, node: Compound):
+        statements = tuple(self.visit(child) for child in node.childrens)
+
+        def run_compound():
+            for statement in statements:
+                signal = statement()
+                if signal is not None:
+                    return signal
+
+        return run_compound
+
+    def visit_var(self, node: Var):
+        display = self.callstack.display
+        scope_level, slot = node.scope_level, node.slot
+        return lambda: display[scope_level].slots[slot]
+
+    def visit_assign(self, node: Assign):
+        callstack = self.callstack
+        var_name = node.left.name
+        right = self.visit(node.right)
+        if var_name == self.function_name:
+            # assigning the function's name sets its return value
+            def assign_return():
+                callstack.peek().return_val = right()
+
+            return assign_return
+
+        display = callstack.display
+        scope_level, slot = node.left.scope_level, node.left.slot
+
+        def assign():
+            value = right()
+            display[scope_level].slots[slot] = value
+
+        return assign
+
+    def visit_noop(self, node: NoOp):
+        return lambda: None
+
+    def visit_program(self, node: Program):
+        callstack = self.callstack
+        tracer = self.tracer
+        summary = tracer.summary
+        program_name = node.name
+        block = self.visit(node.block)
+        program_block = node.block
+        slot_names = program_block.slot_names
+
+        def run_program():
+            if summary:
+                tracer.write(f'ENTER: PROGRAM {program_name}')
+            frame = Frame(name=program_name, type=FrameType.PROGRAM, slot_names=slot_names)
+            callstack.push(frame)
+            block()
+            if summary:
+                tracer.write(str(callstack))
+            callstack.pop()
+            if summary:
+                tracer.write(f'LEAVE: PROGRAM {program_name}')
+            return variable_values(program_block, frame.slots)
+
+        return run_program
+
+    def visit_block(self, node: Block):
+        declarations = tuple(self.visit(declaration) for declaration in node.declarations)
+        compound_statement = self.visit(node.compound_statement)
+
+        def run_block():
+            for declaration in declarations:
+                declaration()
+            return compound_statement()
+
+        return run_block
+
+    def visit_vardecl(self, node: VarDecl):
+        # the variable's slot is allocated with the frame
+        return lambda: None
+
+    def declare_routine(self, node):
+        """Compile a procedure or function body and return its runtime declaration."""
+        callstack = self.callstack
+        name = node.token.value
+        slot = node.slot
+        enclosing_function = self.function_name
+        self.function_name = name if isinstance(node, FunctionDecl) else None
+        self.routines[node] = self.visit(node.block)
+        self.function_name = enclosing_function
+
+        def declare():
+            callstack.peek().slots[slot] = node
+
+        return declare
+
+    def visit_procdecl(self, node: ProcedureDecl):
+        return self.declare_routine(node)
+
+    def visit_funcdecl(self, node: FunctionDecl):
+        return self.declare_routine(node)
+
+    def tail_call(self, node, kind: str, name: str):
+        """Compile a routine's call of itself as its last statement, which reuses its frame."""
+        callstack = self.callstack
+        tracer = self.tracer
+        calls, full = tracer.calls, tracer.full
+        budget = self.budget
+        token = node.token
+        actual_params = tuple(self.visit(actual_param) for actual_param in node.actual_params)
+
+        def call_tail():
+            actual_param_values = [actual_param() for actual_param in actual_params]
+            if full:
+                tracer.write(str(callstack))
+            if calls:
+                tracer.write(f'LEAVE: {kind} {name}')
+                tracer.write(f'ENTER: {kind} {name}')
+            if budget is not None:
+                budget.step(token)
+            callstack.peek().restart(actual_param_values)
+            return Signal.TAIL_CALL
+
+        return call_tail
+
+    def visit_proccall(self, node: ProcedureCall):
+        if node.tail:
+            return self.tail_call(node, 'PROCEDURE', node.proc_name)
+        callstack = self.callstack
+        tracer = self.tracer
+        calls, full = tracer.calls, tracer.full
+        routines = self.routines
+        proc_name = node.proc_name
+        scope_level, slot = node.scope_level, node.slot
+        display = callstack.display
+        actual_params = tuple(self.visit(actual_param) for actual_param in node.actual_params)
+
+        def call_procedure():
+            proc_node: ProcedureDecl = display[scope_level].slots[slot]
+            if calls:
+                tracer.write(f'ENTER: PROCEDURE {proc_name}')
+            actual_param_values = [actual_param() for actual_param in actual_params]
+            proc_frame = Frame(name=proc_name, type=FrameType.PROCEDURE,
+                               slot_names=proc_node.block.slot_names, scope_level=scope_level + 1)
+            proc_frame.slots[:len(actual_param_values)] = actual_param_values
+            callstack.push(proc_frame)
+            run_body = routines[proc_node]
+            while run_body() is Signal.TAIL_CALL:
+                # the procedure called itself last, in this frame
+                pass
+            if full:
+                tracer.write(str(callstack))
+            callstack.pop()
+            if calls:
+                tracer.write(f'LEAVE: PROCEDURE {proc_name}')
+
+        return call_procedure
+
+    def visit_funccall(self, node: FunctionCall):
+        if node.tail:
+            return self.tail_call(node, 'FUNCTION', node.func_name)
+        callstack = self.callstack
+        tracer = self.tracer
+        calls, full = tracer.calls, tracer.full
+        routines = self.routines
+        error = self.error
+        func_name = node.func_name
+        scope_level, slot = node.scope_level, node.slot
+        display = callstack.display
+        actual_params = tuple(self.visit(actual_param) for actual_param in node.actual_params)
+
+        def invoke(func_node: FunctionDecl, actual_param_values: list):
+            """Run the function's body in a new frame, once its call is traced and its arguments computed."""
+            func_frame = Frame(name=func_name, type=FrameType.FUNCTION,
+                               slot_names=func_node.block.slot_names, scope_level=scope_level + 1)
+            func_frame.slots[:len(actual_param_values)] = actual_param_values
+            callstack.push(func_frame)
+            run_body = routines[func_node]
+            run_body()
+            while func_frame.return_val is Signal.TAIL_CALL:
+                # the function's result is its own call's, made in this frame
+                func_frame.return_val = None
+                run_body()
+            if full:
+                tracer.write(str(callstack))
+            if calls:
+                tracer.write(f'LEAVE: FUNCTION {func_name}')
+            return_val = func_frame.return_val
+            callstack.pop()
+            if return_val is None:
+                error(error_code=ErrorCode.MISSING_RETURN, token=node.token)
+            return return_val
+
+        def call_function():
+            func_node: FunctionDecl = display[scope_level].slots[slot]
+            if calls:
+                tracer.write(f'ENTER: FUNCTION {func_name}')
+            return invoke(func_node, [actual_param() for actual_param in actual_params])
+
+        if self.memoizer is None:
+            return call_function
+        caches = self.memoizer.caches
+
+        def call_memoized():
+            func_node: FunctionDecl = display[scope_level].slots[slot]
+            cache = caches.get(func_node)
+            if cache is None:
+                return call_function()
+            if calls:
+                tracer.write(f'ENTER: FUNCTION {func_name}')
+            actual_param_values = [actual_param() for actual_param in actual_params]
+            key = memo_key(actual_param_values)
+            return_val = cache.get(key)
+            if return_val is not None:
+                if calls:
+                    tracer.write(f'LEAVE: FUNCTION {func_name}')
+                return return_val
+            return_val = invoke(func_node, actual_param_values)
+            cache.put(key, return_val)
+            return return_val
+
+        return call_memoized
+
+    def visit_condition(self, node: Condition):
+        condition = self.visit(node.condition_node)
+        then = self.visit(node.then_node)
+        if node.else_node is None:
+            def run_if():
+                if condition():
+                    return then()
+
+            return run_if
+
+        else_ = self.visit(node.else_node)
+
+        def run_if_else():
+            if condition():
+                return then()
+            return else_()
+
+        return run_if_else
+
+    def visit_then(self, node: Then):
+        return self.visit(node.child)
+
+    def visit_else(self, node: Else):
+        return self.visit(node.child)
+
+    def visit_while(self, node: WhileLoop):
+        condition = self.visit(node.conditon_node)
+        body = self.visit(node.body_node)
+        budget = self.budget
+
+        if budget is None:
+            def run_while():
+                while condition() is True:
+                    if body() is Signal.BREAK:
+                        break
+
+            return run_while
+
+        step = budget.step
+        token = node.token
+
+        def run_budgeted_while():
+            while condition() is True:
+                step(token)
+                if body() is Signal.BREAK:
+                    break
+
+        return run_budgeted_while
+
+    def visit_continue(self, node: Continue):
+        return lambda: Signal.CONTINUE
+
+    def visit_break(self, node: Break):
+        return lambda: Signal.BREAK
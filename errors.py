@@ -1,12 +1,12 @@
 from enum import Enum
 
 
-class BreakError(Exception):
-    pass
-
-
-class ContinueError(Exception):
-    pass
+class Signal(Enum):
+    """Completion of a statement which leaves its enclosing loop or routine body early"""
+    BREAK = 'BREAK'
+    CONTINUE = 'CONTINUE'
+    # the routine calls itself last, its body runs again in the same frame
+    TAIL_CALL = 'TAIL_CALL'
 
 
 class ErrorCode(Enum):
@@ -18,6 +18,10 @@ class ErrorCode(Enum):
     MISSING_RETURN = 'Function missing return value'
     BREAK_OUTSIDE_LOOP = 'Break outside loop'
     CONTINUE_OUTSIDE_LOOP = 'Continue outside loop'
+    STEP_BUDGET_EXCEEDED = 'Step budget exceeded'
+    DEPTH_BUDGET_EXCEEDED = 'Call depth budget exceeded'
+    TIME_BUDGET_EXCEEDED = 'Time budget exceeded'
+    MEMORY_BUDGET_EXCEEDED = 'Frame memory budget exceeded'
 
 
 class Error(Exception):
@@ -1,23 +1,69 @@
 from astnodes import BinOp, Num, UnaryOp, Compound, Var, Assign, Program, \
     Block, VarDecl, ProcedureDecl, ProcedureCall, Boolean, Condition, Then, Else, FunctionDecl, FunctionCall, WhileLoop, \
-    Continue, Break
+    Continue, Break, variable_values
+from analysis import CallGraph, mark_tail_calls
+from budget import Budget
+from bytecode import Compiler
 from callstack import CallStack, Frame, FrameType
+from closure_compiler import ClosureCompiler
+from memo import Memoizer, memo_key
+from optimizer import Optimizer
 from parser import Parser
 from semantic_analyzer import SemanticAnalyzer
+from stack_evaluator import StackEvaluator, DEFAULT_SLICE_STEPS
 from tokens import TokenType
+from transpiler import Transpiler
 from visitor import Visitor
-from errors import RuntimeError, ErrorCode, ContinueError, BreakError
+from vm import VirtualMachine
+from errors import RuntimeError, ErrorCode, Signal
+from tracing import Tracer
+
+
+def resolve_slots(ast: Program):
+    """Resolve the slots of an optimized program again, its passes drop routines and declare temporaries."""
+    # the program was checked and traced before, this analysis is silent
+    SemanticAnalyzer().visit(ast)
 
 
 class Interpreter(Visitor):
     """
-    Interpreter inherit from Visitor and interpret it when visiting the abstract syntax tree
+    Interpreter inherit from Visitor and interpret it when visiting the abstract syntax tree,
+    or hands the tree over to another execution engine
     """
 
-    def __init__(self, parser: Parser):
+    ENGINES = ('tree', 'closure', 'vm', 'python', 'stack')
+
+    # engines able to memoize the results of the pure functions
+    MEMOIZING_ENGINES = ('tree', 'closure')
+
+    # engines able to hold a run to a budget, the python one runs natively
+    BUDGETED_ENGINES = ('tree', 'closure', 'vm', 'stack')
+
+    # engines able to pause a run and resume it, the others keep their state on python's stack
+    ASYNC_ENGINES = ('stack',)
+
+    def __init__(self, parser: Parser, engine: str = 'tree', tracer: Tracer = None, optimize: bool = False,
+                 memoize: bool = False, program: Program = None, budget: Budget = None):
+        if engine not in self.ENGINES:
+            raise ValueError(f'unknown engine: {engine}')
+        if memoize and engine not in self.MEMOIZING_ENGINES:
+            raise ValueError(f'the {engine} engine does not memoize')
+        if budget is not None and engine not in self.BUDGETED_ENGINES:
+            raise ValueError(f'the {engine} engine does not keep to a budget')
         self.parser = parser
-        self.analyzer = SemanticAnalyzer()
-        self.callstack = CallStack()
+        self.engine = engine
+        # tracing is off unless a tracer is given
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.analyzer = SemanticAnalyzer(tracer=self.tracer)
+        self.optimizer = Optimizer(tracer=self.tracer) if optimize else None
+        self.memoize = memoize
+        # caches of the pure functions' results, set by analyze() when memoizing
+        self.memoizer: Memoizer = None
+        # limits of the run, None runs without any
+        self.budget = budget
+        self.callstack = CallStack(budget)
+        # the checked program, when given it was analyzed before and the parser is left alone
+        self.program = program
 
     def error(self, error_code: ErrorCode, token):
         raise RuntimeError(
@@ -26,9 +72,6 @@ class Interpreter(Visitor):
             message=f'{error_code.value} -> {token}',
         )
 
-    def log(self, msg):
-        print(msg)
-
     def visit_binop(self, node: BinOp):
         left_val = self.visit(node.left)
         right_val = self.visit(node.right)
@@ -78,143 +121,227 @@ class Interpreter(Visitor):
 
     def visit_compound(self, node: Compound):
         for child in node.childrens:
-            self.visit(child)
+            signal = self.visit(child)
+            # a BREAK or CONTINUE skips the rest of the loop body
+            if signal is not None:
+                return signal
 
     def visit_var(self, node: Var):
-        current_frame: Frame = self.callstack.peek()
-        # get value by variable's name
-        val = current_frame.get_value(node.name)
-        return val
+        # get value by the variable's resolved scope and slot
+        return self.callstack.display[node.scope_level].slots[node.slot]
 
     def visit_assign(self, node: Assign):
-        var_name = node.left.name  # get variable's name
+        var = node.left
         var_value = self.visit(node.right)
         current_frame: Frame = self.callstack.peek()
-        if current_frame.type is FrameType.FUNCTION and current_frame.name == var_name:
+        if current_frame.type is FrameType.FUNCTION and current_frame.name == var.name:
             current_frame.return_val = var_value
         else:
-            current_frame.set_value(var_name, var_value)
+            self.callstack.display[var.scope_level].slots[var.slot] = var_value
 
     def visit_program(self, node: Program):
         program_name = node.name
 
-        self.log(f'ENTER: PROGRAM {program_name}')
+        tracer = self.tracer
+        if tracer.summary:
+            tracer.write(f'ENTER: PROGRAM {program_name}')
 
-        frame = Frame(name=program_name, type=FrameType.PROGRAM)
+        frame = Frame(name=program_name, type=FrameType.PROGRAM, slot_names=node.block.slot_names)
 
         self.callstack.push(frame)
         self.visit(node.block)
 
-        self.log(str(self.callstack))
+        if tracer.summary:
+            tracer.write(str(self.callstack))
 
         self.callstack.pop()
-        self.log(f'LEAVE: PROGRAM {program_name}')
+        if tracer.summary:
+            tracer.write(f'LEAVE: PROGRAM {program_name}')
+        return variable_values(node.block, frame.slots)
 
     def visit_block(self, node: Block):
         for declaration in node.declarations:
             self.visit(declaration)
-        self.visit(node.compound_statement)
+        return self.visit(node.compound_statement)
 
     def visit_vardecl(self, node: VarDecl):
-        var_name = node.var_node.name
-        current_frame: Frame = self.callstack.peek()
-        current_frame.define(var_name)
+        # the variable's slot is allocated with the frame
+        pass
 
     def visit_procdecl(self, node: ProcedureDecl):
-        proc_name = node.token.value
         current_frame: Frame = self.callstack.peek()
-        current_frame.define(proc_name)
-        current_frame.set_value(proc_name, node)
+        current_frame.slots[node.slot] = node
 
     def visit_proccall(self, node: ProcedureCall):
         proc_name = node.proc_name
-        current_frame = self.callstack.peek()
-        proc_node: ProcedureDecl = current_frame.get_value(proc_name)
+        if node.tail:
+            return self.tail_call(node, 'PROCEDURE', proc_name)
+        proc_node: ProcedureDecl = self.callstack.display[node.scope_level].slots[node.slot]
 
-        self.log(f'ENTER: PROCEDURE {proc_name}')
+        tracer = self.tracer
+        if tracer.calls:
+            tracer.write(f'ENTER: PROCEDURE {proc_name}')
 
         # get actual params values
         actual_param_values = [self.visit(actual_param)
                                for actual_param in node.actual_params]
 
-        proc_frame = Frame(name=proc_name, type=FrameType.PROCEDURE)
+        proc_frame = Frame(name=proc_name, type=FrameType.PROCEDURE,
+                           slot_names=proc_node.block.slot_names, scope_level=node.scope_level + 1)
+        # map actual params to formal params, the first slots
+        proc_frame.slots[:len(actual_param_values)] = actual_param_values
 
         self.callstack.push(proc_frame)
-        current_frame: Frame = self.callstack.peek()
-
-        # map actual params to formal params
-        for (formal_param, actual_param_value) in zip(proc_node.params, actual_param_values):
-            current_frame.define(formal_param.var_node.name)
-            current_frame.set_value(formal_param.var_node.name, actual_param_value)
 
-        self.visit(proc_node.block)
-        self.log(str(self.callstack))
+        while self.visit(proc_node.block) is Signal.TAIL_CALL:
+            # the procedure called itself last, in this frame
+            pass
+        if tracer.full:
+            tracer.write(str(self.callstack))
 
         self.callstack.pop()
-        self.log(f'LEAVE: PROCEDURE {proc_name}')
+        if tracer.calls:
+            tracer.write(f'LEAVE: PROCEDURE {proc_name}')
 
     def visit_funcdecl(self, node: FunctionDecl):
-        func_name = node.token.value
         current_frame: Frame = self.callstack.peek()
-        current_frame.define(func_name)
-        current_frame.set_value(func_name, node)
+        current_frame.slots[node.slot] = node
 
     def visit_funccall(self, node: FunctionCall):
-        current_frame = self.callstack.peek()
         func_name = node.func_name
-        func_node: FunctionDecl = current_frame.get_value(func_name)
+        if node.tail:
+            return self.tail_call(node, 'FUNCTION', func_name)
+        func_node: FunctionDecl = self.callstack.display[node.scope_level].slots[node.slot]
 
-        self.log(f'ENTER: FUNCTION {func_name}')
-        func_frame = Frame(name=func_name, type=FrameType.FUNCTION)
-        self.callstack.push(func_frame)
-        current_frame: Frame = self.callstack.peek()
+        tracer = self.tracer
+        if tracer.calls:
+            tracer.write(f'ENTER: FUNCTION {func_name}')
 
-        # get actual params values to formal params
+        # get actual params values, the args are resolved in the caller's scope
         actual_param_values = [self.visit(actual_param)
                                for actual_param in node.actual_params]
 
-        for (formal_param, actual_param_value) in zip(func_node.params, actual_param_values):
-            current_frame.define(formal_param.var_node.name)
-            current_frame.set_value(formal_param.var_node.name, actual_param_value)
+        cache = self.memoizer.caches.get(func_node) if self.memoizer is not None else None
+        if cache is not None:
+            key = memo_key(actual_param_values)
+            return_val = cache.get(key)
+            if return_val is not None:
+                if tracer.calls:
+                    tracer.write(f'LEAVE: FUNCTION {func_name}')
+                return return_val
+
+        func_frame = Frame(name=func_name, type=FrameType.FUNCTION,
+                           slot_names=func_node.block.slot_names, scope_level=node.scope_level + 1)
+        func_frame.slots[:len(actual_param_values)] = actual_param_values
+        self.callstack.push(func_frame)
 
         self.visit(func_node.block)
-        self.log(str(self.callstack))
-        self.log(f'LEAVE: FUNCTION {func_name}')
-
-        return_val = current_frame.return_val
+        while func_frame.return_val is Signal.TAIL_CALL:
+            # the function's result is its own call's, made in this frame
+            func_frame.return_val = None
+            self.visit(func_node.block)
+        if tracer.full:
+            tracer.write(str(self.callstack))
+        if tracer.calls:
+            tracer.write(f'LEAVE: FUNCTION {func_name}')
+
+        return_val = func_frame.return_val
         self.callstack.pop()
         if return_val is None:
             self.error(error_code=ErrorCode.MISSING_RETURN, token=node.token)
+        if cache is not None:
+            cache.put(key, return_val)
         return return_val
 
+    def tail_call(self, node, kind: str, name: str) -> Signal:
+        """End the current call of a routine and start its tail call in the same frame."""
+        actual_param_values = [self.visit(actual_param) for actual_param in node.actual_params]
+        tracer = self.tracer
+        if tracer.full:
+            tracer.write(str(self.callstack))
+        if tracer.calls:
+            tracer.write(f'LEAVE: {kind} {name}')
+            tracer.write(f'ENTER: {kind} {name}')
+        if self.budget is not None:
+            self.budget.step(node.token)
+        self.callstack.peek().restart(actual_param_values)
+        return Signal.TAIL_CALL
+
     def visit_condition(self, node: Condition):
         if self.visit(node.condition_node):
-            self.visit(node.then_node)
+            return self.visit(node.then_node)
         elif node.else_node is not None:
-            self.visit(node.else_node)
+            return self.visit(node.else_node)
 
     def visit_then(self, node: Then):
-        self.visit(node.child)
+        return self.visit(node.child)
 
     def visit_else(self, node: Else):
-        self.visit(node.child)
+        return self.visit(node.child)
 
     def visit_while(self, node: WhileLoop):
+        budget = self.budget
         while self.visit(node.conditon_node) is True:
-            try:
-                self.visit(node.body_node)
-            except ContinueError:
-                continue
-            except BreakError:
+            if budget is not None:
+                budget.step(node.token)
+            if self.visit(node.body_node) is Signal.BREAK:
                 break
 
     def visit_continue(self, node: Continue):
-        raise ContinueError()
+        return Signal.CONTINUE
 
     def visit_break(self, node: Break):
-        raise BreakError()
-
-    def interpret(self):
-        ast = self.parser.parse()
-        self.analyzer.visit(ast)
-        self.visit(ast)
+        return Signal.BREAK
+
+    def analyze(self) -> Program:
+        """Parse and check the program, and optimize it if asked to."""
+        if self.program is None:
+            ast = self.parser.parse()
+            # the whole program is checked, dead code included, whether it is optimized or not
+            self.analyzer.visit(ast)
+            if self.optimizer is not None:
+                ast = self.optimizer.optimize(ast)
+                resolve_slots(ast)
+            mark_tail_calls(ast)
+            self.program = ast
+        ast = self.program
+        if self.memoize and self.memoizer is None:
+            self.memoizer = Memoizer(routine for routine in CallGraph(ast).pure_routines()
+                                     if isinstance(routine, FunctionDecl))
+        return ast
+
+    def interpret(self) -> dict:
+        """Run the program and return the final values of its global variables."""
+        ast = self.analyze()
+        budget = self.budget
+        if self.engine == 'closure':
+            run = ClosureCompiler(tracer=self.tracer, memoizer=self.memoizer, budget=budget).compile(ast)
+        elif self.engine == 'vm':
+            run = VirtualMachine(Compiler().compile(ast), budget=budget).run
+        elif self.engine == 'python':
+            run = Transpiler().compile(ast)
+        elif self.engine == 'stack':
+            evaluator = StackEvaluator(tracer=self.tracer, budget=budget)
+            run = lambda: evaluator.run(ast)
+        else:
+            run = lambda: self.visit(ast)
+        if budget is not None:
+            # the clock starts once the program is compiled
+            budget.start()
+        result = run()
+        if self.memoizer is not None and self.tracer.summary:
+            self.memoizer.trace(self.tracer)
+        return result
+
+    async def run_async(self, slice_steps: int = DEFAULT_SLICE_STEPS) -> dict:
+        """Run the program like interpret(), giving control back to the event loop every
+        slice_steps loop iterations and routine calls."""
+        if self.engine not in self.ASYNC_ENGINES:
+            raise ValueError(f'the {self.engine} engine does not run asynchronously')
+        if slice_steps < 1:
+            raise ValueError(f'a slice runs at least one step, not {slice_steps}')
+        ast = self.analyze()
+        evaluator = StackEvaluator(tracer=self.tracer, budget=self.budget)
+        if self.budget is not None:
+            self.budget.start()
+        return await evaluator.run_async(ast, slice_steps)
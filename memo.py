@@ -0,0 +1,67 @@
+# Memoization of the results of the pure functions
+from collections import OrderedDict
+from typing import Iterable, List
+
+from astnodes import FunctionDecl
+from tracing import Tracer
+
+# results cached for each function by default
+DEFAULT_CACHE_SIZE = 1024
+
+
+def memo_key(values: list) -> tuple:
+    """Return the cache key of the arguments of a call, 1, 1.0 and TRUE are different arguments."""
+    return tuple(values) + tuple(map(type, values))
+
+
+class LRUCache(object):
+    """
+    LRUCache maps keys to values and forgets the least recently
+    used one past its size, it counts its hits and misses
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the value of key, None when it isn't cached."""
+        entries = self.entries
+        value = entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+
+class Memoizer(object):
+    """Memoizer holds a result cache for each memoized function of a program"""
+
+    def __init__(self, functions: Iterable[FunctionDecl], maxsize: int = DEFAULT_CACHE_SIZE):
+        # function declaration -> its cache
+        self.caches = {function: LRUCache(maxsize) for function in functions}
+
+    @property
+    def report(self) -> List[tuple]:
+        """(function name, hits, misses, cached results) of each memoized function."""
+        return [(function.token.value, cache.hits, cache.misses, len(cache))
+                for function, cache in self.caches.items()]
+
+    def trace(self, tracer: Tracer):
+        for name, hits, misses, size in self.report:
+            tracer.write(f'MEMO: {name}: {hits} hits, {misses} misses, {size} cached')
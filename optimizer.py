@@ -0,0 +1,548 @@
+# Optimization passes rewriting the checked AST before it is executed
+import copy
+import time
+from collections import Counter
+from typing import List
+
+from astnodes import AST, BinOp, Num, UnaryOp, Compound, Var, Assign, NoOp, Program, Block, VarDecl, \
+    ProcedureDecl, ProcedureCall, Boolean, Condition, Then, Else, FunctionDecl, FunctionCall, WhileLoop, \
+    Continue, Break, TemporaryDecl, Type
+from analysis import CallGraph, assigned_names, calls, call_name, identifiers
+from closure_compiler import BINARY_OPERATORS, UNARY_OPERATORS
+from tokenizer import Token
+from tokens import TokenType
+from tracing import Tracer
+from visitor import Visitor
+
+RELATIONAL_OPERATORS = {
+    TokenType.EQUALS, TokenType.NOT_EQUALS, TokenType.GREATER,
+    TokenType.GREATER_EQUALS, TokenType.LESS, TokenType.LESS_EQUALS,
+}
+
+ARITHMETIC_OPERATORS = {TokenType.PLUS, TokenType.MINUS, TokenType.MUL}
+
+
+def literal(value, token: Token) -> AST:
+    """Build the Num or Boolean node of a folded value, at the token's position."""
+    if isinstance(value, bool):
+        token_type = TokenType.TRUE if value else TokenType.FALSE
+        return Boolean(Token(token_type, token_type.value, token.lineno, token.column))
+    token_type = TokenType.REAL_CONST if isinstance(value, float) else TokenType.INTEGER_CONST
+    return Num(Token(token_type, value, token.lineno, token.column))
+
+
+def is_literal(node: AST) -> bool:
+    return isinstance(node, (Num, Boolean))
+
+
+def expression_key(node: AST):
+    """Return a key equal for the expressions computing the same value."""
+    if isinstance(node, (Num, Boolean)):
+        return type(node.value), node.value
+    if isinstance(node, Var):
+        return node.name
+    if isinstance(node, UnaryOp):
+        return node.op.type, expression_key(node.factor)
+    if isinstance(node, BinOp):
+        return node.op.type, expression_key(node.left), expression_key(node.right)
+    # calls are never keyed, each one runs
+    return node
+
+
+def is_number(node: AST, value) -> bool:
+    """Whether node is the integer literal `value`, 1.0 and TRUE are not 1."""
+    return isinstance(node, Num) and type(node.value) is int and node.value == value
+
+
+class Pass(Visitor):
+    """
+    Pass is the base class of the optimization passes. A pass visits the
+    tree and each visit returns the node which replaces the visited one,
+    statistics of what the pass did are counted in self.stats
+    """
+
+    name = 'pass'
+
+    def __init__(self):
+        self.stats = Counter()
+
+    def run(self, tree: Program) -> Program:
+        return self.visit(tree)
+
+    def visit_program(self, node: Program):
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_block(self, node: Block):
+        node.declarations = [self.visit(declaration) for declaration in node.declarations]
+        node.compound_statement = self.visit(node.compound_statement)
+        return node
+
+    def visit_vardecl(self, node: VarDecl):
+        return node
+
+    def visit_procdecl(self, node: ProcedureDecl):
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_funcdecl(self, node: FunctionDecl):
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_compound(self, node: Compound):
+        node.childrens = [self.visit(child) for child in node.childrens]
+        return node
+
+    def visit_assign(self, node: Assign):
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_proccall(self, node: ProcedureCall):
+        node.actual_params = [self.visit(param) for param in node.actual_params]
+        return node
+
+    def visit_funccall(self, node: FunctionCall):
+        node.actual_params = [self.visit(param) for param in node.actual_params]
+        return node
+
+    def visit_condition(self, node: Condition):
+        node.condition_node = self.visit(node.condition_node)
+        node.then_node = self.visit(node.then_node)
+        if node.else_node is not None:
+            node.else_node = self.visit(node.else_node)
+        return node
+
+    def visit_then(self, node: Then):
+        node.child = self.visit(node.child)
+        return node
+
+    def visit_else(self, node: Else):
+        node.child = self.visit(node.child)
+        return node
+
+    def visit_while(self, node: WhileLoop):
+        node.conditon_node = self.visit(node.conditon_node)
+        node.body_node = self.visit(node.body_node)
+        return node
+
+    def visit_binop(self, node: BinOp):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_unaryop(self, node: UnaryOp):
+        node.factor = self.visit(node.factor)
+        return node
+
+    def visit_num(self, node: Num):
+        return node
+
+    def visit_boolean(self, node: Boolean):
+        return node
+
+    def visit_var(self, node: Var):
+        return node
+
+    def visit_noop(self, node: NoOp):
+        return node
+
+    def visit_continue(self, node: Continue):
+        return node
+
+    def visit_break(self, node: Break):
+        return node
+
+
+class TypedPass(Pass):
+    """
+    TypedPass is the base class of the passes which need the declared
+    type of the expressions, it tracks the declarations in scope
+    """
+
+    def __init__(self):
+        super().__init__()
+        # declared type names of the variables and functions in scope,
+        # innermost scope last
+        self.scopes = []
+
+    def type_of(self, node: AST):
+        """Return the type name of an expression, None when it is unknown."""
+        if isinstance(node, Num):
+            return 'REAL' if isinstance(node.value, float) else 'INTEGER'
+        if isinstance(node, Boolean):
+            return 'BOOLEAN'
+        if isinstance(node, (Var, FunctionCall)):
+            name = node.name if isinstance(node, Var) else node.func_name
+            for scope in reversed(self.scopes):
+                if name in scope:
+                    return scope[name]
+            return None
+        if isinstance(node, UnaryOp):
+            factor_type = self.type_of(node.factor)
+            if node.op.type is TokenType.NOT:
+                return 'BOOLEAN' if factor_type == 'BOOLEAN' else None
+            return factor_type if factor_type in ('INTEGER', 'REAL') else None
+        if isinstance(node, BinOp):
+            op_type = node.op.type
+            if op_type in RELATIONAL_OPERATORS:
+                return 'BOOLEAN'
+            left_type, right_type = self.type_of(node.left), self.type_of(node.right)
+            if op_type in (TokenType.AND, TokenType.OR):
+                return 'BOOLEAN' if left_type == right_type == 'BOOLEAN' else None
+            if op_type is TokenType.FLOAT_DIV:
+                return 'REAL'
+            if left_type == right_type == 'INTEGER':
+                return 'INTEGER'
+            if op_type in ARITHMETIC_OPERATORS and {left_type, right_type} <= {'INTEGER', 'REAL'}:
+                return 'REAL'
+        return None
+
+    def enter_scope(self, params, block: Block):
+        scope = {param.var_node.name: param.type_node.name for param in params}
+        for declaration in block.declarations:
+            if isinstance(declaration, VarDecl):
+                scope[declaration.var_node.name] = declaration.type_node.name
+            elif isinstance(declaration, FunctionDecl):
+                scope[declaration.token.value] = declaration.return_type.name
+        self.scopes.append(scope)
+
+    def visit_scope(self, node: AST, params, block: Block) -> Block:
+        """Visit the block of the program or of a routine in its own scope."""
+        self.enter_scope(params, block)
+        block = self.visit(block)
+        self.scopes.pop()
+        return block
+
+    def visit_program(self, node: Program):
+        node.block = self.visit_scope(node, (), node.block)
+        return node
+
+    def visit_procdecl(self, node: ProcedureDecl):
+        node.block = self.visit_scope(node, node.params, node.block)
+        return node
+
+    def visit_funcdecl(self, node: FunctionDecl):
+        node.block = self.visit_scope(node, node.params, node.block)
+        return node
+
+
+class ConstantFolder(TypedPass):
+    """
+    ConstantFolder evaluates the operators whose operands are literals
+    with the interpreter's own operators, so integer and real division
+    fold as they would run, and drops the operations the type of their
+    operand makes useless: x * 1, x + 0, x - 0 and NOT NOT x
+    """
+
+    name = 'constant folding'
+
+    def visit_binop(self, node: BinOp):
+        left = node.left = self.visit(node.left)
+        right = node.right = self.visit(node.right)
+        op_type = node.op.type
+
+        if is_literal(left) and is_literal(right):
+            if op_type in (TokenType.INTEGER_DIV, TokenType.FLOAT_DIV, TokenType.MOD) and right.value == 0:
+                # the division fails when the program runs, not now
+                return node
+            self.stats['folded'] += 1
+            return literal(BINARY_OPERATORS[op_type](left.value, right.value), node.op)
+
+        # x * 1 is x whether x is an integer or a real,
+        # x + 0 is not -0.0 when x is the real -0.0
+        if op_type is TokenType.MUL:
+            if is_number(right, 1) and self.type_of(left) in ('INTEGER', 'REAL'):
+                return self.simplified(left)
+            if is_number(left, 1) and self.type_of(right) in ('INTEGER', 'REAL'):
+                return self.simplified(right)
+        elif op_type is TokenType.PLUS:
+            if is_number(right, 0) and self.type_of(left) == 'INTEGER':
+                return self.simplified(left)
+            if is_number(left, 0) and self.type_of(right) == 'INTEGER':
+                return self.simplified(right)
+        elif op_type is TokenType.MINUS:
+            if is_number(right, 0) and self.type_of(left) == 'INTEGER':
+                return self.simplified(left)
+        return node
+
+    def visit_unaryop(self, node: UnaryOp):
+        factor = node.factor = self.visit(node.factor)
+        if is_literal(factor):
+            self.stats['folded'] += 1
+            return literal(UNARY_OPERATORS[node.op.type](factor.value), node.op)
+        if (node.op.type is TokenType.NOT and isinstance(factor, UnaryOp) and
+                factor.op.type is TokenType.NOT and self.type_of(factor.factor) == 'BOOLEAN'):
+            return self.simplified(factor.factor)
+        return node
+
+    def simplified(self, node: AST) -> AST:
+        self.stats['simplified'] += 1
+        return node
+
+
+class DeadCodeEliminator(Pass):
+    """
+    DeadCodeEliminator drops the code which can't run: the branch an IF
+    with a literal condition doesn't take, a WHILE whose literal
+    condition isn't TRUE and the statements following a BREAK or a
+    CONTINUE in the same compound
+    """
+
+    name = 'dead code elimination'
+
+    def visit_compound(self, node: Compound):
+        childrens = []
+        for child in node.childrens:
+            child = self.visit(child)
+            if isinstance(child, NoOp):
+                continue
+            childrens.append(child)
+            if isinstance(child, (Break, Continue)):
+                self.stats['statements'] += len(node.childrens) - len(childrens)
+                break
+        node.childrens = childrens
+        return node
+
+    def visit_condition(self, node: Condition):
+        node = super().visit_condition(node)
+        if not is_literal(node.condition_node):
+            return node
+        self.stats['branches'] += 1
+        if node.condition_node.value:
+            return node.then_node.child
+        if node.else_node is not None:
+            return node.else_node.child
+        return NoOp()
+
+    def visit_while(self, node: WhileLoop):
+        node = super().visit_while(node)
+        # the loop only runs while its condition is exactly TRUE
+        if is_literal(node.conditon_node) and node.conditon_node.value is not True:
+            self.stats['loops'] += 1
+            return NoOp()
+        return node
+
+
+class UnusedRoutineEliminator(Pass):
+    """UnusedRoutineEliminator drops the procedures and functions the program's body never reaches"""
+
+    name = 'unused routine elimination'
+
+    def __init__(self):
+        super().__init__()
+        self.reachable = set()
+
+    def run(self, tree: Program) -> Program:
+        self.reachable = CallGraph(tree).reachable()
+        return self.visit(tree)
+
+    def visit_block(self, node: Block):
+        declarations = []
+        for declaration in node.declarations:
+            if isinstance(declaration, (ProcedureDecl, FunctionDecl)) and declaration not in self.reachable:
+                self.stats['routines'] += 1
+                continue
+            declarations.append(self.visit(declaration))
+        node.declarations = declarations
+        return node
+
+    def visit_compound(self, node: Compound):
+        # only the declarations change
+        return node
+
+
+class LoopInvariantCodeMotion(TypedPass):
+    """
+    LoopInvariantCodeMotion computes the expressions of a WHILE loop
+    which no assignment in the loop, nor in a routine it calls, changes
+    into temporaries before the loop. The loop is guarded by its
+    condition so they are only computed when it runs:
+
+        if c then begin t := e; while c do ... end
+
+    Only the expressions which can't fail move: no call and no division
+    but by a non zero literal, out of a loop whose condition calls nothing,
+    and only from the statements run on every iteration, those before the
+    first branch, nested loop, BREAK or CONTINUE of the body
+    """
+
+    name = 'loop invariant code motion'
+
+    # the temporaries are named after the pass, apart from the program's names
+    TEMPORARY_PREFIX = 'licm'
+
+    def __init__(self):
+        super().__init__()
+        self.graph = None
+        self.names = set()
+        self.counter = 0
+        # the program or routine declaring the block being visited, and the
+        # temporaries it needs, innermost last
+        self.owners = []
+        self.temporaries = []
+        # of the loop the expressions are moved out of: the names assigned
+        # in it, its moved expressions by key and their assignments
+        self.assigned = set()
+        self.moved = {}
+        self.preheader = []
+
+    def run(self, tree: Program) -> Program:
+        self.graph = CallGraph(tree)
+        self.names = identifiers(tree)
+        return self.visit(tree)
+
+    def visit_scope(self, node: AST, params, block: Block) -> Block:
+        self.owners.append(node)
+        self.temporaries.append([])
+        block = super().visit_scope(node, params, block)
+        temporaries = self.temporaries.pop()
+        self.owners.pop()
+        # the variables are declared before the routines
+        index = sum(isinstance(declaration, VarDecl) for declaration in block.declarations)
+        block.declarations[index:index] = temporaries
+        return block
+
+    def visit_while(self, node: WhileLoop):
+        preheader = self.move_invariants(node)
+        # then the loops nested in the body, for what only they don't change
+        node.body_node = self.visit(node.body_node)
+        if not preheader:
+            return node
+        self.stats['loops'] += 1
+        loop = Compound()
+        loop.childrens = preheader + [node]
+        if is_literal(node.conditon_node) and node.conditon_node.value is True:
+            return loop
+        token = node.token
+        return Condition(token, copy.deepcopy(node.conditon_node), Then(token, loop), None)
+
+    def move_invariants(self, node: WhileLoop) -> List[AST]:
+        """Move the invariant expressions out of the loop, return the assignments of their temporaries."""
+        if any(True for _ in calls(node.conditon_node)):
+            return []
+        assigned = assigned_names(node.body_node)
+        scopes = self.graph.scopes[self.owners[-1]]
+        for call in calls(node.body_node):
+            routine = self.graph.resolve(scopes, call_name(call))
+            if routine is None:
+                return []
+            assigned |= self.graph.assigned(routine)
+        self.assigned, self.moved, self.preheader = assigned, {}, []
+        self.move_statement(node.body_node)
+        preheader = self.preheader
+        self.assigned, self.moved, self.preheader = set(), {}, []
+        return preheader
+
+    def move_statement(self, node: AST) -> bool:
+        """Move the invariants of a statement run on every iteration, return whether the
+        statements after it are run on every iteration too."""
+        if isinstance(node, Compound):
+            for child in node.childrens:
+                if not self.move_statement(child):
+                    return False
+            return True
+        if isinstance(node, Assign):
+            node.right = self.move(node.right)
+            return True
+        if isinstance(node, ProcedureCall):
+            node.actual_params = [self.move(param) for param in node.actual_params]
+            return True
+        # a branch or a nested loop may not run, and nothing runs after BREAK or CONTINUE
+        return isinstance(node, NoOp)
+
+    def move(self, node: AST) -> AST:
+        node, invariant = self.hoist(node)
+        return self.temporary(node) if invariant else node
+
+    def hoist(self, node: AST):
+        """Move the largest invariant parts of an expression, return it and whether it's invariant itself."""
+        if isinstance(node, (Num, Boolean)):
+            return node, True
+        if isinstance(node, Var):
+            return node, node.name not in self.assigned
+        if isinstance(node, UnaryOp):
+            node.factor, invariant = self.hoist(node.factor)
+            return node, invariant
+        if isinstance(node, BinOp):
+            node.left, left = self.hoist(node.left)
+            node.right, right = self.hoist(node.right)
+            if left and right and self.cannot_fail(node):
+                return node, True
+            if left:
+                node.left = self.temporary(node.left)
+            if right:
+                node.right = self.temporary(node.right)
+            return node, False
+        if isinstance(node, FunctionCall):
+            node.actual_params = [self.move(param) for param in node.actual_params]
+        return node, False
+
+    @staticmethod
+    def cannot_fail(node: BinOp) -> bool:
+        if node.op.type in (TokenType.INTEGER_DIV, TokenType.FLOAT_DIV, TokenType.MOD):
+            return isinstance(node.right, Num) and node.right.value != 0
+        return True
+
+    def temporary(self, node: AST) -> AST:
+        """Return the temporary computing the invariant expression, node itself when it's not worth one."""
+        if not isinstance(node, (BinOp, UnaryOp)):
+            return node
+        type_name = self.type_of(node)
+        if type_name is None:
+            return node
+        token = node.token
+        key = expression_key(node)
+        name = self.moved.get(key)
+        if name is None:
+            name = self.moved[key] = self.new_name()
+            self.stats['expressions'] += 1
+            self.temporaries[-1].append(TemporaryDecl(
+                Var(Token(TokenType.ID, name, token.lineno, token.column)),
+                Type(Token(TokenType[type_name], type_name, token.lineno, token.column)),
+            ))
+            self.scopes[-1][name] = type_name
+            self.preheader.append(Assign(
+                Var(Token(TokenType.ID, name, token.lineno, token.column)),
+                Token(TokenType.ASSIGN, TokenType.ASSIGN.value, token.lineno, token.column),
+                node,
+            ))
+        return Var(Token(TokenType.ID, name, token.lineno, token.column))
+
+    def new_name(self) -> str:
+        while True:
+            name = f'{self.TEMPORARY_PREFIX}{self.counter}'
+            self.counter += 1
+            if name not in self.names:
+                return name
+
+
+# passes run by Optimizer, in order. Routines no call names at all are
+# dropped before the folding, those only called from dead code after it
+PASSES = (UnusedRoutineEliminator, ConstantFolder, DeadCodeEliminator, UnusedRoutineEliminator,
+          LoopInvariantCodeMotion)
+
+
+class Optimizer(object):
+    """Optimizer runs the optimization passes over a checked program, one after the other"""
+
+    def __init__(self, passes=PASSES, tracer: Tracer = None):
+        self.passes = passes
+        self.tracer = tracer if tracer is not None else Tracer()
+        # (pass name, statistics, seconds) of each pass run
+        self.report: List[tuple] = []
+
+    def optimize(self, tree: Program) -> Program:
+        for pass_class in self.passes:
+            optimization = pass_class()
+            start = time.perf_counter()
+            tree = optimization.run(tree)
+            elapsed = time.perf_counter() - start
+            self.report.append((optimization.name, optimization.stats, elapsed))
+            if self.tracer.summary:
+                self.tracer.write(format_stats(optimization.name, optimization.stats, elapsed))
+        return tree
+
+
+def format_stats(name: str, stats: Counter, elapsed: float) -> str:
+    counts = ', '.join(f'{count} {key}' for key, count in sorted(stats.items())) or 'no change'
+    return f'OPTIMIZE: {name}: {counts} in {elapsed * 1000:.2f} ms'
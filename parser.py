@@ -2,15 +2,47 @@ from astnodes import AST, BinOp, Num, UnaryOp, Compound, Var, Assign, NoOp, Prog
     Param, VarDecl, Type, ProcedureDecl, ProcedureCall, Boolean, Condition, Then, Else, FunctionDecl, FunctionCall, \
     WhileLoop, Continue, Break
 from errors import SyntaxError, ErrorCode
-from tokenizer import Tokenizer
+from token_stream import TokenStream
+from tokenizer import Token
 from tokens import TokenType
 from typing import List
 
+# binding power of each binary operator, the higher binds the tighter
+BINARY_POWERS = {
+    TokenType.OR: 1,
+    TokenType.AND: 2,
+    TokenType.EQUALS: 3,
+    TokenType.NOT_EQUALS: 3,
+    TokenType.GREATER: 4,
+    TokenType.GREATER_EQUALS: 4,
+    TokenType.LESS: 4,
+    TokenType.LESS_EQUALS: 4,
+    TokenType.PLUS: 5,
+    TokenType.MINUS: 5,
+    TokenType.MUL: 6,
+    TokenType.INTEGER_DIV: 6,
+    TokenType.FLOAT_DIV: 6,
+    TokenType.MOD: 6,
+}
+# a prefix operator applies to the operand right after it, before any binary operator
+PREFIX_OPERATORS = (TokenType.PLUS, TokenType.MINUS, TokenType.NOT)
+PREFIX_POWER = 7
+# an opened parenthesis on the operator stack, no operator below it is applied
+PARENTHESIS = (0, None)
+
 
 class Parser(object):
-    def __init__(self, tokenizer: Tokenizer):
-        self.tokenizer = tokenizer
-        self.current_token = self.tokenizer.get_next_token()
+    def __init__(self, tokenizer):
+        # tokenizer is either a Tokenizer or an already filled TokenStream
+        if isinstance(tokenizer, TokenStream):
+            self.tokens = tokenizer
+        else:
+            self.tokens = TokenStream(tokenizer)
+        self.current_type = self.tokens.peek_type()
+
+    @property
+    def current_token(self):
+        return self.tokens.peek()
 
     def error(self, error_code, token):
         raise SyntaxError(
@@ -22,16 +54,28 @@ class Parser(object):
     def eat(self, token_type: TokenType):
         # compare the current token type with the passed token
         # type and if they match then "eat" the current token
-        # and assign the next token to the self.current_token,
+        # and move the token stream to the next token,
         # otherwise raise an exception.
-        if self.current_token.type == token_type:
-            self.current_token = self.tokenizer.get_next_token()
+        if self.current_type is token_type:
+            self.current_type = self.tokens.advance()
         else:
             self.error(
                 error_code=ErrorCode.UNEXPECTED_TOKEN,
                 token=self.current_token
             )
 
+    def eat_token(self, token_type: TokenType) -> Token:
+        # "eat" the current token like eat does but also return it,
+        # the token object is only built by the stream at this point
+        if self.current_type is not token_type:
+            self.error(
+                error_code=ErrorCode.UNEXPECTED_TOKEN,
+                token=self.current_token
+            )
+        token = self.tokens.take()
+        self.current_type = self.tokens.peek_type()
+        return token
+
     def program(self) -> Program:
         """program : PROGRAM variable SEMI block DOT"""
         self.eat(TokenType.PROGRAM)
@@ -54,18 +98,18 @@ class Parser(object):
         """
         declarations = []
 
-        if self.current_token.type is TokenType.VAR:
+        if self.current_type is TokenType.VAR:
             self.eat(TokenType.VAR)
-            while self.current_token.type is TokenType.ID:
+            while self.current_type is TokenType.ID:
                 var_decl = self.variable_declaration()
                 declarations.extend(var_decl)
                 self.eat(TokenType.SEMI)
 
-        while self.current_token.type is TokenType.PROCEDURE:
+        while self.current_type is TokenType.PROCEDURE:
             proc_decl = self.procedure_declaration()
             declarations.append(proc_decl)
 
-        while self.current_token.type is TokenType.FUNCTION:
+        while self.current_type is TokenType.FUNCTION:
             func_decl = self.function_declaration()
             declarations.append(func_decl)
 
@@ -76,11 +120,10 @@ class Parser(object):
             PROCEDURE ID (LPAREN formal_parameter_list RPAREN)? SEMI block SEMI
         """
         self.eat(TokenType.PROCEDURE)
-        proc_token = self.current_token
-        self.eat(TokenType.ID)
+        proc_token = self.eat_token(TokenType.ID)
         params = []
 
-        if self.current_token.type is TokenType.LPAREN:
+        if self.current_type is TokenType.LPAREN:
             self.eat(TokenType.LPAREN)
             params = self.formal_parameter_list()
             self.eat(TokenType.RPAREN)
@@ -99,11 +142,10 @@ class Parser(object):
             FUNCTION ID (LPAREN formal_parameter_list RPAREN)? COLON type_spec SEMI block SEMI
         """
         self.eat(TokenType.FUNCTION)
-        func_token = self.current_token
-        self.eat(TokenType.ID)
+        func_token = self.eat_token(TokenType.ID)
         params = []
 
-        if self.current_token.type is TokenType.LPAREN:
+        if self.current_type is TokenType.LPAREN:
             self.eat(TokenType.LPAREN)
             params = self.formal_parameter_list()
             self.eat(TokenType.RPAREN)
@@ -125,11 +167,11 @@ class Parser(object):
         """ formal_parameter_list : formal_parameters
                               | formal_parameters SEMI formal_parameter_list
         """
-        if self.current_token.type is not TokenType.ID:
+        if self.current_type is not TokenType.ID:
             return []
 
         params = self.formal_parameters()
-        while self.current_token.type is TokenType.SEMI:
+        while self.current_type is TokenType.SEMI:
             self.eat(TokenType.SEMI)
             params.extend(self.formal_parameters())
 
@@ -137,13 +179,11 @@ class Parser(object):
 
     def formal_parameters(self) -> List[Param]:
         """ formal_parameters : ID (COMMA ID)* COLON type_spec """
-        var_nodes = [Var(self.current_token)]
-        self.eat(TokenType.ID)
+        var_nodes = [Var(self.eat_token(TokenType.ID))]
 
-        while self.current_token.type is TokenType.COMMA:
+        while self.current_type is TokenType.COMMA:
             self.eat(TokenType.COMMA)
-            var_nodes.append(Var(self.current_token))
-            self.eat(TokenType.ID)
+            var_nodes.append(Var(self.eat_token(TokenType.ID)))
 
         self.eat(TokenType.COLON)
         type_node = self.type_spec()
@@ -151,13 +191,11 @@ class Parser(object):
 
     def variable_declaration(self) -> List[VarDecl]:
         """variable_declaration : ID (COMMA ID)* COLON type_spec"""
-        var_nodes = [Var(self.current_token)]
-        self.eat(TokenType.ID)
+        var_nodes = [Var(self.eat_token(TokenType.ID))]
 
-        while self.current_token.type is TokenType.COMMA:
+        while self.current_type is TokenType.COMMA:
             self.eat(TokenType.COMMA)
-            var_nodes.append(Var(self.current_token))
-            self.eat(TokenType.ID)
+            var_nodes.append(Var(self.eat_token(TokenType.ID)))
 
         self.eat(TokenType.COLON)
 
@@ -170,11 +208,9 @@ class Parser(object):
                      | REAL
                      | BOOLEAN
         """
-        token = self.current_token
-        if token.type in (TokenType.INTEGER, TokenType.REAL, TokenType.BOOLEAN):
-            self.eat(token.type)
-            return Type(token)
-        self.error(error_code=ErrorCode.UNEXPECTED_TOKEN, token=token)
+        if self.current_type in (TokenType.INTEGER, TokenType.REAL, TokenType.BOOLEAN):
+            return Type(self.eat_token(self.current_type))
+        self.error(error_code=ErrorCode.UNEXPECTED_TOKEN, token=self.current_token)
 
     def compound_statement(self) -> Compound:
         """compound_statement: BEGIN statement_list END"""
@@ -191,12 +227,11 @@ class Parser(object):
         statement_list : statement
                        | statement SEMI statement_list
         """
-        node = self.statement()
-        results = [node]
-        if self.current_token.type is not TokenType.SEMI:
-            return results
-        self.eat(TokenType.SEMI)
-        results.extend(self.statement_list())
+        # a loop rather than the grammar's recursion, a statement list can be long
+        results = [self.statement()]
+        while self.current_type is TokenType.SEMI:
+            self.eat(TokenType.SEMI)
+            results.append(self.statement())
         return results
 
     def statement(self) -> AST:
@@ -210,19 +245,19 @@ class Parser(object):
                   | continue
                   | empty
         """
-        if self.current_token.type is TokenType.BEGIN:
+        if self.current_type is TokenType.BEGIN:
             node = self.compound_statement()
-        elif self.current_token.type is TokenType.ID and self.tokenizer.current_char is '(':
+        elif self.current_type is TokenType.ID and self.tokens.peek_type(1) is TokenType.LPAREN:
             node = self.proccall_statement()
-        elif self.current_token.type is TokenType.ID:
+        elif self.current_type is TokenType.ID:
             node = self.assignment_statement()
-        elif self.current_token.type is TokenType.IF:
+        elif self.current_type is TokenType.IF:
             node = self.condition_statement()
-        elif self.current_token.type is TokenType.WHILE:
+        elif self.current_type is TokenType.WHILE:
             node = self.while_statement()
-        elif self.current_token.type is TokenType.CONTINUE:
+        elif self.current_type is TokenType.CONTINUE:
             node = self.continue_statement()
-        elif self.current_token.type is TokenType.BREAK:
+        elif self.current_type is TokenType.BREAK:
             node = self.break_statement()
         else:
             node = self.empty()
@@ -232,12 +267,11 @@ class Parser(object):
         """
         condition_statement : IF expr THEN (ELSE)?
         """
-        token = self.current_token
-        self.eat(TokenType.IF)
+        token = self.eat_token(TokenType.IF)
         condition_node = self.expr()
         then_node = self.then()
         else_node = None
-        if self.current_token.type is TokenType.ELSE:
+        if self.current_type is TokenType.ELSE:
             else_node = self._else()
         return Condition(
             token=token,
@@ -250,8 +284,7 @@ class Parser(object):
         """
         THEN statement
         """
-        token = self.current_token
-        self.eat(TokenType.THEN)
+        token = self.eat_token(TokenType.THEN)
         child = self.statement()
         return Then(token=token, child=child)
 
@@ -259,8 +292,7 @@ class Parser(object):
         """
         ELSE statement
         """
-        token = self.current_token
-        self.eat(TokenType.ELSE)
+        token = self.eat_token(TokenType.ELSE)
         child = self.statement()
         return Else(token=token, child=child)
 
@@ -268,21 +300,18 @@ class Parser(object):
         """
         while_statement : WHILE expr DO statement
         """
-        token = self.current_token
-        self.eat(TokenType.WHILE)
+        token = self.eat_token(TokenType.WHILE)
         condition_node = self.expr()
         self.eat(TokenType.DO)
         body_node = self.statement()
         return WhileLoop(token=token, condition_node=condition_node, body_node=body_node)
 
     def continue_statement(self) -> Continue:
-        token = self.current_token
-        self.eat(TokenType.CONTINUE)
+        token = self.eat_token(TokenType.CONTINUE)
         return Continue(token)
 
     def break_statement(self) -> Break:
-        token = self.current_token
-        self.eat(TokenType.BREAK)
+        token = self.eat_token(TokenType.BREAK)
         return Break(token)
 
     def assignment_statement(self) -> Assign:
@@ -290,23 +319,21 @@ class Parser(object):
         assignment_statement : variable ASSIGN expr
         """
         left = self.variable()
-        op = self.current_token
-        self.eat(TokenType.ASSIGN)
+        op = self.eat_token(TokenType.ASSIGN)
         right = self.expr()
         return Assign(left=left, op=op, right=right)
 
     def proccall_statement(self) -> ProcedureCall:
         """proccall_statement : ID LPAREN (expr (COMMA expr)*)? RPAREN"""
-        procc_token = self.current_token
-        self.eat(TokenType.ID)
+        procc_token = self.eat_token(TokenType.ID)
         self.eat(TokenType.LPAREN)
 
-        if self.current_token.type is TokenType.RPAREN:
+        if self.current_type is TokenType.RPAREN:
             self.eat(TokenType.RPAREN)
             return ProcedureCall(procc_token.value, [], procc_token)
         else:
             actual_params = [self.expr()]
-            while self.current_token.type is TokenType.COMMA:
+            while self.current_type is TokenType.COMMA:
                 self.eat(TokenType.COMMA)
                 actual_params.append(self.expr())
 
@@ -319,11 +346,10 @@ class Parser(object):
 
     def funccall_statement(self) -> FunctionCall:
         """funccall_statement : ID LPAREN (expr (COMMA expr)*)? RPAREN"""
-        funccall_token = self.current_token
-        self.eat(TokenType.ID)
+        funccall_token = self.eat_token(TokenType.ID)
         self.eat(TokenType.LPAREN)
 
-        if self.current_token.type is TokenType.RPAREN:
+        if self.current_type is TokenType.RPAREN:
             self.eat(TokenType.RPAREN)
             return FunctionCall(
                 func_name=funccall_token.value,
@@ -332,7 +358,7 @@ class Parser(object):
             )
         else:
             actual_params = [self.expr()]
-            while self.current_token.type is TokenType.COMMA:
+            while self.current_type is TokenType.COMMA:
                 self.eat(TokenType.COMMA)
                 actual_params.append(self.expr())
 
@@ -346,159 +372,101 @@ class Parser(object):
         """
         variable : ID
         """
-        node = Var(self.current_token)
-        self.eat(TokenType.ID)
+        node = Var(self.eat_token(TokenType.ID))
         return node
 
     def empty(self) -> AST:
         """An empty production"""
         return NoOp()
 
-    def first_priority(self) -> AST:
+    def factor(self) -> AST:
         """
-        factor: PLUS  factor
-              | MINUS factor
-              | NOT factor
-              | INTEGER_CONST
-              | REAL_CONST
-              | TRUE
-              | FALSE
-              | LPAREN expr RPAREN
-              | variable
-              | funccall
+        factor : INTEGER_CONST
+               | REAL_CONST
+               | TRUE
+               | FALSE
+               | variable
+               | funccall
         """
-        token = self.current_token
-        if token.type is TokenType.PLUS:
-            self.eat(TokenType.PLUS)
-            return UnaryOp(op=token, factor=self.first_priority())
+        token_type = self.current_type
+        if token_type is TokenType.INTEGER_CONST or token_type is TokenType.REAL_CONST:
+            return Num(self.eat_token(token_type))
 
-        elif token.type is TokenType.MINUS:
-            self.eat(TokenType.MINUS)
-            return UnaryOp(op=token, factor=self.first_priority())
+        elif token_type is TokenType.TRUE or token_type is TokenType.FALSE:
+            return Boolean(self.eat_token(token_type))
 
-        elif token.type is TokenType.NOT:
-            self.eat(TokenType.NOT)
-            return UnaryOp(op=token, factor=self.first_priority())
-
-        elif token.type is TokenType.INTEGER_CONST:
-            self.eat(TokenType.INTEGER_CONST)
-            return Num(token)
-
-        elif token.type is TokenType.REAL_CONST:
-            self.eat(TokenType.REAL_CONST)
-            return Num(token)
-
-        elif token.type is TokenType.TRUE:
-            self.eat(TokenType.TRUE)
-            return Boolean(token)
-
-        elif token.type is TokenType.FALSE:
-            self.eat(TokenType.FALSE)
-            return Boolean(token)
-
-        elif token.type is TokenType.LPAREN:
-            self.eat(TokenType.LPAREN)
-            node = self.expr()
-            self.eat(TokenType.RPAREN)
-            return node
-
-        elif token.type is TokenType.ID and self.tokenizer.current_char is '(':
+        elif token_type is TokenType.ID and self.tokens.peek_type(1) is TokenType.LPAREN:
             return self.funccall_statement()
 
         else:
             return self.variable()
 
-    def second_priority(self) -> AST:
-        """term : factor ((MUL | DIV | MOD) factor)*"""
-        left = self.first_priority()
-        result = left
-        while self.current_token.type in (TokenType.MUL,
-                                          TokenType.INTEGER_DIV,
-                                          TokenType.FLOAT_DIV,
-                                          TokenType.MOD):
-            token = self.current_token
-            self.eat(token.type)
-            result = BinOp(left=left, op=token, right=self.first_priority())
-
-        return result
-
-    def third_priority(self) -> AST:
-        """simple_expr: term((PLUS | MINUS) term)*"""
-        left = self.second_priority()
-        result = left
-
-        while self.current_token.type in (TokenType.PLUS, TokenType.MINUS):
-            token = self.current_token
-            self.eat(token.type)
-            result = BinOp(left=left, op=token, right=self.second_priority())
-
-        return result
-
-    def fourth_priority(self) -> AST:
-        """
-        GREATER| GREATER_EQUALS| LESS| LESS_EQUALS
-        """
-        left = self.third_priority()
-        result = left
-
-        while self.current_token.type in (TokenType.GREATER,
-                                          TokenType.GREATER_EQUALS,
-                                          TokenType.LESS,
-                                          TokenType.LESS_EQUALS):
-            token = self.current_token
-            self.eat(token.type)
-            result = BinOp(left=left, op=token, right=self.third_priority())
-
-        return result
-
-    def fifth_priority(self) -> AST:
-        """
-        EQUALS|NOT_EQUALS
-        """
-        left = self.fourth_priority()
-        result = left
-
-        while self.current_token.type in (TokenType.EQUALS, TokenType.NOT_EQUALS):
-            token = self.current_token
-            self.eat(token.type)
-            result = BinOp(left=left, op=token, right=self.fourth_priority())
-
-        return result
-
-    def sixth_priority(self) -> AST:
-        """
-        AND
-        """
-        left = self.fifth_priority()
-        result = left
-
-        while self.current_token.type is TokenType.AND:
-            token = self.current_token
-            self.eat(token.type)
-            result = BinOp(left=left, op=token, right=self.fifth_priority())
-
-        return result
-
-    def seventh_priority(self) -> AST:
-        """
-        OR
-        """
-        left = self.sixth_priority()
-        result = left
-
-        while self.current_token.type is TokenType.OR:
-            token = self.current_token
-            self.eat(token.type)
-            result = BinOp(left=left, op=token, right=self.sixth_priority())
-
-        return result
-
     def expr(self) -> AST:
-        return self.seventh_priority()
+        """
+        expr : operand (binary_operator operand)*
+        operand : (PLUS | MINUS | NOT) operand
+                | LPAREN expr RPAREN
+                | factor
+
+        the binary operators from the loosest to the tightest, all left associative:
+        OR, AND, EQUALS | NOT_EQUALS, GREATER | GREATER_EQUALS | LESS | LESS_EQUALS,
+        PLUS | MINUS, MUL | INTEGER_DIV | FLOAT_DIV | MOD
+        """
+        # precedence climbing without recursion: the operators still waiting
+        # for their right operand are (binding power, token) on a stack, and
+        # are applied as soon as an operator binding less tightly follows
+        operands = []
+        operators = []
+        powers = BINARY_POWERS
+        prefixes = PREFIX_OPERATORS
+        # parentheses opened and not yet closed
+        opened = 0
+        while True:
+            token_type = self.current_type
+            while token_type in prefixes or token_type is TokenType.LPAREN:
+                if token_type is TokenType.LPAREN:
+                    self.eat(TokenType.LPAREN)
+                    operators.append(PARENTHESIS)
+                    opened += 1
+                else:
+                    operators.append((PREFIX_POWER, self.eat_token(token_type)))
+                token_type = self.current_type
+            operands.append(self.factor())
+
+            while True:
+                token_type = self.current_type
+                power = powers.get(token_type)
+                if power is not None:
+                    if operators:
+                        self.apply_operators(operands, operators, power)
+                    operators.append((power, self.eat_token(token_type)))
+                    break
+                if operators:
+                    self.apply_operators(operands, operators, 1)
+                if opened and token_type is TokenType.RPAREN:
+                    # the parenthesized expression is the operand of what precedes it
+                    self.eat(TokenType.RPAREN)
+                    operators.pop()
+                    opened -= 1
+                    continue
+                if opened:
+                    self.eat(TokenType.RPAREN)
+                return operands[0]
+
+    @staticmethod
+    def apply_operators(operands: List[AST], operators: list, power: int):
+        """Apply the pending operators binding at least as tightly as power."""
+        while operators and operators[-1][0] >= power:
+            operator_power, token = operators.pop()
+            if operator_power == PREFIX_POWER:
+                operands[-1] = UnaryOp(op=token, factor=operands[-1])
+            else:
+                right = operands.pop()
+                operands[-1] = BinOp(left=operands[-1], op=token, right=right)
 
     def parse(self) -> AST:
         node = self.program()
-        if self.current_token.type != TokenType.EOF:
+        if self.current_type is not TokenType.EOF:
             self.error(
                 error_code=ErrorCode.UNEXPECTED_TOKEN,
                 token=self.current_token,
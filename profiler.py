@@ -0,0 +1,204 @@
+# Profiles a program run by the tree engine: the time spent in each routine
+# and on each source line, and the stacks of calls it was spent in
+import time
+from typing import IO, List
+
+from astnodes import Program, Block, ProcedureDecl, FunctionDecl
+from budget import Budget
+from interpreter import Interpreter
+from parser import Parser
+from tracing import Tracer
+
+SORT_KEYS = ('exclusive', 'inclusive', 'calls')
+
+
+class Timing(object):
+    """Calls and time of a routine or of a source line"""
+
+    __slots__ = ('name', 'lineno', 'calls', 'inclusive', 'exclusive', 'active')
+
+    def __init__(self, name: str, lineno: int = None):
+        self.name = name
+        self.lineno = lineno
+        self.calls = 0
+        # the time of its outermost active calls, a recursion is not counted twice
+        self.inclusive = 0.0
+        # the time of its own, without that of the calls or statements it ran
+        self.exclusive = 0.0
+        # calls in progress
+        self.active = 0
+
+    def stop(self, elapsed: float, children: float):
+        self.calls += 1
+        self.exclusive += elapsed - children
+        self.active -= 1
+        if not self.active:
+            self.inclusive += elapsed
+
+
+class StackNode(object):
+    """A stack of calls, the nodes of a tree rooted at the program"""
+
+    __slots__ = ('name', 'parent', 'children', 'time')
+
+    def __init__(self, name: str, parent=None):
+        self.name = name
+        self.parent = parent
+        # timing of the routine called -> its node
+        self.children = {}
+        # time spent in the routine on top of this very stack
+        self.time = 0.0
+
+    def walk(self, prefix: str = ''):
+        """Generate the collapsed name and time of this stack and of the ones above it."""
+        path = f'{prefix};{self.name}' if prefix else self.name
+        yield path, self.time
+        for child in self.children.values():
+            yield from child.walk(path)
+
+
+class Profile(object):
+    """The timings of a run, reported sorted or as collapsed stacks for flamegraph tools"""
+
+    def __init__(self):
+        self.routines: List[Timing] = []
+        # source line -> its timing
+        self.lines = {}
+        self.root: StackNode = None
+
+    def line(self, lineno: int) -> Timing:
+        timing = self.lines.get(lineno)
+        if timing is None:
+            timing = self.lines[lineno] = Timing(f'line {lineno}', lineno)
+        return timing
+
+    def report(self, sort: str = 'exclusive', limit: int = None, source: str = None) -> str:
+        """Format the routines and lines sorted by the sort key, most first, with the text
+        of the lines when the source is given."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f'unknown sort key: {sort}')
+        source_lines = source.splitlines() if source is not None else []
+
+        def ordered(timings):
+            timings = sorted((timing for timing in timings if timing.calls),
+                             key=lambda timing: getattr(timing, sort), reverse=True)
+            return timings[:limit] if limit is not None else timings
+
+        lines = [f'{"routine":<24}{"line":>6}{"calls":>10}{"inclusive ms":>15}{"exclusive ms":>15}']
+        for timing in ordered(self.routines):
+            lineno = timing.lineno if timing.lineno is not None else '-'
+            lines.append(f'{timing.name:<24}{lineno:>6}{timing.calls:>10}'
+                         f'{timing.inclusive * 1000:>15.3f}{timing.exclusive * 1000:>15.3f}')
+        lines.append('')
+        lines.append(f'{"line":>6}{"runs":>10}{"inclusive ms":>15}{"exclusive ms":>15}  source')
+        for timing in ordered(self.lines.values()):
+            text = source_lines[timing.lineno - 1].strip() if timing.lineno <= len(source_lines) else ''
+            lines.append(f'{timing.lineno:>6}{timing.calls:>10}'
+                         f'{timing.inclusive * 1000:>15.3f}{timing.exclusive * 1000:>15.3f}  {text}')
+        return '\n'.join(lines) + '\n'
+
+    def collapsed(self) -> str:
+        """One `program;caller;routine microseconds` line per stack of calls, the input of
+        flamegraph.pl, speedscope or inferno."""
+        if self.root is None:
+            return ''
+        return ''.join(f'{path} {round(seconds * 1e6)}\n'
+                       for path, seconds in self.root.walk() if round(seconds * 1e6))
+
+    def write_collapsed(self, file: IO):
+        file.write(self.collapsed())
+
+
+def timed_statement(visit, lineno):
+    """Wrap the visit method of a kind of statement, timing it on its line."""
+
+    def visit_statement(self, node):
+        timing = self.statements.get(node)
+        if timing is None:
+            timing = self.statements[node] = self.profile.line(lineno(node))
+        timing.active += 1
+        # [time of the statements run by this one]
+        entry = [0.0]
+        stack = self.line_stack
+        stack.append(entry)
+        start = time.perf_counter()
+        try:
+            return visit(self, node)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            timing.stop(elapsed, entry[0])
+
+    return visit_statement
+
+
+class ProfilingInterpreter(Interpreter):
+    """
+    ProfilingInterpreter runs the program with the tree engine and
+    records the calls and inclusive and exclusive time of every routine
+    and source line in its profile. A routine's call starts once its
+    arguments are computed, and a tail call counts as a call
+    """
+
+    def __init__(self, parser: Parser, tracer: Tracer = None, optimize: bool = False, memoize: bool = False,
+                 program: Program = None, budget: Budget = None):
+        super().__init__(parser, engine='tree', tracer=tracer, optimize=optimize, memoize=memoize,
+                         program=program, budget=budget)
+        self.profile = Profile()
+        # block of the program or a routine -> its timing
+        self.blocks = {}
+        # [stack node, time of the calls made] of the calls in progress
+        self.call_stack = []
+        # statement -> the timing of its line
+        self.statements = {}
+        # [time of the nested statements] of the statements in progress
+        self.line_stack = []
+
+    def analyze(self) -> Program:
+        ast = super().analyze()
+        if not self.blocks:
+            self.add_routines(ast.block, Timing(ast.name))
+        return ast
+
+    def add_routines(self, block: Block, timing: Timing):
+        self.blocks[block] = timing
+        self.profile.routines.append(timing)
+        for declaration in block.declarations:
+            if isinstance(declaration, (ProcedureDecl, FunctionDecl)):
+                token = declaration.token
+                self.add_routines(declaration.block, Timing(token.value, token.lineno))
+
+    def visit_block(self, node: Block):
+        timing = self.blocks[node]
+        stack = self.call_stack
+        if stack:
+            parent = stack[-1][0]
+            stack_node = parent.children.get(timing)
+            if stack_node is None:
+                stack_node = parent.children[timing] = StackNode(timing.name, parent)
+        else:
+            stack_node = self.profile.root
+            if stack_node is None:
+                stack_node = self.profile.root = StackNode(timing.name)
+        timing.active += 1
+        entry = [stack_node, 0.0]
+        stack.append(entry)
+        start = time.perf_counter()
+        try:
+            return super().visit_block(node)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            timing.stop(elapsed, entry[1])
+            stack_node.time += elapsed - entry[1]
+
+    visit_assign = timed_statement(Interpreter.visit_assign, lambda node: node.op.lineno)
+    visit_proccall = timed_statement(Interpreter.visit_proccall, lambda node: node.token.lineno)
+    visit_condition = timed_statement(Interpreter.visit_condition, lambda node: node.token.lineno)
+    visit_while = timed_statement(Interpreter.visit_while, lambda node: node.token.lineno)
+    visit_continue = timed_statement(Interpreter.visit_continue, lambda node: node.token.lineno)
+    visit_break = timed_statement(Interpreter.visit_break, lambda node: node.token.lineno)
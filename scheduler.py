@@ -0,0 +1,44 @@
+# Runs many programs concurrently on one asyncio event loop, each of them
+# for a slice of loop iterations and calls at a time, in turn
+import asyncio
+from typing import Iterable, List
+
+from interpreter import Interpreter
+from stack_evaluator import DEFAULT_SLICE_STEPS
+
+
+class Scheduler(object):
+    """
+    Scheduler runs the interpreters' programs as tasks which give control
+    back to the event loop after every slice. A paused task waits behind
+    the ones already ready, so the programs get their slices round-robin
+    and a short program is done before a long one started earlier
+    """
+
+    def __init__(self, slice_steps: int = DEFAULT_SLICE_STEPS, concurrency: int = None):
+        self.slice_steps = slice_steps
+        # programs running at once, the others wait for their turn; None runs them all
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency is not None else None
+
+    async def run(self, interpreter: Interpreter) -> dict:
+        """Run the interpreter's program and return the final values of its global variables."""
+        if self.semaphore is None:
+            return await interpreter.run_async(self.slice_steps)
+        async with self.semaphore:
+            return await interpreter.run_async(self.slice_steps)
+
+    async def run_all(self, interpreters: Iterable[Interpreter]) -> List:
+        """Run the programs concurrently and return their results in order, the exception
+        of a program which failed in place of its result."""
+        return await asyncio.gather(*(self.run(interpreter) for interpreter in interpreters),
+                                    return_exceptions=True)
+
+
+def run_programs(interpreters: Iterable[Interpreter], slice_steps: int = DEFAULT_SLICE_STEPS,
+                 concurrency: int = None) -> List:
+    """Run the programs concurrently in a new event loop, see Scheduler.run_all."""
+    async def run_all():
+        # the semaphore belongs to the loop it is made in
+        return await Scheduler(slice_steps, concurrency).run_all(interpreters)
+    return asyncio.run(run_all())
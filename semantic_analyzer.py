@@ -1,6 +1,8 @@
-from astnodes import Compound, Var, Assign, Program, Block, VarDecl, ProcedureDecl, ProcedureCall, BinOp
+from astnodes import Compound, Var, Assign, Program, Block, VarDecl, ProcedureDecl, ProcedureCall, BinOp, \
+    UnaryOp, FunctionDecl, FunctionCall, Condition, Then, Else, WhileLoop, Break, Continue
 from errors import SemanticError, ErrorCode
-from symbol_table import ScopedSymbolTable, VarSymbol, ProcedureSymbol, BuildinTypeSymbol
+from symbol_table import ScopedSymbolTable, VarSymbol, ProcedureSymbol, FunctionSymbol, BuildinTypeSymbol
+from tracing import Tracer
 from visitor import Visitor
 
 
@@ -10,16 +12,25 @@ class SemanticAnalyzer(Visitor):
     build program's symbol table by given AST parsed by Parser
     """
 
-    def __init__(self):
-        self.buildin_scope = ScopedSymbolTable(
-            scope_name='buildin',
-            scope_level=0,
-        )
-        self.__init_buildins()
+    def __init__(self, tracer: Tracer = None, buildin_scope: ScopedSymbolTable = None):
+        self.tracer = tracer if tracer is not None else Tracer()
+        if buildin_scope is None:
+            buildin_scope = ScopedSymbolTable(
+                scope_name='buildin',
+                scope_level=0,
+                tracer=self.tracer,
+            )
+            self.buildin_scope = buildin_scope
+            self.__init_buildins()
+        # a given buildin scope is only looked up, analyzers may share it
+        self.buildin_scope = buildin_scope
         self.current_scope = self.buildin_scope
+        # WHILE loops around the statement being visited, within its routine
+        self.loop_depth = 0
 
     def __init_buildins(self):
-        print('init buildin scope\'s symbols')
+        if self.tracer.full:
+            self.tracer.write('init buildin scope\'s symbols')
         # initialize the built-in types when the symbol table instance is created.
         self.buildin_scope.define(BuildinTypeSymbol('INTEGER'))
         self.buildin_scope.define(BuildinTypeSymbol('REAL'))
@@ -37,12 +48,17 @@ class SemanticAnalyzer(Visitor):
         global_scope = ScopedSymbolTable(
             scope_name='global',
             scope_level=self.current_scope.scope_level + 1,
-            enclosing_scope=self.current_scope)
+            enclosing_scope=self.current_scope,
+            tracer=self.tracer)
         self.current_scope = global_scope
-        print('enter scope: %s' % self.current_scope.scope_name)
+        if self.tracer.full:
+            self.tracer.write('enter scope: %s' % self.current_scope.scope_name)
         self.visit(node.block)
-        print(global_scope)
-        print('leave scope: %s' % self.current_scope.scope_name)
+        node.block.slot_names = global_scope.slot_names
+        node.block.slot_indexes = {name: slot for slot, name in enumerate(global_scope.slot_names)}
+        if self.tracer.full:
+            self.tracer.write(str(global_scope))
+            self.tracer.write('leave scope: %s' % self.current_scope.scope_name)
         self.current_scope = self.current_scope.enclosing_scope
 
     def visit_block(self, node: Block):
@@ -56,8 +72,23 @@ class SemanticAnalyzer(Visitor):
 
     def visit_binop(self, node: BinOp):
         # static type checker
-        self.visit(node.left)
-        self.visit(node.right)
+        self.visit_operands(node)
+
+    def visit_unaryop(self, node: UnaryOp):
+        self.visit_operands(node)
+
+    def visit_operands(self, node):
+        """Visit the operands of the operators of an expression, walking them iteratively: a long expression is a deep tree."""
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, BinOp):
+                pending.append(node.right)
+                pending.append(node.left)
+            elif isinstance(node, UnaryOp):
+                pending.append(node.factor)
+            else:
+                self.visit(node)
 
     def visit_vardecl(self, node: VarDecl):
         type_name = node.type_node.name
@@ -83,19 +114,31 @@ class SemanticAnalyzer(Visitor):
         # left-hand side
         self.visit(node.left)
 
-    def visit_var(self, node: Var):
-        # judge if variable is not declared
-        var_name = node.name
-        var_symbol = self.current_scope.lookup(var_name)
-        if var_symbol is None:
+    def resolve(self, name: str, token):
+        """Look the name up and return its symbol."""
+        symbol = self.current_scope.lookup(name)
+        # the built-in types are no values
+        if symbol is None or isinstance(symbol, BuildinTypeSymbol):
             self.error(
                 error_code=ErrorCode.ID_NOT_FOUND,
-                token=node.token
+                token=token
             )
+        return symbol
+
+    def visit_var(self, node: Var):
+        # judge if variable is not declared
+        var_symbol = self.resolve(node.name, node.token)
+        node.scope_level, node.slot = var_symbol.scope_level, var_symbol.slot
 
     def visit_procdecl(self, node: ProcedureDecl):
-        proc_name = node.token.value
-        proc_symbol = ProcedureSymbol(proc_name)
+        self.declare_routine(node, ProcedureSymbol(node.token.value))
+
+    def visit_funcdecl(self, node: FunctionDecl):
+        return_type = self.current_scope.lookup(node.return_type.name)
+        self.declare_routine(node, FunctionSymbol(node.token.value, return_type=return_type))
+
+    def declare_routine(self, node, proc_symbol: ProcedureSymbol):
+        proc_name = proc_symbol.name
         if self.current_scope.lookup(proc_name, current_scope_only=True) is not None:
             self.error(
                 error_code=ErrorCode.DUPLICATE_PROC_DECL,
@@ -103,16 +146,19 @@ class SemanticAnalyzer(Visitor):
             )
 
         self.current_scope.define(proc_symbol)
+        node.slot = proc_symbol.slot
 
         # new scope include var declaration and formal params
         procedure_scope = ScopedSymbolTable(
             scope_name=proc_name,
             scope_level=self.current_scope.scope_level + 1,
-            enclosing_scope=self.current_scope)
+            enclosing_scope=self.current_scope,
+            tracer=self.tracer)
         self.current_scope = procedure_scope
 
         # then we shoud enter new scope
-        print('enter scope: %s' % self.current_scope.scope_name)
+        if self.tracer.full:
+            self.tracer.write('enter scope: %s' % self.current_scope.scope_name)
         # intert params into the procedure scope
         for param in node.params:
             param_name = param.var_node.name
@@ -123,19 +169,59 @@ class SemanticAnalyzer(Visitor):
             # define symbol into current scope
             self.current_scope.define(var_symbol)
 
+        # a BREAK or CONTINUE can't leave the routine for the caller's loop
+        loop_depth, self.loop_depth = self.loop_depth, 0
         self.visit(node.block)
-        print(procedure_scope)
-        print('leave scope: %s' % self.current_scope.scope_name)
+        self.loop_depth = loop_depth
+        node.block.slot_names = procedure_scope.slot_names
+        node.block.slot_indexes = {name: slot for slot, name in enumerate(procedure_scope.slot_names)}
+        if self.tracer.full:
+            self.tracer.write(str(procedure_scope))
+            self.tracer.write('leave scope: %s' % self.current_scope.scope_name)
         self.current_scope = self.current_scope.enclosing_scope
 
     def visit_proccall(self, node: ProcedureCall):
-        proc_name = node.proc_name
-        proc_symbol: ProcedureSymbol = self.current_scope.lookup(proc_name)
+        self.check_call(node, node.proc_name)
+
+    def visit_funccall(self, node: FunctionCall):
+        self.check_call(node, node.func_name)
+
+    def check_call(self, node, proc_name: str):
+        for actual_param in node.actual_params:
+            self.visit(actual_param)
+        proc_symbol = self.resolve(proc_name, node.token)
+        node.scope_level, node.slot = proc_symbol.scope_level, proc_symbol.slot
         # check the arguements's number
         formal_params = proc_symbol.params
         actual_params = node.actual_params
-        if len(formal_params) is not len(actual_params):
+        if len(formal_params) != len(actual_params):
             self.error(
                 error_code=ErrorCode.UNEXPECTED_PROC_ARGUMENTS_NUMBER,
                 token=node.token
             )
+
+    def visit_condition(self, node: Condition):
+        self.visit(node.condition_node)
+        self.visit(node.then_node)
+        if node.else_node is not None:
+            self.visit(node.else_node)
+
+    def visit_then(self, node: Then):
+        self.visit(node.child)
+
+    def visit_else(self, node: Else):
+        self.visit(node.child)
+
+    def visit_while(self, node: WhileLoop):
+        self.visit(node.conditon_node)
+        self.loop_depth += 1
+        self.visit(node.body_node)
+        self.loop_depth -= 1
+
+    def visit_break(self, node: Break):
+        if not self.loop_depth:
+            self.error(error_code=ErrorCode.BREAK_OUTSIDE_LOOP, token=node.token)
+
+    def visit_continue(self, node: Continue):
+        if not self.loop_depth:
+            self.error(error_code=ErrorCode.CONTINUE_OUTSIDE_LOOP, token=node.token)
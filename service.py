@@ -0,0 +1,202 @@
+# A long lived interpreter serving programs over HTTP, which keeps the
+# analyzed programs in memory and only runs them again
+import errno
+import hashlib
+import io
+import json
+import os
+import socket
+import stat
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from analysis import mark_tail_calls
+from budget import LIMITS, make_budget
+from errors import Error
+from interpreter import Interpreter, resolve_slots
+from memo import LRUCache
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from token_stream import TokenStream
+from tokenizer import TOKENIZERS
+from tracing import Tracer, TraceLevel
+
+# analyzed programs kept by a service by default
+DEFAULT_PROGRAMS = 256
+
+
+def program_key(source: str, optimize: bool) -> str:
+    """Return the key of a program, the same source is optimized or not."""
+    digest = hashlib.sha256(source.encode())
+    digest.update(b'O' if optimize else b'-')
+    return digest.hexdigest()
+
+
+class CompileService(object):
+    """
+    CompileService runs the programs it is sent and keeps the analyzed
+    tree of the most recently run ones, keyed by their source. A program
+    sent again only runs: it is neither tokenized, parsed nor analyzed
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_PROGRAMS, tokenizer: str = 'regex'):
+        self.programs = LRUCache(maxsize)
+        self.tokenizer = TOKENIZERS[tokenizer]
+        # the buildin types are defined once, every analysis looks them up there
+        self.buildin_scope = SemanticAnalyzer().buildin_scope
+
+    def stats(self) -> dict:
+        programs = self.programs
+        lookups = programs.hits + programs.misses
+        return {
+            'hits': programs.hits,
+            'misses': programs.misses,
+            'hit_rate': programs.hits / lookups if lookups else 0.0,
+            'size': len(programs),
+            'evictions': programs.evictions,
+        }
+
+    def analyze(self, source: str, interpreter: Interpreter, timings: dict):
+        """The phases of Interpreter.analyze, timed one by one and traced by the interpreter's tracer."""
+        start = time.perf_counter()
+        tokens = TokenStream(self.tokenizer(source))
+        timings['tokenize'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ast = Parser(tokens).parse()
+        timings['parse'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tracer = interpreter.tracer
+        if tracer.full:
+            # the shared scope does not trace, the interpreter's own traced the
+            # buildin types and their lookups like the command line does
+            analyzer = interpreter.analyzer
+        else:
+            analyzer = SemanticAnalyzer(tracer=tracer, buildin_scope=self.buildin_scope)
+        analyzer.visit(ast)
+        timings['analyze'] = time.perf_counter() - start
+
+        if interpreter.optimizer is not None:
+            start = time.perf_counter()
+            ast = interpreter.optimizer.optimize(ast)
+            resolve_slots(ast)
+            timings['optimize'] = time.perf_counter() - start
+        mark_tail_calls(ast)
+        return ast
+
+    def run(self, source: str, engine: str = 'tree', optimize: bool = False, memoize: bool = False,
+            trace: str = 'off', **limits) -> dict:
+        """Run a program, return its globals or error, trace, cache statistics and phase latencies in ms."""
+        timings = {}
+        start = time.perf_counter()
+        key = program_key(source, optimize)
+        program = self.programs.get(key)
+        timings['lookup'] = time.perf_counter() - start
+        cached = program is not None
+
+        response = {'cached': cached}
+        output = io.StringIO()
+        try:
+            tracer = Tracer(TraceLevel[trace.upper()], output)
+            # checked first, a wrong option is not worth an analysis
+            interpreter = Interpreter(None, engine=engine, tracer=tracer, optimize=optimize, memoize=memoize,
+                                      budget=make_budget(**limits))
+            if not cached:
+                program = self.analyze(source, interpreter, timings)
+                self.programs.put(key, program)
+            interpreter.program = program
+            start = time.perf_counter()
+            response['result'] = interpreter.interpret()
+            timings['execute'] = time.perf_counter() - start
+        except (Error, ValueError, KeyError, ArithmeticError, RecursionError) as error:
+            response['error'] = {'type': error.__class__.__name__, 'message': str(error)}
+        response['trace'] = output.getvalue()
+        response['cache'] = self.stats()
+        response['timings'] = {phase: elapsed * 1000 for phase, elapsed in timings.items()}
+        return response
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    POST /run runs the program in the JSON body {"source": ..., "engine": ...,
+    "optimize": ..., "memoize": ..., "trace": ..., "max_steps": ..., "max_depth": ...,
+    "max_time": ..., "max_memory": ...}, GET /stats returns the cache's statistics
+    """
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.reply(200, self.server.service.stats())
+        else:
+            self.reply(404, {'error': {'type': 'NotFound', 'message': self.path}})
+
+    def do_POST(self):
+        if self.path != '/run':
+            self.reply(404, {'error': {'type': 'NotFound', 'message': self.path}})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            source = request.pop('source')
+            options = {name: request[name] for name in ('engine', 'optimize', 'memoize', 'trace') + LIMITS
+                       if name in request}
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            self.reply(400, {'error': {'type': 'BadRequest', 'message': repr(error)}})
+            return
+        try:
+            response = self.server.service.run(source, **options)
+        except Exception as error:
+            self.reply(500, {'error': {'type': error.__class__.__name__, 'message': str(error)}})
+            return
+        self.reply(400 if 'error' in response else 200, response)
+
+    def reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # the clients of a unix socket have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ServiceServer(HTTPServer):
+    """Serve a CompileService on a TCP port, one request after the other"""
+
+    def __init__(self, address, service: CompileService):
+        self.service = service
+        super().__init__(address, ServiceHandler)
+
+
+class UnixServiceServer(ServiceServer):
+    """Serve a CompileService on a unix socket"""
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        try:
+            mode = os.stat(self.server_address).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            # only the socket of a previous server is replaced, never another file
+            if not stat.S_ISSOCK(mode):
+                raise OSError(errno.EADDRINUSE, f'address in use, {self.server_address} is not a socket')
+            os.remove(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_address = self.socket.getsockname()
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def make_server(address: str, service: CompileService) -> ServiceServer:
+    """Bind a server to a port, a host:port or the path of a unix socket."""
+    host, _, port = address.rpartition(':')
+    if port.isdigit():
+        return ServiceServer((host or 'localhost', int(port)), service)
+    return UnixServiceServer(address, service)
@@ -0,0 +1,66 @@
+# Sources feed the tokenizers with the program text chunk by chunk, so a
+# program never has to sit in memory as a single string before lexing
+import codecs
+import mmap
+
+CHUNK_SIZE = 1 << 16
+
+
+class Source(object):
+    """Source decodes a binary stream (file, mmap, socket...) incrementally"""
+
+    def __init__(self, stream, encoding: str = 'utf-8', chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.chunk_size = chunk_size
+        self.exhausted = False
+
+    def read(self) -> str:
+        """Return the next chunk of text, an empty string at the end of input."""
+        while not self.exhausted:
+            data = self.stream.read(self.chunk_size)
+            if not data:
+                self.exhausted = True
+                return self.decoder.decode(b'', final=True)
+            text = self.decoder.decode(data)
+            # a chunk may end in the middle of a multibyte character
+            if text:
+                return text
+        return ''
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TextSource(Source):
+    """TextSource serves a program which is already held in a string"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.exhausted = False
+
+    def read(self) -> str:
+        if self.exhausted:
+            return ''
+        self.exhausted = True
+        return self.text
+
+    def close(self):
+        pass
+
+
+def open_source(path: str, encoding: str = 'utf-8', chunk_size: int = CHUNK_SIZE) -> Source:
+    """Open the file at path as a memory mapped Source."""
+    with open(path, 'rb') as file:
+        try:
+            stream = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can not be mapped
+            return TextSource('')
+    return Source(stream, encoding=encoding, chunk_size=chunk_size)
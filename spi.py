@@ -1,22 +1,182 @@
+import argparse
+import json
+import os
 import sys
-from tokenizer import Tokenizer
-from parser import Parser
+import time
+from budget import LIMITS, make_budget
+from batch import find_programs, run_batch, OK
+from cache import ProgramCache, CACHE_DIRECTORY, load_program
+from service import CompileService, make_server
+from tokenizer import TOKENIZERS
+from astnodes import dump_tree
 from interpreter import Interpreter
+from profiler import ProfilingInterpreter, SORT_KEYS
+from bytecode import Compiler, disassemble
+from transpiler import Transpiler
+from tracing import Tracer, TraceLevel, open_trace_file
 
 
 def show_help():
     print('simple pascal interpret for version 1.0')
 
 
+def build_argparser() -> argparse.ArgumentParser:
+    argparser = argparse.ArgumentParser(prog='spi')
+    argparser.add_argument('file', nargs='?')
+    argparser.add_argument('--tokenizer', choices=sorted(TOKENIZERS), default='char',
+                           help='scanner used to split the source into tokens')
+    argparser.add_argument('--engine', choices=Interpreter.ENGINES, default='tree',
+                           help='how the checked program is executed')
+    argparser.add_argument('--disassemble', action='store_true',
+                           help='print the bytecode of the program instead of running it')
+    argparser.add_argument('--dump-python', action='store_true',
+                           help='print the python source of the program instead of running it')
+    argparser.add_argument('--trace', choices=[level.name.lower() for level in TraceLevel], default='summary',
+                           help='how much of the analysis and of the execution is traced')
+    argparser.add_argument('--trace-file',
+                           help='write the trace to this file instead of stdout')
+    argparser.add_argument('-O', '--optimize', action='store_true',
+                           help='optimize the checked program before running it')
+    argparser.add_argument('--dump-tree', action='store_true',
+                           help='print the checked, and maybe optimized, tree instead of running it')
+    argparser.add_argument('--memoize', action='store_true',
+                           help='cache the results of the pure functions, with the tree or closure engine')
+    argparser.add_argument('--max-steps', type=int,
+                           help='stop the run past this many loop iterations and routine calls')
+    argparser.add_argument('--max-depth', type=int,
+                           help='stop the run past this depth of calls')
+    argparser.add_argument('--max-time', type=float,
+                           help='stop the run past this many seconds')
+    argparser.add_argument('--max-memory', type=int,
+                           help='stop the run past this many bytes of active frames')
+    argparser.add_argument('--profile', choices=SORT_KEYS, nargs='?', const='exclusive',
+                           help='print the time of every routine and line to stderr, sorted by this, '
+                                'with the tree engine')
+    argparser.add_argument('--profile-collapsed', metavar='FILE',
+                           help='write the profiled stacks of calls to this file for flamegraph tools')
+    argparser.add_argument('--no-cache', action='store_true',
+                           help='neither read nor write the cache of analyzed programs')
+    argparser.add_argument('--clear-cache', action='store_true',
+                           help='remove the analyzed programs from the cache first')
+    argparser.add_argument('--cache-dir',
+                           help=f'directory of the cache, {CACHE_DIRECTORY} next to the program by default')
+    argparser.add_argument('--serve', metavar='ADDRESS',
+                           help='serve programs over HTTP on a port, host:port or unix socket path instead')
+    argparser.add_argument('--batch', metavar='DIR',
+                           help='run every program of a directory, one JSON line per program as it ends')
+    argparser.add_argument('-j', '--jobs', type=int,
+                           help='processes running the programs of a batch, one per core by default')
+    return argparser
+
+
+def run(args, interpreter: Interpreter):
+    if args.dump_tree:
+        print(dump_tree(interpreter.analyze()))
+    elif args.disassemble:
+        print(disassemble(Compiler().compile(interpreter.analyze())))
+    elif args.dump_python:
+        print(Transpiler().transpile(interpreter.analyze()), end='')
+    else:
+        interpreter.interpret()
+
+
+def limits(args) -> dict:
+    return {name: getattr(args, name) for name in LIMITS}
+
+
+def execute(args, tracer: Tracer, cache: ProgramCache = None):
+    if profiling(args):
+        interpreter = ProfilingInterpreter(None, tracer=tracer, optimize=args.optimize, memoize=args.memoize,
+                                           budget=make_budget(**limits(args)))
+    else:
+        interpreter = Interpreter(None, engine=args.engine, tracer=tracer, optimize=args.optimize,
+                                  memoize=args.memoize, budget=make_budget(**limits(args)))
+    load_program(interpreter, args.file, TOKENIZERS[args.tokenizer], cache)
+    try:
+        run(args, interpreter)
+    finally:
+        if profiling(args):
+            report(args, interpreter.profile)
+
+
+def profiling(args) -> bool:
+    return args.profile is not None or args.profile_collapsed is not None
+
+
+def report(args, profile):
+    """Print the profile of a run, or the part of it until it failed."""
+    if args.profile is not None:
+        with open(args.file) as file:
+            source = file.read()
+        print(profile.report(sort=args.profile, source=source), end='', file=sys.stderr)
+    if args.profile_collapsed is not None:
+        with open(args.profile_collapsed, 'w') as file:
+            profile.write_collapsed(file)
+
+
+def serve(address: str):
+    try:
+        server = make_server(address, CompileService())
+    except OSError as error:
+        sys.exit(f'spi: cannot serve on {address}: {error.strerror}')
+    print(f'serving on {address}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def batch(args, cache_dir: str):
+    start = time.perf_counter()
+    counts = {}
+    records = run_batch(find_programs(args.batch), jobs=args.jobs,
+                        cache_directory=None if args.no_cache else cache_dir,
+                        engine=args.engine, optimize=args.optimize, memoize=args.memoize,
+                        trace=args.trace, tokenizer=args.tokenizer, **limits(args))
+    for record in records:
+        counts[record['status']] = counts.get(record['status'], 0) + 1
+        print(json.dumps(record), flush=True)
+    failed = sum(count for status, count in counts.items() if status != OK)
+    print(f'{sum(counts.values())} programs, {failed} failed in {time.perf_counter() - start:.1f} s',
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
 def main():
-    if len(sys.argv) is 1:
-        show_help()
+    argparser = build_argparser()
+    args = argparser.parse_args()
+    cache_dir = args.cache_dir
+    if cache_dir is None and args.batch is not None:
+        # one cache for the whole batch, shared by its processes
+        cache_dir = os.path.join(args.batch, CACHE_DIRECTORY)
+    elif cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(args.file or '.')), CACHE_DIRECTORY)
+    if args.clear_cache:
+        ProgramCache(cache_dir).clear()
+    if args.serve is not None:
+        serve(args.serve)
+        return
+    if args.memoize and args.engine not in Interpreter.MEMOIZING_ENGINES:
+        argparser.error(f'the {args.engine} engine does not memoize')
+    if make_budget(**limits(args)) is not None and args.engine not in Interpreter.BUDGETED_ENGINES:
+        argparser.error(f'the {args.engine} engine does not keep to a budget')
+    if profiling(args) and args.engine != 'tree':
+        argparser.error('only the tree engine is profiled')
+    if args.batch is not None:
+        sys.exit(batch(args, cache_dir))
+    if args.file is None:
+        if not args.clear_cache:
+            show_help()
+        return
+    cache = None if args.no_cache else ProgramCache(cache_dir)
+    trace_level = TraceLevel[args.trace.upper()]
+    if args.trace_file is None:
+        execute(args, Tracer(trace_level), cache)
         return
-    text = open(sys.argv[1], 'r').read()
-    tokenizer = Tokenizer(text)
-    parser = Parser(tokenizer)
-    interpreter = Interpreter(parser)
-    interpreter.interpret()
+    with open_trace_file(args.trace_file) as sink:
+        execute(args, Tracer(trace_level, sink), cache)
 
 
 if __name__ == "__main__":
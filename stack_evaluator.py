@@ -0,0 +1,322 @@
+# Evaluates the checked AST with explicit stacks instead of python's own call stack
+import asyncio
+from enum import IntEnum
+
+from astnodes import BinOp, Num, UnaryOp, Compound, Var, Assign, NoOp, Program, ProcedureDecl, \
+    ProcedureCall, Boolean, Condition, FunctionDecl, FunctionCall, WhileLoop, Continue, Break, \
+    variable_values
+from budget import Budget
+from callstack import CallStack, Frame, FrameType
+from closure_compiler import BINARY_OPERATORS, UNARY_OPERATORS
+from errors import RuntimeError, ErrorCode
+from tracing import Tracer
+
+
+# loop iterations and routine calls run before an asynchronous run lets other tasks run
+DEFAULT_SLICE_STEPS = 1000
+
+
+class Step(IntEnum):
+    # start a node, one step per kind of node
+    COMPOUND = 1
+    ASSIGN = 2
+    PROCCALL = 3
+    CONDITION = 4
+    WHILE = 5
+    BREAK = 6
+    CONTINUE = 7
+    NOOP = 8
+    BINOP = 9
+    UNARYOP = 10
+    LITERAL = 11
+    VAR = 12
+    FUNCCALL = 13
+    # finish a node once its children are done
+    STORE = 14
+    APPLY_BINOP = 15
+    APPLY_UNARYOP = 16
+    BRANCH = 17
+    LOOP_TEST = 18
+    LOOP_AGAIN = 19
+    BLOCK = 20
+    INVOKE_PROCEDURE = 21
+    INVOKE_FUNCTION = 22
+    RETURN_PROCEDURE = 23
+    RETURN_FUNCTION = 24
+    TAIL_CALL = 25
+
+
+COMPOUND = Step.COMPOUND.value
+ASSIGN = Step.ASSIGN.value
+PROCCALL = Step.PROCCALL.value
+CONDITION = Step.CONDITION.value
+WHILE = Step.WHILE.value
+BREAK = Step.BREAK.value
+CONTINUE = Step.CONTINUE.value
+NOOP = Step.NOOP.value
+BINOP = Step.BINOP.value
+UNARYOP = Step.UNARYOP.value
+LITERAL = Step.LITERAL.value
+VAR = Step.VAR.value
+FUNCCALL = Step.FUNCCALL.value
+STORE = Step.STORE.value
+APPLY_BINOP = Step.APPLY_BINOP.value
+APPLY_UNARYOP = Step.APPLY_UNARYOP.value
+BRANCH = Step.BRANCH.value
+LOOP_TEST = Step.LOOP_TEST.value
+LOOP_AGAIN = Step.LOOP_AGAIN.value
+BLOCK = Step.BLOCK.value
+INVOKE_PROCEDURE = Step.INVOKE_PROCEDURE.value
+INVOKE_FUNCTION = Step.INVOKE_FUNCTION.value
+RETURN_PROCEDURE = Step.RETURN_PROCEDURE.value
+RETURN_FUNCTION = Step.RETURN_FUNCTION.value
+TAIL_CALL = Step.TAIL_CALL.value
+
+# the step starting each kind of node
+START_STEPS = {
+    Compound: COMPOUND,
+    Assign: ASSIGN,
+    ProcedureCall: PROCCALL,
+    Condition: CONDITION,
+    WhileLoop: WHILE,
+    Break: BREAK,
+    Continue: CONTINUE,
+    NoOp: NOOP,
+    BinOp: BINOP,
+    UnaryOp: UNARYOP,
+    Num: LITERAL,
+    Boolean: LITERAL,
+    Var: VAR,
+    FunctionCall: FUNCCALL,
+}
+
+
+class StackEvaluator(object):
+    """
+    StackEvaluator runs a checked program without recursing in python.
+    The steps left to run are (step, node) pairs on a work stack, the
+    values of the expressions being computed are on a value stack:
+    starting a node pushes the step finishing it, then its children's,
+    so deep calls and long expressions only cost heap memory
+    """
+
+    def __init__(self, tracer: Tracer = None, budget: Budget = None):
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.budget = budget
+        self.callstack = CallStack(budget)
+        self.work = []
+        self.values = []
+        # nesting of the pascal calls, now and at its deepest during the run
+        self.depth = 0
+        self.max_depth = 0
+
+    def error(self, error_code: ErrorCode, token):
+        raise RuntimeError(
+            error_code=error_code,
+            token=token,
+            message=f'{error_code.value} -> {token}',
+        )
+
+    def run(self, program: Program) -> dict:
+        """Run the program and return the final values of its global variables."""
+        frame = self.begin(program)
+        self.execute()
+        return self.end(program, frame)
+
+    async def run_async(self, program: Program, slice_steps: int = DEFAULT_SLICE_STEPS) -> dict:
+        """Run the program like run(), letting the event loop run other tasks every slice_steps
+        loop iterations and routine calls."""
+        frame = self.begin(program)
+        while not self.execute(slice_steps):
+            await asyncio.sleep(0)
+        return self.end(program, frame)
+
+    def begin(self, program: Program) -> Frame:
+        if self.tracer.summary:
+            self.tracer.write(f'ENTER: PROGRAM {program.name}')
+        frame = Frame(name=program.name, type=FrameType.PROGRAM, slot_names=program.block.slot_names)
+        self.callstack.push(frame)
+        self.work.append((BLOCK, program.block))
+        return frame
+
+    def end(self, program: Program, frame: Frame) -> dict:
+        tracer = self.tracer
+        if tracer.summary:
+            tracer.write(str(self.callstack))
+        self.callstack.pop()
+        if tracer.summary:
+            tracer.write(f'LEAVE: PROGRAM {program.name}')
+        return variable_values(program.block, frame.slots)
+
+    def execute(self, slice_steps: int = None) -> bool:
+        """Run the steps until the work stack is empty and return True, or pause after
+        slice_steps loop iterations and routine calls and return False."""
+        work, values = self.work, self.values
+        push, pop = work.append, work.pop
+        callstack = self.callstack
+        display = callstack.display
+        tracer = self.tracer
+        calls, full = tracer.calls, tracer.full
+        start = START_STEPS
+        budget = self.budget
+        depth = self.depth
+        # the steps left in the slice, never down to 0 without one
+        ticks = slice_steps if slice_steps is not None else -1
+
+        while work:
+            step, node = pop()
+            if step == VAR:
+                values.append(display[node.scope_level].slots[node.slot])
+            elif step == LITERAL:
+                values.append(node.value)
+            elif step == BINOP:
+                left, right = node.left, node.right
+                left_step, right_step = start[left.__class__], start[right.__class__]
+                if left_step == VAR and right_step == LITERAL:
+                    # the most common operands, computed right away
+                    values.append(BINARY_OPERATORS[node.op.type](
+                        display[left.scope_level].slots[left.slot], right.value))
+                else:
+                    push((APPLY_BINOP, node))
+                    push((right_step, right))
+                    push((left_step, left))
+            elif step == APPLY_BINOP:
+                right = values.pop()
+                values[-1] = BINARY_OPERATORS[node.op.type](values[-1], right)
+            elif step == ASSIGN:
+                push((STORE, node))
+                push((start[node.right.__class__], node.right))
+            elif step == STORE:
+                var = node.left
+                frame = callstack.peek()
+                if frame.type is FrameType.FUNCTION and frame.name == var.name:
+                    frame.return_val = values.pop()
+                else:
+                    display[var.scope_level].slots[var.slot] = values.pop()
+            elif step == COMPOUND:
+                work.extend([(start[child.__class__], child) for child in reversed(node.childrens)])
+            elif step == CONDITION:
+                push((BRANCH, node))
+                push((start[node.condition_node.__class__], node.condition_node))
+            elif step == BRANCH:
+                if values.pop():
+                    child = node.then_node.child
+                    push((start[child.__class__], child))
+                elif node.else_node is not None:
+                    child = node.else_node.child
+                    push((start[child.__class__], child))
+            elif step == WHILE or step == LOOP_AGAIN:
+                push((LOOP_TEST, node))
+                push((start[node.conditon_node.__class__], node.conditon_node))
+            elif step == LOOP_TEST:
+                # the loop only goes on while its condition is exactly TRUE
+                if values.pop() is True:
+                    if budget is not None:
+                        budget.step(node.token)
+                    push((LOOP_AGAIN, node))
+                    push((start[node.body_node.__class__], node.body_node))
+                    ticks -= 1
+                    if not ticks:
+                        self.depth = depth
+                        return False
+            elif step == BREAK:
+                while pop()[0] != LOOP_AGAIN:
+                    pass
+            elif step == CONTINUE:
+                while work[-1][0] != LOOP_AGAIN:
+                    pop()
+            elif step == UNARYOP:
+                push((APPLY_UNARYOP, node))
+                push((start[node.factor.__class__], node.factor))
+            elif step == APPLY_UNARYOP:
+                values[-1] = UNARY_OPERATORS[node.op.type](values[-1])
+            elif step == FUNCCALL or step == PROCCALL:
+                if node.tail:
+                    push((TAIL_CALL, node))
+                else:
+                    if calls:
+                        if step == FUNCCALL:
+                            tracer.write(f'ENTER: FUNCTION {node.func_name}')
+                        else:
+                            tracer.write(f'ENTER: PROCEDURE {node.proc_name}')
+                    push((INVOKE_FUNCTION if step == FUNCCALL else INVOKE_PROCEDURE, node))
+                # the first argument is computed first
+                work.extend([(start[param.__class__], param) for param in reversed(node.actual_params)])
+            elif step == INVOKE_FUNCTION or step == INVOKE_PROCEDURE:
+                routine = display[node.scope_level].slots[node.slot]
+                if step == INVOKE_FUNCTION:
+                    frame = Frame(name=node.func_name, type=FrameType.FUNCTION,
+                                  slot_names=routine.block.slot_names, scope_level=node.scope_level + 1)
+                    push((RETURN_FUNCTION, node))
+                else:
+                    frame = Frame(name=node.proc_name, type=FrameType.PROCEDURE,
+                                  slot_names=routine.block.slot_names, scope_level=node.scope_level + 1)
+                    push((RETURN_PROCEDURE, node))
+                count = len(node.actual_params)
+                if count:
+                    frame.slots[:count] = values[-count:]
+                    del values[-count:]
+                callstack.push(frame)
+                depth += 1
+                if depth > self.max_depth:
+                    self.max_depth = depth
+                push((BLOCK, routine.block))
+                ticks -= 1
+                if not ticks:
+                    self.depth = depth
+                    return False
+            elif step == BLOCK:
+                frame = callstack.peek()
+                for declaration in node.declarations:
+                    if isinstance(declaration, (ProcedureDecl, FunctionDecl)):
+                        frame.slots[declaration.slot] = declaration
+                push((COMPOUND, node.compound_statement))
+            elif step == RETURN_FUNCTION:
+                if full:
+                    tracer.write(str(callstack))
+                if calls:
+                    tracer.write(f'LEAVE: FUNCTION {node.func_name}')
+                return_val = callstack.peek().return_val
+                callstack.pop()
+                depth -= 1
+                if return_val is None:
+                    self.error(error_code=ErrorCode.MISSING_RETURN, token=node.token)
+                values.append(return_val)
+            elif step == RETURN_PROCEDURE:
+                if full:
+                    tracer.write(str(callstack))
+                callstack.pop()
+                depth -= 1
+                if calls:
+                    tracer.write(f'LEAVE: PROCEDURE {node.proc_name}')
+            elif step == TAIL_CALL:
+                # the routine calls itself last: its current call ends and
+                # the new one starts in the same frame
+                count = len(node.actual_params)
+                actual_param_values = values[-count:] if count else []
+                del values[len(values) - count:]
+                if full:
+                    tracer.write(str(callstack))
+                if calls:
+                    if isinstance(node, FunctionCall):
+                        kind, name = 'FUNCTION', node.func_name
+                    else:
+                        kind, name = 'PROCEDURE', node.proc_name
+                    tracer.write(f'LEAVE: {kind} {name}')
+                    tracer.write(f'ENTER: {kind} {name}')
+                if budget is not None:
+                    budget.step(node.token)
+                callstack.peek().restart(actual_param_values)
+                while work[-1][0] not in (RETURN_FUNCTION, RETURN_PROCEDURE):
+                    pop()
+                push((BLOCK, display[node.scope_level].slots[node.slot].block))
+                ticks -= 1
+                if not ticks:
+                    self.depth = depth
+                    return False
+            elif step == NOOP:
+                pass
+            else:
+                raise ValueError(f'invalid step {step}')
+        self.depth = depth
+        return True
@@ -3,6 +3,8 @@
 # 1: To make sure that when we assign a value to a variable the types are correct (type checking)
 # 2: To make sure that a variable is declared before it is used
 
+from tracing import Tracer
+
 
 class Symbol(object):
     """Symbol is base class for many kinds of symbols"""
@@ -10,6 +12,10 @@ class Symbol(object):
     def __init__(self, name: str, type=None):
         self.name = name
         self.type = type
+        # set once defined: level of the defining scope and index of
+        # the symbol in the frames of that scope
+        self.scope_level = None
+        self.slot = None
 
     def __str__(self):
         return "<{class_name}(name = '{name}')>".format(
@@ -42,6 +48,14 @@ class ProcedureSymbol(Symbol):
         )
 
 
+class FunctionSymbol(ProcedureSymbol):
+    """FunctionSymbol is symbol of function declaration"""
+
+    def __init__(self, name, params=None, return_type: Symbol = None):
+        super().__init__(name, params)
+        self.return_type = return_type
+
+
 class VarSymbol(Symbol):
     """VarSymbol has name and type"""
 
@@ -59,8 +73,11 @@ class VarSymbol(Symbol):
 
 
 class ScopedSymbolTable(object):
-    def __init__(self, scope_name: str, scope_level: int, enclosing_scope=None):
+    def __init__(self, scope_name: str, scope_level: int, enclosing_scope=None, tracer: Tracer = None):
         self.__symbols = {}
+        self.tracer = tracer if tracer is not None else Tracer()
+        # names of the defined symbols, indexed by slot
+        self.slot_names = []
         self.scope_name = scope_name
         self.scope_level = scope_level
         self.enclosing_scope = enclosing_scope
@@ -89,11 +106,16 @@ class ScopedSymbolTable(object):
     __repr = __str__
 
     def define(self, symbol: Symbol):
-        print('Define: %s' % symbol)
+        if self.tracer.full:
+            self.tracer.write('Define: %s' % symbol)
+        symbol.scope_level = self.scope_level
+        symbol.slot = len(self.slot_names)
+        self.slot_names.append(symbol.name)
         self.__symbols[symbol.name] = symbol
 
     def lookup(self, name: str, current_scope_only=False) -> Symbol:
-        print('Lookup: %s. (Scope name: %s)' % (name, self.scope_name))
+        if self.tracer.full:
+            self.tracer.write('Lookup: %s. (Scope name: %s)' % (name, self.scope_name))
         symbol = self.__symbols.get(name)
         if symbol is not None:
             return symbol
@@ -0,0 +1,76 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+from batch import find_programs, run_batch, run_file, OK, FAILED, CRASHED
+from test_interpreter import PROGRAMS, run_code
+
+
+def run_or_die(path: str, **options) -> dict:
+    """Run the program like a worker, or kill the worker on the programs named die.pas."""
+    if os.path.basename(path) == 'die.pas':
+        os._exit(1)
+    return run_file(path, **options)
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        os.mkdir(os.path.join(self.directory, 'more'))
+        self.expected = {}
+        for index, (name, code) in enumerate(PROGRAMS.items()):
+            path = os.path.join(self.directory, 'more' if index % 2 else '', name + '.pas')
+            with open(path, 'w') as file:
+                file.write(code)
+            self.expected[path] = run_code(code)
+        self.write('bad.pas', 'program bad; begin a := 1 end.')
+        self.write('zero.pas', 'program zero; var a : integer; begin a := 1 // 0 end.')
+        self.write('notes.txt', 'not a program')
+
+    def write(self, name: str, code: str):
+        with open(os.path.join(self.directory, name), 'w') as file:
+            file.write(code)
+
+    def test_find_programs(self):
+        paths = find_programs(self.directory)
+        assert len(paths) == len(PROGRAMS) + 2
+        assert paths == find_programs(self.directory)
+        assert paths[0] == os.path.join(self.directory, 'bad.pas')
+
+    def test_run_file(self):
+        assert run_file(os.path.join(self.directory, 'bad.pas'))['error']['type'] == 'SemanticError'
+        record = run_file(os.path.join(self.directory, 'zero.pas'), trace='summary')
+        assert (record['status'], record['error']['type']) == (CRASHED, 'ZeroDivisionError')
+        assert record['output'] == 'ENTER: PROGRAM zero\n'
+
+    def test_run_batch(self):
+        cache = os.path.join(self.directory, 'cache')
+        for cached in (False, True):
+            records = list(run_batch(find_programs(self.directory), jobs=2, cache_directory=cache,
+                                     engine='closure'))
+            statuses = {os.path.basename(record['file']): record['status'] for record in records}
+            assert (statuses.pop('bad.pas'), statuses.pop('zero.pas')) == (FAILED, CRASHED)
+            assert set(statuses.values()) == {OK}
+            for record in records:
+                if record['status'] == OK:
+                    assert record['result'] == self.expected[record['file']]
+                    # the processes share the cache on disk
+                    assert record['cached'] is cached
+
+    def test_dead_worker(self):
+        self.write('die.pas', PROGRAMS['loops'])
+        paths = find_programs(self.directory)
+        # a worker dies on die.pas, the other programs its pool held run again
+        with mock.patch('batch.run_file', run_or_die):
+            records = list(run_batch(paths, jobs=2))
+        assert sorted(record['file'] for record in records) == sorted(paths)
+        statuses = {os.path.basename(record['file']): record['status'] for record in records}
+        assert (statuses.pop('die.pas'), statuses.pop('bad.pas'), statuses.pop('zero.pas')) == \
+            (CRASHED, FAILED, CRASHED)
+        assert set(statuses.values()) == {OK}
+        for record in records:
+            if os.path.basename(record['file']) == 'die.pas':
+                assert record['error']['type'] == 'BrokenProcessPool'
+            elif record['status'] == OK:
+                assert record['result'] == self.expected[record['file']]
@@ -0,0 +1,93 @@
+from unittest import TestCase
+from budget import Budget, frame_size
+from errors import RuntimeError, ErrorCode
+from interpreter import Interpreter
+from parser import Parser
+from test_interpreter import PROGRAMS, run_code
+from tokenizer import Tokenizer
+
+RUNAWAY = """\
+program main;
+var i : integer;
+begin
+    i := 0;
+    while true do i := i + 1
+end.
+"""
+
+DEEP = """\
+program main;
+var result : integer;
+
+function depth(n : integer) : integer;
+begin
+    if n = 0 then depth := 0
+    else depth := depth(n - 1) + 1
+end;
+
+begin
+    result := depth(50)
+end.
+"""
+
+
+def interpret(code: str, engine: str, budget: Budget) -> dict:
+    return Interpreter(Parser(Tokenizer(code)), engine=engine, budget=budget).interpret()
+
+
+class TestBudget(TestCase):
+    def assert_exceeded(self, code: str, budget: Budget, error_code: ErrorCode):
+        for engine in Interpreter.BUDGETED_ENGINES:
+            with self.subTest(engine=engine):
+                with self.assertRaises(RuntimeError) as context:
+                    interpret(code, engine, budget)
+                assert context.exception.error_code is error_code
+
+    def test_engines_count_alike(self):
+        for name, code in PROGRAMS.items():
+            steps = set()
+            for engine in Interpreter.BUDGETED_ENGINES:
+                with self.subTest(program=name, engine=engine):
+                    budget = Budget(max_steps=10 ** 6, max_depth=1000, max_time=60, max_memory=10 ** 7)
+                    assert interpret(code, engine, budget) == run_code(code)
+                    # every frame is left
+                    assert (budget.depth, budget.memory) == (0, 0)
+                    steps.add(budget.steps)
+            assert len(steps) == 1
+        # 20 iterations of the outer loop, 55 + 10 of the inner one and the program's frame
+        budget = Budget(max_steps=86)
+        interpret(PROGRAMS['loops'], 'tree', budget)
+        assert budget.steps == 86
+
+    def test_steps(self):
+        self.assert_exceeded(RUNAWAY, Budget(max_steps=5000), ErrorCode.STEP_BUDGET_EXCEEDED)
+        self.assert_exceeded(PROGRAMS['loops'], Budget(max_steps=85), ErrorCode.STEP_BUDGET_EXCEEDED)
+        budget = Budget(max_steps=5000)
+        with self.assertRaises(RuntimeError):
+            interpret(RUNAWAY, 'closure', budget)
+        assert budget.steps == 5001
+
+    def test_time(self):
+        self.assert_exceeded(RUNAWAY, Budget(max_time=0.05), ErrorCode.TIME_BUDGET_EXCEEDED)
+
+    def test_depth(self):
+        assert interpret(DEEP, 'tree', Budget(max_depth=52)) == {'result': 50}
+        self.assert_exceeded(DEEP, Budget(max_depth=51), ErrorCode.DEPTH_BUDGET_EXCEEDED)
+        # tail calls reuse their frame
+        budget = Budget(max_depth=2)
+        for engine in ('tree', 'closure', 'stack'):
+            assert interpret(PROGRAMS['tail_calls'], engine, budget)['depth'] == 300
+
+    def test_memory(self):
+        # the program's frame and 51 frames of depth, the vm keeps the
+        # routines out of its frames but has a slot for the result
+        tree_memory = frame_size(2) + 51 * frame_size(1)
+        vm_memory = frame_size(1) + 51 * frame_size(2)
+        for engine in Interpreter.BUDGETED_ENGINES:
+            assert interpret(DEEP, engine, Budget(max_memory=max(tree_memory, vm_memory))) == {'result': 50}
+        self.assert_exceeded(DEEP, Budget(max_memory=min(tree_memory, vm_memory) - 1),
+                             ErrorCode.MEMORY_BUDGET_EXCEEDED)
+
+    def test_engines(self):
+        with self.assertRaises(ValueError):
+            Interpreter(Parser(Tokenizer(RUNAWAY)), engine='python', budget=Budget(max_steps=1))
@@ -0,0 +1,152 @@
+from unittest import TestCase
+from bytecode import Compiler, Opcode, disassemble
+from errors import RuntimeError, ErrorCode
+from parser import Parser
+from tokenizer import Tokenizer
+from vm import VirtualMachine
+
+
+def compile_code(code: str):
+    return Compiler().compile(Parser(Tokenizer(code)).parse())
+
+
+def run_code(code: str) -> dict:
+    return VirtualMachine(compile_code(code)).run()
+
+
+class TestBytecode(TestCase):
+    def test_while_jumps(self):
+        module = compile_code("""\
+        program main;
+        var a : integer;
+        begin
+            a := 0;
+            while a < 10 do
+            begin
+                a := a + 1;
+                if a = 3 then continue;
+                if a = 8 then break
+            end
+        end.
+        """)
+        code = module.routines[0]
+        instructions = [
+            (Opcode(code.instructions[2 * i]), code.instructions[2 * i + 1]) for i in range(len(code))
+        ]
+        start = 2
+        assert instructions[start][0] is Opcode.LOAD_LOCAL
+        jumps = [operand for opcode, operand in instructions if opcode is Opcode.JUMP]
+        end = len(code) - 1
+        # continue and the loop's end go back to the test, break leaves the loop
+        assert jumps == [start, end, start]
+        assert instructions[end][0] is Opcode.RETURN
+        assert (Opcode.POP_JUMP_IF_NOT_TRUE, end) in instructions
+
+    def test_nonlocal_variables(self):
+        result = run_code("""\
+        program main;
+        var total : integer;
+
+        procedure outer(a : integer);
+        var b : integer;
+
+            procedure inner(c : integer);
+            begin
+                total := total + a * c + b
+            end;
+
+        begin
+            b := 1;
+            inner(2);
+            inner(3)
+        end;
+
+        begin
+            total := 0;
+            outer(10)
+        end.
+        """)
+        assert result == {'total': 52}
+
+    def test_nonlocal_slots(self):
+        # more slots than a 16 bit field holds
+        names = [f'v{i}' for i in range(70000)]
+        result = run_code(f"""\
+        program main;
+        var {', '.join(names)}, a : integer;
+
+        procedure p;
+        begin
+            a := 5;
+            v69999 := a + 1
+        end;
+
+        begin
+            p()
+        end.
+        """)
+        assert (result['a'], result['v69999'], result['v4464']) == (5, 6, None)
+
+    def test_deep_recursion(self):
+        # calls do not recurse in python, far deeper than the tree walker goes
+        result = run_code("""\
+        program main;
+        var result : integer;
+
+        function count(n : integer) : integer;
+        begin
+            if n = 0 then count := 0
+            else count := count(n - 1) + 1
+        end;
+
+        begin
+            result := count(20000)
+        end.
+        """)
+        assert result == {'result': 20000}
+
+    def test_missing_return(self):
+        with self.assertRaises(RuntimeError) as context:
+            run_code("""\
+            program main;
+            var result : integer;
+
+            function nothing(n : integer) : integer;
+            begin
+                n := n + 1
+            end;
+
+            begin
+                result := nothing(1)
+            end.
+            """)
+        assert context.exception.error_code is ErrorCode.MISSING_RETURN
+
+    def test_disassemble(self):
+        listing = disassemble(compile_code("""\
+        program main;
+        var x : integer;
+
+        function twice(n : integer) : integer;
+        begin
+            twice := n * 2
+        end;
+
+        begin
+            x := twice(21)
+        end.
+        """))
+        assert listing.splitlines() == [
+            'routine 0: program main (level 1, 0 params, locals: x)',
+            '      0 LOAD_CONST             1 (21)',
+            '      1 CALL                   1 (twice)',
+            '      2 STORE_LOCAL            0 (x)',
+            '      3 RETURN',
+            '',
+            'routine 1: function twice (level 2, 1 params, locals: n, twice)',
+            '      0 LOAD_LOCAL             0 (n)',
+            '      1 LOAD_CONST             0 (2)',
+            '      2 MUL',
+            '      3 STORE_LOCAL            1 (twice)',
+            '      4 RETURN_VALUE',
+        ]
@@ -0,0 +1,98 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+from cache import ProgramCache, SUFFIX, LOW_WATER_MARK
+from interpreter import Interpreter
+from parser import Parser
+from test_interpreter import PROGRAMS, run_code
+from tokenizer import Tokenizer
+
+
+def analyze(code: str):
+    return Interpreter(Parser(Tokenizer(code))).analyze()
+
+
+class TestProgramCache(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache = ProgramCache(os.path.join(self.directory, 'cache'), version='test')
+        self.source = os.path.join(self.directory, 'main.pas')
+        with open(self.source, 'w') as file:
+            file.write(PROGRAMS['functions'])
+
+    def cached_files(self) -> list:
+        return sorted(name for name in os.listdir(self.cache.directory) if name.endswith(SUFFIX))
+
+    def test_round_trip(self):
+        key = self.cache.key(self.source, optimize=False)
+        assert self.cache.load(key) is None
+        assert self.cache.store(key, analyze(PROGRAMS['functions']))
+        program = self.cache.load(key)
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                result = Interpreter(None, engine=engine, program=program).interpret()
+                assert result == run_code(PROGRAMS['functions'])
+        # no temporary file is left behind
+        assert os.listdir(self.cache.directory) == [key + SUFFIX]
+
+    def test_keys(self):
+        key = self.cache.key(self.source, optimize=False)
+        assert key == self.cache.key(self.source, optimize=False)
+        assert key != self.cache.key(self.source, optimize=True)
+        assert key != ProgramCache(self.cache.directory, version='other').key(self.source, optimize=False)
+        with open(self.source, 'a') as file:
+            file.write(' ')
+        assert key != self.cache.key(self.source, optimize=False)
+
+    def test_invalid_entries(self):
+        key = self.cache.key(self.source)
+        self.cache.store(key, analyze(PROGRAMS['functions']))
+        path = self.cache.path(key)
+        with open(path, 'rb') as file:
+            data = bytearray(file.read())
+        data[-1] ^= 1
+        with open(path, 'wb') as file:
+            file.write(data)
+        # a corrupted entry is dropped
+        assert self.cache.load(key) is None
+        assert not os.path.exists(path)
+        # as is an entry of another version of the interpreter
+        ProgramCache(self.cache.directory, version='other').store(key, analyze(PROGRAMS['functions']))
+        assert self.cache.load(key) is None
+        assert self.cached_files() == []
+
+    def test_eviction(self):
+        programs = {name: analyze(code) for name, code in PROGRAMS.items()}
+        for index, (name, program) in enumerate(programs.items()):
+            self.cache.store(name, program)
+            # distinct times of use, older for the first stored
+            os.utime(self.cache.path(name), (index, index))
+        self.cache.load('functions')
+        sizes = {name: os.path.getsize(self.cache.path(name)) for name in programs}
+        self.cache.max_size = sizes['functions'] + sizes['tail_calls']
+        self.cache.evict()
+        # the last stored and the last loaded are kept
+        assert self.cached_files() == ['functions' + SUFFIX, 'tail_calls' + SUFFIX]
+        self.cache.clear()
+        assert self.cached_files() == []
+
+    def test_eviction_amortized(self):
+        program = analyze(PROGRAMS['loops'])
+        self.cache.store('size', program)
+        size = os.path.getsize(self.cache.path('size'))
+        self.cache.clear()
+        self.cache.max_size = 20 * size
+        with mock.patch.object(ProgramCache, 'entries', autospec=True, side_effect=ProgramCache.entries) as entries:
+            for index in range(100):
+                self.cache.store(f'{index:03}', program)
+                os.utime(self.cache.path(f'{index:03}'), (index, index))
+        # the directory is listed on the first store and when the estimate passes the size,
+        # then trimmed to the low water mark which leaves room for a few stores
+        assert entries.call_count <= 1 + 100 // ((1 - LOW_WATER_MARK) * 20)
+        files = self.cached_files()
+        assert sum(os.path.getsize(os.path.join(self.cache.directory, name)) for name in files) <= self.cache.max_size
+        # the most recently stored are kept
+        assert files[-1] == '099' + SUFFIX
+        assert files == [f'{index:03}{SUFFIX}' for index in range(100 - len(files), 100)]
@@ -1,14 +1,174 @@
+import io
+import re
+from contextlib import redirect_stdout
 from unittest import TestCase
+from errors import SemanticError, ErrorCode
 from interpreter import Interpreter
 from parser import Parser
 from tokenizer import Tokenizer
+from tracing import Tracer, TraceLevel
 
+PROGRAMS = {
+    'nested_procedures': """\
+        program main;
+        var x, y, total : integer;
+
+        procedure outer(a : integer);
+        var b : integer;
+
+            procedure inner(c : integer);
+            begin
+                total := total + a * c + b
+            end;
+
+        begin
+            b := a // 2;
+            inner(a + 1);
+            inner(a - 1)
+        end;
+
+        begin
+            total := 0;
+            x := 7;
+            outer(x);
+            y := total % 5
+        end.
+        """,
+    'loops': """\
+        program main;
+        var i, j, evens, pairs : integer;
+            ratio : real;
+            found : boolean;
+        begin
+            i := 0; evens := 0; pairs := 0; ratio := 1.0; found := false;
+            while i < 20 do
+            begin
+                i := i + 1;
+                if i % 2 = 1 then continue;
+                evens := evens + 1;
+                j := 0;
+                while true do
+                begin
+                    j := j + 1;
+                    if j > i // 2 then break;
+                    pairs := pairs + 1
+                end;
+                ratio := ratio / 2;
+                found := not found and (i >= 10)
+            end
+        end.
+        """,
+    'functions': """\
+        program main;
+        var result, calls : integer;
+
+        function fibonacci(n : integer) : integer;
+        begin
+            calls := calls + 1;
+            if n = 0 or n = 1 then fibonacci := n
+            else fibonacci := fibonacci(n - 1) + fibonacci(n - 2)
+        end;
+
+        function add(a, b : integer) : integer;
+        begin
+            add := a + b
+        end;
+
+        begin
+            calls := 0;
+            result := add(fibonacci(12), add(-1, +2 * 3))
+        end.
+        """,
+    'scoping': """\
+        program main;
+        var x, seen : integer;
+
+        procedure show;
+        begin
+            seen := x
+        end;
+
+        procedure shadow;
+        var x : integer;
+        begin
+            x := 2;
+            show()
+        end;
+
+        begin
+            x := 1;
+            shadow()
+        end.
+        """,
+    'recursion': """\
+        program main;
+        var total : integer;
+
+        procedure walk(n : integer);
+
+            procedure visit;
+            begin
+                total := total * 10 + n
+            end;
+
+        begin
+            if n > 0 then
+            begin
+                walk(n - 1);
+                visit()
+            end
+        end;
+
+        begin
+            total := 0;
+            walk(4)
+        end.
+        """,
+    'tail_calls': """\
+        program main;
+        var total, result, depth : integer;
+
+        procedure count(n : integer);
+        var step : integer;
+        begin
+            if step = 1 then total := -1000;
+            step := 1;
+            total := total + step;
+            if n > 0 then
+            begin
+                count(n - 1);
+            end
+        end;
+
+        function sum(n, acc : integer) : integer;
+        begin
+            if n = 0 then sum := acc
+            else sum := sum(n - 1, acc + n)
+        end;
+
+        begin
+            total := 0;
+            depth := 300;
+            count(depth);
+            result := sum(depth, 0) + sum(3, sum(2, 0))
+        end.
+        """,
+}
 
-def run_code(code: str):
+
+def run_code(code: str, engine: str = 'tree', tracer: Tracer = None) -> dict:
     tokenizer = Tokenizer(code)
     parser = Parser(tokenizer)
-    interpreter = Interpreter(parser)
-    interpreter.interpret()
+    interpreter = Interpreter(parser, engine=engine, tracer=tracer)
+    return interpreter.interpret()
+
+
+def run_code_traced(code: str, engine: str = 'tree', level: TraceLevel = TraceLevel.FULL):
+    """Run the code and return its global variables and its trace."""
+    output = io.StringIO()
+    result = run_code(code, engine, Tracer(level, output))
+    # object addresses differ from one run to the other
+    return result, re.sub(r' at 0x[0-9a-f]+', '', output.getvalue())
 
 
 class TestInterpreter(TestCase):
@@ -93,3 +253,179 @@ class TestInterpreter(TestCase):
         end.
         """
         run_code(code)
+
+    def test_results(self):
+        assert run_code(PROGRAMS['nested_procedures']) == {'x': 7, 'y': 4, 'total': 104}
+        assert run_code(PROGRAMS['loops']) == {
+            'i': 20, 'j': 11, 'evens': 10, 'pairs': 55, 'ratio': 1 / 2 ** 10, 'found': False,
+        }
+        assert run_code(PROGRAMS['functions']) == {'result': 149, 'calls': 465}
+        # variables are found in the scopes enclosing the declaration, not the caller
+        assert run_code(PROGRAMS['scoping']) == {'x': 1, 'seen': 1}
+        # a nested procedure sees the innermost frame of its enclosing procedure
+        assert run_code(PROGRAMS['recursion']) == {'total': 1234}
+        # the frame reused by a tail call starts with fresh variables
+        assert run_code(PROGRAMS['tail_calls']) == {'total': 301, 'result': 45150 + 9, 'depth': 300}
+
+    def test_deep_tail_calls(self):
+        # far deeper than python's recursion limit
+        code = PROGRAMS['tail_calls'].replace('depth := 300', 'depth := 20000')
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                assert run_code(code, engine) == {'total': 20001, 'result': 200010000 + 9, 'depth': 20000}
+
+    def test_stack_engine_depth(self):
+        # neither the recursion nor the statements and expressions are nested in python calls
+        statements = ';\n'.join(['total := total + 1'] * 20000)
+        terms = ' + '.join(['1'] * 20000)
+        code = f"""\
+        program main;
+        var total, result : integer;
+
+        function depth(n : integer) : integer;
+        begin
+            if n = 0 then depth := 0
+            else depth := depth(n - 1) + 1
+        end;
+
+        begin
+            total := 0;
+            {statements};
+            result := depth(100000) + {terms}
+        end.
+        """
+        assert run_code(code, 'stack') == {'total': 20000, 'result': 120000}
+
+    def test_engines_agree(self):
+        for name, code in PROGRAMS.items():
+            expected_result, expected_log = run_code_traced(code)
+            for engine in Interpreter.ENGINES:
+                with self.subTest(program=name, engine=engine):
+                    result, log = run_code_traced(code, engine)
+                    assert result == expected_result
+                    # the compiled engines have their own frame layout and do not trace it
+                    if engine in ('tree', 'closure', 'stack'):
+                        assert log == expected_log
+
+    def test_engines_evaluate_both_operands(self):
+        code = """\
+        program main;
+        var x : integer;
+            b : boolean;
+        begin
+            x := 0;
+            b := (x > 0) and (10 // x > 1)
+        end.
+        """
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                with self.assertRaises(ZeroDivisionError):
+                    run_code(code, engine)
+        safe = code.replace('10 // x', 'x + 10')
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                assert run_code(safe, engine) == {'x': 0, 'b': False}
+
+    def test_long_expression(self):
+        # python refuses more than 200 nested parentheses
+        code = f"""\
+        program main;
+        var x, y : integer;
+        begin
+            x := 1;
+            y := {' + '.join(['x'] * 300)}
+        end.
+        """
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                assert run_code(code, engine) == {'x': 1, 'y': 300}
+        # every call of the chain runs, though its first operand is false
+        code = f"""\
+        program main;
+        var calls : integer;
+            b : boolean;
+
+        function f : boolean;
+        begin
+            calls := calls + 1;
+            f := calls > 1
+        end;
+
+        begin
+            calls := 0;
+            b := {' and '.join(['f()'] * 300)}
+        end.
+        """
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                assert run_code(code, engine) == {'calls': 300, 'b': False}
+
+    def test_loop_control_outside_loop(self):
+        code = """\
+        program main;
+        var x : integer;
+
+        procedure p;
+        begin
+            {statement}
+        end;
+
+        begin
+            x := 0;
+            while x < 3 do
+            begin
+                x := x + 1;
+                p()
+            end
+        end.
+        """
+        for statement, error_code in (('break', ErrorCode.BREAK_OUTSIDE_LOOP),
+                                      ('continue', ErrorCode.CONTINUE_OUTSIDE_LOOP)):
+            for engine in Interpreter.ENGINES:
+                with self.subTest(statement=statement, engine=engine):
+                    # the loop of the caller is out of reach
+                    with self.assertRaises(SemanticError) as context:
+                        run_code(code.format(statement=statement), engine)
+                    assert context.exception.error_code is error_code
+        with self.assertRaises(SemanticError) as context:
+            run_code('program main; begin break end.')
+        assert context.exception.error_code is ErrorCode.BREAK_OUTSIDE_LOOP
+        # a loop in the routine itself is fine
+        code = code.format(statement='while true do break')
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                assert run_code(code, engine) == {'x': 3}
+
+    def test_trace_levels(self):
+        code = PROGRAMS['nested_procedures']
+        traces = {level: run_code_traced(code, level=level)[1] for level in TraceLevel}
+        assert traces[TraceLevel.OFF] == ''
+        summary = traces[TraceLevel.SUMMARY].splitlines()
+        assert summary[0] == 'ENTER: PROGRAM main'
+        assert summary[-1] == 'LEAVE: PROGRAM main'
+        assert 'ENTER: PROCEDURE outer' not in summary
+        calls = traces[TraceLevel.CALLS].splitlines()
+        assert [line for line in calls if line.startswith(('ENTER', 'LEAVE'))] == [
+            'ENTER: PROGRAM main',
+            'ENTER: PROCEDURE outer',
+            'ENTER: PROCEDURE inner',
+            'LEAVE: PROCEDURE inner',
+            'ENTER: PROCEDURE inner',
+            'LEAVE: PROCEDURE inner',
+            'LEAVE: PROCEDURE outer',
+            'LEAVE: PROGRAM main',
+        ]
+        # only the program's frame is dumped below the full level
+        assert traces[TraceLevel.CALLS].count('CALL STACK') == 1
+        tail_calls = run_code_traced(PROGRAMS['tail_calls'], level=TraceLevel.CALLS)[1].splitlines()
+        # a tail call leaves the current call and enters the next one
+        assert tail_calls.count('ENTER: PROCEDURE count') == tail_calls.count('LEAVE: PROCEDURE count') == 301
+        full = traces[TraceLevel.FULL]
+        assert full.count('CALL STACK') == 4
+        assert 'Lookup: total. (Scope name: inner)' in full
+
+    def test_trace_off_by_default(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            run_code(PROGRAMS['functions'])
+        assert output.getvalue() == ''
@@ -0,0 +1,105 @@
+from unittest import TestCase
+from analysis import CallGraph
+from interpreter import Interpreter
+from memo import LRUCache, memo_key
+from parser import Parser
+from test_interpreter import PROGRAMS, run_code
+from tokenizer import Tokenizer
+
+ROUTINES = """\
+program main;
+var count, result : integer;
+
+procedure local;
+var x : integer;
+begin
+    x := 1
+end;
+
+function fib(n : integer) : integer;
+begin
+    if n < 2 then fib := n
+    else fib := fib(n - 1) + fib(n - 2)
+end;
+
+function counted(n : integer) : integer;
+begin
+    count := count + 1;
+    counted := n
+end;
+
+function calls_local(n : integer) : integer;
+begin
+    local();
+    calls_local := fib(n)
+end;
+
+function calls_counted(n : integer) : integer;
+begin
+    calls_counted := counted(n) + fib(n)
+end;
+
+function outer(n : integer) : integer;
+var m : integer;
+
+    function inner : integer;
+    begin
+        inner := m
+    end;
+
+begin
+    m := n;
+    outer := inner()
+end;
+
+begin
+    count := 0;
+    result := fib(20) + fib(20) + counted(1) + counted(1) + calls_local(10) + calls_counted(5) + outer(3)
+end.
+"""
+
+
+def interpret(code: str, engine: str = 'tree'):
+    interpreter = Interpreter(Parser(Tokenizer(code)), engine=engine, memoize=True)
+    return interpreter.interpret(), interpreter
+
+
+class TestMemoization(TestCase):
+    def test_pure_routines(self):
+        ast = Parser(Tokenizer(ROUTINES)).parse()
+        pure = CallGraph(ast).pure_routines()
+        # counted changes count, inner reads outer's m
+        assert sorted(routine.token.value for routine in pure) == ['calls_local', 'fib', 'local']
+
+    def test_results(self):
+        expected = run_code(ROUTINES)
+        assert expected == {'count': 3, 'result': 6765 * 2 + 1 + 1 + 55 + 5 + 5 + 3}
+        for engine in Interpreter.MEMOIZING_ENGINES:
+            with self.subTest(engine=engine):
+                result, interpreter = interpret(ROUTINES, engine)
+                assert result == expected
+                report = {name: (hits, misses) for name, hits, misses, size in interpreter.memoizer.report}
+                # fib runs once for each of its 21 arguments, the later calls of
+                # fib(20), fib(10) and fib(5) are found
+                assert report == {'fib': (18 + 3, 21), 'calls_local': (0, 1)}
+
+    def test_programs(self):
+        for name, code in PROGRAMS.items():
+            for engine in Interpreter.MEMOIZING_ENGINES:
+                with self.subTest(program=name, engine=engine):
+                    assert interpret(code, engine)[0] == run_code(code)
+
+    def test_engines(self):
+        with self.assertRaises(ValueError):
+            Interpreter(Parser(Tokenizer(ROUTINES)), engine='vm', memoize=True)
+
+    def test_lru_cache(self):
+        cache = LRUCache(maxsize=2)
+        cache.put(memo_key([1]), 'a')
+        cache.put(memo_key([2]), 'b')
+        assert cache.get(memo_key([1])) == 'a'
+        cache.put(memo_key([3]), 'c')
+        # 2 is the least recently used
+        assert cache.get(memo_key([2])) is None
+        assert cache.get(memo_key([1.0])) is None
+        assert (cache.hits, cache.misses, cache.evictions, len(cache)) == (1, 2, 1, 2)
@@ -0,0 +1,385 @@
+from unittest import TestCase
+from astnodes import Num, Boolean, Var, BinOp, UnaryOp, Assign, Condition, WhileLoop, TemporaryDecl, dump_tree
+from errors import SemanticError, ErrorCode
+from interpreter import Interpreter
+from analysis import CallGraph
+from optimizer import ConstantFolder, DeadCodeEliminator, UnusedRoutineEliminator, LoopInvariantCodeMotion, \
+    Optimizer
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from test_interpreter import PROGRAMS, run_code
+from tokenizer import Tokenizer
+
+DECLARATIONS = """\
+program main;
+var i : integer;
+    r : real;
+    b : boolean;
+"""
+
+
+def analyze(code: str):
+    ast = Parser(Tokenizer(code)).parse()
+    SemanticAnalyzer().visit(ast)
+    return ast
+
+
+def fold(expression: str, variable: str = 'i'):
+    """Fold `variable := expression` and return the folder and the folded expression."""
+    ast = analyze(DECLARATIONS + f'begin {variable} := {expression} end.')
+    folder = ConstantFolder()
+    folder.run(ast)
+    return folder, ast.block.compound_statement.childrens[0].right
+
+
+class TestConstantFolder(TestCase):
+    def test_fold(self):
+        folder, node = fold('(2 + 3) * 4 - -1')
+        assert isinstance(node, Num) and node.value == 21
+        assert folder.stats['folded'] == 4
+
+    def test_division(self):
+        _, node = fold('7 / 2', 'r')
+        assert isinstance(node, Num) and node.value == 3.5
+        assert node.token.type.name == 'REAL_CONST'
+        _, node = fold('7 // 2')
+        assert node.value == 3 and type(node.value) is int
+        _, node = fold('7 % 0')
+        # the division by zero fails when the program runs
+        assert isinstance(node, BinOp)
+
+    def test_booleans(self):
+        _, node = fold('not (true and false) or (1 > 2)', 'b')
+        assert isinstance(node, Boolean) and node.value is True
+
+    def test_identities(self):
+        folder, node = fold('i * 1 + 0')
+        assert isinstance(node, Var) and node.name == 'i'
+        assert folder.stats['simplified'] == 2
+        _, node = fold('1 * r', 'r')
+        assert isinstance(node, Var)
+        _, node = fold('not not b', 'b')
+        assert isinstance(node, Var)
+
+    def test_identities_keep_types(self):
+        # -0.0 + 0 is 0.0, TRUE * 1 is 1 and NOT NOT 5 is TRUE
+        _, node = fold('r + 0', 'r')
+        assert isinstance(node, BinOp)
+        _, node = fold('b * 1')
+        assert isinstance(node, BinOp)
+        _, node = fold('not not i', 'b')
+        assert isinstance(node, UnaryOp)
+        _, node = fold('i * 1.0', 'r')
+        assert isinstance(node, BinOp)
+
+    def test_report(self):
+        optimizer = Optimizer()
+        optimizer.optimize(analyze(DECLARATIONS + 'begin i := 1 + 2 end.'))
+        names = [name for name, stats, elapsed in optimizer.report]
+        assert names == ['unused routine elimination', 'constant folding',
+                         'dead code elimination', 'unused routine elimination',
+                         'loop invariant code motion']
+        assert optimizer.report[1][1]['folded'] == 1
+
+    def test_dump_tree(self):
+        ast = Optimizer().optimize(analyze(DECLARATIONS + 'begin i := 1 + 2 * i end.'))
+        assert dump_tree(ast.block.compound_statement).splitlines() == [
+            'Compound()',
+            '  childrens:',
+            "    Assign(op=':=')",
+            "      left: Var(name='i', scope_level=1, slot=0)",
+            "      right: BinOp(op='+')",
+            '        left: Num(value=1)',
+            "        right: BinOp(op='*')",
+            '          left: Num(value=2)',
+            "          right: Var(name='i', scope_level=1, slot=0)",
+        ]
+
+    def test_optimized_programs(self):
+        for name, code in PROGRAMS.items():
+            expected = run_code(code)
+            for engine in Interpreter.ENGINES:
+                with self.subTest(program=name, engine=engine):
+                    interpreter = Interpreter(Parser(Tokenizer(code)), engine=engine, optimize=True)
+                    assert interpreter.interpret() == expected
+
+
+ROUTINES = """\
+program main;
+var a : integer;
+
+procedure unused;
+begin
+    a := 1
+end;
+
+procedure leaf(n : integer);
+begin
+    a := a + n
+end;
+
+procedure dead;
+begin
+    leaf(1)
+end;
+
+procedure outer;
+
+    procedure leaf(n : integer);
+    begin
+        a := a - n
+    end;
+
+begin
+    leaf(2)
+end;
+
+begin
+    a := 0;
+    if 2 < 1 then dead();
+    outer()
+end.
+"""
+
+
+def parse(code: str):
+    return Parser(Tokenizer(code)).parse()
+
+
+def names(block):
+    return [declaration.token.value for declaration in block.declarations if hasattr(declaration, 'params')]
+
+
+class TestDeadCodeEliminator(TestCase):
+    def optimize(self, body: str):
+        ast = parse(DECLARATIONS + body)
+        eliminator = DeadCodeEliminator()
+        ConstantFolder().run(ast)
+        eliminator.run(ast)
+        return eliminator, ast.block.compound_statement.childrens
+
+    def test_branches(self):
+        eliminator, statements = self.optimize("""\
+        begin
+            if 1 < 2 then i := 1 else i := 2;
+            if false then i := 3;
+            if 0 then i := 4 else i := 5
+        end.
+        """)
+        assert [statement.right.value for statement in statements] == [1, 5]
+        assert eliminator.stats['branches'] == 3
+
+    def test_loops(self):
+        eliminator, statements = self.optimize("""\
+        begin
+            while false do i := 1;
+            while 1 do i := 2;
+            while true do break
+        end.
+        """)
+        # only a condition which is exactly TRUE runs the loop
+        assert len(statements) == 1 and isinstance(statements[0], WhileLoop)
+        assert eliminator.stats['loops'] == 2
+
+    def test_after_break(self):
+        eliminator, statements = self.optimize("""\
+        begin
+            while i < 10 do
+            begin
+                i := i + 1;
+                continue;
+                i := 0;
+                b := true
+            end
+        end.
+        """)
+        body = statements[0].body_node.childrens
+        assert len(body) == 2 and isinstance(body[0], Assign)
+        assert eliminator.stats['statements'] == 2
+
+
+class TestUnusedRoutineEliminator(TestCase):
+    def test_call_graph(self):
+        ast = parse(ROUTINES)
+        unused, leaf, dead, outer = ast.block.declarations[1:]
+        # the inner leaf is called from outer, the outer one only from dead
+        assert CallGraph(ast).calls[outer] == {outer.block.declarations[0]}
+        assert CallGraph(ast).reachable() == {leaf, dead, outer, outer.block.declarations[0]}
+        ConstantFolder().run(ast)
+        DeadCodeEliminator().run(ast)
+        assert CallGraph(ast).reachable() == {outer, outer.block.declarations[0]}
+
+    def test_eliminate(self):
+        ast = Optimizer().optimize(parse(ROUTINES))
+        assert names(ast.block) == ['outer']
+        assert names(ast.block.declarations[1].block) == ['leaf']
+
+    def test_pruned_code_is_analyzed(self):
+        # -O accepts the same programs: dead code is checked before it is dropped
+        dead_branch = """\
+        program main;
+        var i : integer;
+        begin
+            i := 0;
+            if false then i := nosuchvar
+        end.
+        """
+        unused_routine = """\
+        program main;
+        var a : integer;
+
+        procedure broken;
+        begin
+            a := undeclared
+        end;
+
+        begin
+            a := 1
+        end.
+        """
+        for code in (dead_branch, unused_routine):
+            for optimize in (False, True):
+                with self.subTest(code=code, optimize=optimize):
+                    interpreter = Interpreter(Parser(Tokenizer(code)), optimize=optimize)
+                    with self.assertRaises(SemanticError) as context:
+                        interpreter.interpret()
+                    assert context.exception.error_code is ErrorCode.ID_NOT_FOUND
+
+
+LOOPS = """\
+program main;
+var i, j, n, a, b, total, licm0 : integer;
+    r : real;
+
+procedure bump;
+begin
+    a := a + 1
+end;
+
+begin
+    n := 6; a := 2; b := 3; total := 0; r := 0.0; licm0 := 5;
+    i := 0;
+    while i < n do
+    begin
+        i := i + 1;
+        r := r + b / 2 + total // b;
+        total := total + n * 2;
+        j := 0;
+        while j < n * 2 do
+        begin
+            j := j + 1;
+            total := total + a * b + i * (n - 1) + licm0;
+            if j > a * b + i then break
+        end;
+        if i = 2 then continue;
+        total := total + a * b
+    end;
+    while n > 0 do
+    begin
+        n := n - 1;
+        bump();
+        total := total + a * b
+    end;
+    while i > 100 do
+        total := total + a * b
+end.
+"""
+
+
+class TestLoopInvariantCodeMotion(TestCase):
+    def optimize(self, code: str):
+        ast = parse(code)
+        motion = LoopInvariantCodeMotion()
+        motion.run(ast)
+        return motion, ast
+
+    def test_moved(self):
+        motion, ast = self.optimize(LOOPS)
+        statements = ast.block.compound_statement.childrens
+        # the first loop is guarded by its condition and computes b / 2 and
+        # n * 2 first, the inner loop a * b and what depends on i
+        guard = statements[7]
+        assert isinstance(guard, Condition) and guard.else_node is None
+        preheader = guard.then_node.child.childrens
+        assert [dump_expression(assign.right) for assign in preheader[:-1]] == ['(b / 2)', '(n * 2)']
+        # nothing is moved from the inner loop on, it may not run, nor after CONTINUE
+        outer_body = preheader[-1].body_node.childrens
+        assert dump_expression(outer_body[-1].right) == '(total + (a * b))'
+        inner = outer_body[4].then_node.child.childrens
+        assert [dump_expression(assign.right) for assign in inner[:-1]] == ['(a * b)', '(i * (n - 1))']
+        # nor after the BREAK's condition
+        assert dump_expression(inner[-1].body_node.childrens[-1].condition_node) == '(j > ((a * b) + i))'
+        # bump() assigns a, the last loop never runs
+        assert isinstance(statements[8], WhileLoop)
+        assert motion.stats['expressions'] == 5 and motion.stats['loops'] == 3
+        # the program's licm0 is not a temporary
+        assert [declaration.var_node.name for declaration in ast.block.declarations
+                if isinstance(declaration, TemporaryDecl)] == ['licm1', 'licm2', 'licm3', 'licm4', 'licm5']
+
+    def test_results(self):
+        expected = run_code(LOOPS)
+        assert 'licm1' not in expected
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                interpreter = Interpreter(Parser(Tokenizer(LOOPS)), engine=engine, optimize=True)
+                assert interpreter.interpret() == expected
+
+    def test_unsafe_expressions(self):
+        code = """\
+        program main;
+        var i, n, d, total : integer;
+
+        function f(x : integer) : integer;
+        begin
+            f := x
+        end;
+
+        begin
+            i := 0; n := 3; d := 1; total := 0;
+            while i < n do
+            begin
+                i := i + 1;
+                total := total + f(n) + n // 2;
+                total := total + n // d
+            end;
+            while f(i) < 10 do i := i + n * n
+        end.
+        """
+        motion, ast = self.optimize(code)
+        # n // d may divide by zero, f may change anything
+        assert motion.stats['expressions'] == 1
+        guard, loop = ast.block.compound_statement.childrens[4:]
+        assert [dump_expression(assign.right) for assign in guard.then_node.child.childrens[:-1]] == ['(n // 2)']
+        assert isinstance(loop, WhileLoop)
+        assert run_code(code) == Interpreter(Parser(Tokenizer(code)), optimize=True).interpret()
+
+    def test_conditional_expressions(self):
+        code = """\
+        program main;
+        var i, x, y : integer;
+            flag : boolean;
+        begin
+            i := 0; flag := false;
+            while i < 3 do
+            begin
+                i := i + 1;
+                if flag then y := x * 2
+            end
+        end.
+        """
+        motion, ast = self.optimize(code)
+        # x is never assigned: x * 2 only runs, and fails, when flag is true
+        assert motion.stats['expressions'] == 0
+        expected = run_code(code)
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                interpreter = Interpreter(Parser(Tokenizer(code)), engine=engine, optimize=True)
+                assert interpreter.interpret() == expected
+
+
+def dump_expression(node) -> str:
+    if isinstance(node, (Num, Boolean)):
+        return str(node.value)
+    if isinstance(node, Var):
+        return node.name
+    return f'({dump_expression(node.left)} {node.op.value} {dump_expression(node.right)})'
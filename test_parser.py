@@ -1,7 +1,10 @@
 from unittest import TestCase
-from astnodes import AST
+from astnodes import AST, ProcedureCall, FunctionCall, Boolean, BinOp, UnaryOp
+from errors import SyntaxError
 from parser import Parser
+from token_stream import TokenStream
 from tokenizer import Tokenizer
+from tokens import TokenType
 
 
 def run_parser(code: str) -> AST:
@@ -114,3 +117,96 @@ class TestParser(TestCase):
         """
         ast = run_parser(code)
         assert ast is not None
+
+    def test_parse_call_with_space(self):
+        code = """\
+        program main;
+        var a: integer;
+        procedure show(x:integer);
+        begin
+        end;
+        function twice(x:integer):integer;
+        begin
+            twice := x * 2
+        end;
+        begin
+            show (1);
+            a := twice (a)
+        end.
+        """
+        ast = run_parser(code)
+        statements = ast.block.compound_statement.childrens
+        assert isinstance(statements[0], ProcedureCall)
+        assert isinstance(statements[1].right, FunctionCall)
+
+    def test_token_stream_peek(self):
+        tokens = TokenStream(Tokenizer('a := 1.0 + 1'))
+        assert len(tokens) == 5
+        assert tokens.peek_type(1) is TokenType.ASSIGN
+        assert tokens.peek(2).value == 1.0 and tokens.peek(4).value == 1
+        assert isinstance(tokens.peek(4).value, int)
+        assert (tokens.peek(4).lineno, tokens.peek(4).column) == (1, 12)
+        assert tokens.peek_type(10) is TokenType.EOF
+
+    def test_nodes_are_compact(self):
+        code = """\
+        program main;
+        var a : boolean;
+        begin
+            a := true and (1 < 2)
+        end.
+        """
+        ast = run_parser(code)
+        assign = ast.block.compound_statement.childrens[0]
+        assert isinstance(assign.right, BinOp) and assign.right.token is assign.right.op
+        assert isinstance(assign.right.left, Boolean) and assign.right.left.value is True
+        for node in (ast, assign, assign.left, assign.right, assign.op):
+            assert not hasattr(node, '__dict__')
+
+    def test_parse_left_associative(self):
+        code = """\
+        program main;
+        var a, b, c : integer;
+        begin
+            a := a - b - c
+        end.
+        """
+        ast = run_parser(code)
+        right = ast.block.compound_statement.childrens[0].right
+        assert right.right.name == 'c'
+        assert (right.left.left.name, right.left.right.name) == ('a', 'b')
+
+    def test_parse_precedence(self):
+        code = """\
+        program main;
+        var a, b, c : integer;
+            d : boolean;
+        begin
+            d := not a < -b * (c + 1) or a = b and c <> 2
+        end.
+        """
+        ast = run_parser(code)
+        right = ast.block.compound_statement.childrens[0].right
+
+        def dump(node):
+            if isinstance(node, BinOp):
+                return f'({dump(node.left)} {node.op.value} {dump(node.right)})'
+            if isinstance(node, UnaryOp):
+                return f'({node.op.value} {dump(node.factor)})'
+            return str(node.token.value)
+
+        assert dump(right) == '(((NOT a) < ((- b) * (c + 1))) OR ((a = b) AND (c <> 2)))'
+
+    def test_parse_deep_parentheses(self):
+        depth = 5000
+        code = f"""\
+        program main;
+        var a : integer;
+        begin
+            a := {'(' * depth}a + 1{')' * depth} * 2
+        end.
+        """
+        right = run_parser(code).block.compound_statement.childrens[0].right
+        assert right.op.type is TokenType.MUL and right.left.op.type is TokenType.PLUS
+        with self.assertRaises(SyntaxError):
+            run_parser(code.replace(') * 2', ' * 2'))
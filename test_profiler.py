@@ -0,0 +1,91 @@
+import itertools
+import re
+from types import SimpleNamespace
+from unittest import TestCase, mock
+from budget import Budget
+from errors import RuntimeError
+from parser import Parser
+from profiler import ProfilingInterpreter
+from test_budget import RUNAWAY
+from test_interpreter import PROGRAMS, run_code
+from tokenizer import Tokenizer
+
+CALLS = """\
+program main;
+var x : integer;
+procedure p;
+begin
+    x := x + 1
+end;
+begin
+    x := 0;
+    p();
+    p()
+end.
+"""
+
+
+def profile_code(code: str, **options) -> ProfilingInterpreter:
+    interpreter = ProfilingInterpreter(Parser(Tokenizer(code)), **options)
+    interpreter.interpret()
+    return interpreter
+
+
+class TestProfiler(TestCase):
+    def test_results(self):
+        for name, code in PROGRAMS.items():
+            with self.subTest(program=name):
+                interpreter = ProfilingInterpreter(Parser(Tokenizer(code)))
+                assert interpreter.interpret() == run_code(code)
+                assert interpreter.call_stack == interpreter.line_stack == []
+
+    def test_timings(self):
+        # the clock moves one second every time it is read
+        clock = SimpleNamespace(perf_counter=itertools.count().__next__)
+        with mock.patch('profiler.time', clock):
+            profile = profile_code(CALLS).profile
+        routines = {timing.name: timing for timing in profile.routines}
+        assert (routines['main'].calls, routines['main'].inclusive, routines['main'].exclusive) == (1, 15, 9)
+        assert (routines['p'].lineno, routines['p'].calls, routines['p'].inclusive, routines['p'].exclusive) == \
+            (3, 2, 6, 6)
+        lines = {lineno: (timing.calls, timing.inclusive, timing.exclusive)
+                 for lineno, timing in profile.lines.items()}
+        assert lines == {5: (2, 2, 2), 8: (1, 1, 1), 9: (1, 5, 4), 10: (1, 5, 4)}
+        assert profile.collapsed() == 'main 9000000\nmain;p 6000000\n'
+
+    def test_recursion(self):
+        profile = profile_code(PROGRAMS['functions']).profile
+        routines = {timing.name: timing for timing in profile.routines}
+        assert routines['fibonacci'].calls == 465
+        assert profile.lines[6].calls == 465
+        # the nested calls are not counted again
+        assert routines['fibonacci'].inclusive <= routines['main'].inclusive
+        assert sum(timing.exclusive for timing in profile.routines) <= routines['main'].inclusive + 1e-9
+        for line in profile.collapsed().splitlines():
+            assert re.fullmatch(r'main(;(fibonacci|add))* \d+', line)
+        assert 'main;fibonacci;fibonacci ' in profile.collapsed()
+
+    def test_tail_calls(self):
+        routines = {timing.name: timing for timing in profile_code(PROGRAMS['tail_calls']).profile.routines}
+        # every tail call counts, though it runs in the frame of its caller
+        assert (routines['count'].calls, routines['sum'].calls) == (301, 308)
+
+    def test_report(self):
+        code = PROGRAMS['functions']
+        profile = profile_code(code).profile
+        report = profile.report(sort='calls', source=code)
+        routines, lines = report.split('\n\n')
+        assert [line.split()[0] for line in routines.splitlines()[1:]] == ['fibonacci', 'add', 'main']
+        assert 'calls := calls + 1' in lines.splitlines()[2]
+        assert len(profile.report(limit=1).splitlines()) == 5
+        with self.assertRaises(ValueError):
+            profile.report(sort='name')
+
+    def test_failed_run(self):
+        interpreter = ProfilingInterpreter(Parser(Tokenizer(RUNAWAY)), budget=Budget(max_steps=100))
+        with self.assertRaises(RuntimeError):
+            interpreter.interpret()
+        # the run is profiled up to the error
+        assert interpreter.call_stack == interpreter.line_stack == []
+        # the loop and the 99 iterations it ran on its line
+        assert (interpreter.profile.lines[4].calls, interpreter.profile.lines[5].calls) == (1, 100)
@@ -0,0 +1,91 @@
+import asyncio
+import io
+import re
+from unittest import TestCase
+from budget import Budget
+from errors import RuntimeError, ErrorCode
+from interpreter import Interpreter
+from parser import Parser
+from scheduler import Scheduler, run_programs
+from test_budget import RUNAWAY
+from test_interpreter import PROGRAMS, run_code_traced
+from tokenizer import Tokenizer
+from tracing import Tracer, TraceLevel
+
+
+def counting_program(count: int) -> str:
+    return f"""\
+program main;
+var i : integer;
+begin
+    i := 0;
+    while i < {count} do i := i + 1
+end.
+"""
+
+
+def make_interpreter(code: str, **options) -> Interpreter:
+    return Interpreter(Parser(Tokenizer(code)), engine='stack', **options)
+
+
+class TestScheduler(TestCase):
+    def test_run_async_like_interpret(self):
+        for name, code in PROGRAMS.items():
+            for slice_steps in (1, 3, 1000):
+                with self.subTest(program=name, slice_steps=slice_steps):
+                    output = io.StringIO()
+                    interpreter = make_interpreter(code, tracer=Tracer(TraceLevel.FULL, output))
+                    result = asyncio.run(interpreter.run_async(slice_steps))
+                    trace = re.sub(r' at 0x[0-9a-f]+', '', output.getvalue())
+                    assert (result, trace) == run_code_traced(code, 'stack')
+
+    def test_other_engines(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(make_interpreter(PROGRAMS['loops']).run_async(0))
+        for engine in set(Interpreter.ENGINES) - set(Interpreter.ASYNC_ENGINES):
+            with self.subTest(engine=engine):
+                interpreter = Interpreter(Parser(Tokenizer(PROGRAMS['loops'])), engine=engine)
+                with self.assertRaises(ValueError):
+                    asyncio.run(interpreter.run_async())
+
+    def test_slices_interleave(self):
+        ticks = []
+
+        async def main():
+            async def ticker():
+                while True:
+                    ticks.append(None)
+                    await asyncio.sleep(0)
+            task = asyncio.create_task(ticker())
+            result = await make_interpreter(counting_program(1000)).run_async(10)
+            task.cancel()
+            return result
+
+        assert asyncio.run(main()) == {'i': 1000}
+        # the loop ran 100 slices, the ticker between each of them
+        assert len(ticks) >= 100
+
+    def test_short_program_first(self):
+        done = []
+
+        async def run(scheduler: Scheduler, name: str, count: int):
+            await scheduler.run(make_interpreter(counting_program(count)))
+            done.append(name)
+
+        async def main():
+            scheduler = Scheduler(slice_steps=10)
+            await asyncio.gather(run(scheduler, 'long', 10000), run(scheduler, 'short', 100))
+
+        asyncio.run(main())
+        assert done == ['short', 'long']
+
+    def test_run_programs(self):
+        interpreters = [make_interpreter(counting_program(count)) for count in (300, 20, 0)]
+        interpreters.append(make_interpreter(RUNAWAY, budget=Budget(max_steps=1000)))
+        for concurrency in (None, 1, 2):
+            with self.subTest(concurrency=concurrency):
+                results = run_programs(interpreters, slice_steps=7, concurrency=concurrency)
+                assert results[:3] == [{'i': 300}, {'i': 20}, {'i': 0}]
+                # a program out of its budget fails alone
+                assert isinstance(results[3], RuntimeError)
+                assert results[3].error_code is ErrorCode.STEP_BUDGET_EXCEEDED
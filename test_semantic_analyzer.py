@@ -0,0 +1,136 @@
+from unittest import TestCase
+from analysis import calls, mark_tail_calls
+from errors import SemanticError, ErrorCode
+from parser import Parser
+from semantic_analyzer import SemanticAnalyzer
+from tokenizer import Tokenizer
+
+
+def analyze(code: str):
+    ast = Parser(Tokenizer(code)).parse()
+    SemanticAnalyzer().visit(ast)
+    return ast
+
+
+class TestSemanticAnalyzer(TestCase):
+    def test_slots(self):
+        ast = analyze("""\
+        program main;
+        var a, b : integer;
+
+        function twice(n : integer) : integer;
+        var m : integer;
+        begin
+            m := n + a;
+            twice := m * 2
+        end;
+
+        begin
+            b := twice(a)
+        end.
+        """)
+        block = ast.block
+        assert block.slot_names == ['a', 'b', 'twice']
+        assert block.slot_indexes == {'a': 0, 'b': 1, 'twice': 2}
+        func = block.declarations[2]
+        assert func.slot == 2
+        assert func.block.slot_names == ['n', 'm']
+        assert func.block.slot_indexes == {'n': 0, 'm': 1}
+
+        m_assign, twice_assign = func.block.compound_statement.childrens
+        m, n, a = m_assign.left, m_assign.right.left, m_assign.right.right
+        assert (m.scope_level, m.slot) == (2, 1)
+        assert (n.scope_level, n.slot) == (2, 0)
+        assert (a.scope_level, a.slot) == (1, 0)
+        # the function's name is found in the scope declaring it
+        assert (twice_assign.left.scope_level, twice_assign.left.slot) == (1, 2)
+
+        b_assign = block.compound_statement.childrens[0]
+        call = b_assign.right
+        assert (call.scope_level, call.slot) == (1, 2)
+        assert (call.actual_params[0].scope_level, call.actual_params[0].slot) == (1, 0)
+
+    def test_undeclared_in_function(self):
+        with self.assertRaises(SemanticError) as context:
+            analyze("""\
+            program main;
+            var a : integer;
+
+            function f(n : integer) : integer;
+            begin
+                f := n + b
+            end;
+
+            begin
+                a := f(1)
+            end.
+            """)
+        assert context.exception.error_code is ErrorCode.ID_NOT_FOUND
+
+    def test_function_arguments_number(self):
+        with self.assertRaises(SemanticError) as context:
+            analyze("""\
+            program main;
+            var a : integer;
+
+            function f(n : integer) : integer;
+            begin
+                f := n
+            end;
+
+            begin
+                a := f(1, 2)
+            end.
+            """)
+        assert context.exception.error_code is ErrorCode.UNEXPECTED_PROC_ARGUMENTS_NUMBER
+
+    def test_tail_calls(self):
+        ast = analyze("""\
+        program main;
+        var a : integer;
+
+        procedure walk(n : integer);
+
+            procedure walk(n : integer);
+            begin
+                a := n
+            end;
+
+        begin
+            if n > 0 then walk(n - 1)
+        end;
+
+        procedure loop(n : integer);
+        begin
+            if n > 0 then
+            begin
+                loop(n - 1);
+                a := n
+            end
+            else loop(0);
+        end;
+
+        function fib(n : integer) : integer;
+        begin
+            if n < 2 then fib := fib(n + 2) - n
+            else fib := fib(n - 1) + fib(n - 2)
+        end;
+
+        function sum(n, acc : integer) : integer;
+        begin
+            a := sum(0, 0);
+            if n = 0 then sum := acc
+            else sum := sum(n - 1, acc + n)
+        end;
+
+        begin
+            walk(1)
+        end.
+        """)
+        mark_tail_calls(ast)
+        walk, loop, fib, sum = ast.block.declarations[1:]
+        # walk calls the inner walk
+        assert [call.tail for call in calls(walk.block)] == [False]
+        assert sorted(call.tail for call in calls(loop.block)) == [False, True]
+        assert not any(call.tail for call in calls(fib.block))
+        assert sorted(call.tail for call in calls(sum.block)) == [False, True]
@@ -0,0 +1,87 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import urllib.request
+from unittest import TestCase
+from service import CompileService, make_server
+from test_interpreter import PROGRAMS, run_code, run_code_traced
+
+
+class TestCompileService(TestCase):
+    def test_cached_programs(self):
+        service = CompileService(maxsize=2)
+        code = PROGRAMS['functions']
+        first = service.run(code)
+        assert first['result'] == run_code(code) and not first['cached']
+        assert set(first['timings']) == {'lookup', 'tokenize', 'parse', 'analyze', 'execute'}
+        second = service.run(code, engine='vm')
+        assert second['result'] == first['result'] and second['cached']
+        assert set(second['timings']) == {'lookup', 'execute'}
+        assert second['cache'] == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'size': 1, 'evictions': 0}
+        # the optimized program is another entry
+        assert not service.run(code, optimize=True)['cached']
+        service.run(PROGRAMS['loops'])
+        assert service.stats()['evictions'] == 1
+        assert not service.run(code)['cached']
+
+    def test_errors(self):
+        service = CompileService()
+        response = service.run('program main; begin a := 1 end.')
+        assert response['error']['type'] == 'SemanticError' and 'result' not in response
+        # a program which doesn't check isn't kept
+        assert service.stats()['size'] == 0
+        assert service.run(PROGRAMS['functions'], engine='vm', memoize=True)['error']['type'] == 'ValueError'
+        assert service.stats()['size'] == 0
+
+    def test_trace(self):
+        service = CompileService()
+        for _ in range(2):
+            trace = service.run(PROGRAMS['nested_procedures'], trace='calls')['trace']
+            assert trace.splitlines()[1] == 'ENTER: PROCEDURE outer'
+
+    def test_full_trace(self):
+        service = CompileService()
+        code = PROGRAMS['nested_procedures']
+        # the analysis is traced like on the command line
+        trace = service.run(code, trace='full')['trace']
+        assert re.sub(r' at 0x[0-9a-f]+', '', trace) == run_code_traced(code)[1]
+        assert 'Lookup: INTEGER. (Scope name: buildin)' in service.run(PROGRAMS['loops'], trace='full')['trace']
+        # as are the optimizer's statistics
+        assert service.run(code, optimize=True, trace='summary')['trace'].startswith('OPTIMIZE: ')
+        # a program found in the service's cache is not analyzed again, only its run is traced
+        trace = service.run(code, trace='full')['trace']
+        assert 'Lookup: ' not in trace and 'ENTER: PROCEDURE inner' in trace
+
+    def test_http(self):
+        server = make_server('127.0.0.1:0', CompileService())
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_port}'
+        body = json.dumps({'source': PROGRAMS['functions'], 'engine': 'closure'}).encode()
+        with urllib.request.urlopen(urllib.request.Request(url + '/run', data=body)) as response:
+            assert json.load(response)['result'] == run_code(PROGRAMS['functions'])
+        with urllib.request.urlopen(url + '/stats') as response:
+            assert json.load(response)['misses'] == 1
+
+    def test_unix_socket_path(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'spi.py')
+        with open(path, 'w') as file:
+            file.write('source')
+        # a file which isn't a socket is left alone
+        with self.assertRaises(OSError):
+            make_server(path, CompileService())
+        with open(path) as file:
+            assert file.read() == 'source'
+        # the socket left by a previous server is replaced
+        path = os.path.join(directory.name, 'spi.sock')
+        make_server(path, CompileService()).server_close()
+        server = make_server(path, CompileService())
+        server.server_close()
+        assert server.server_address == path
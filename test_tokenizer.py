@@ -0,0 +1,80 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+from errors import LexerError
+from source import Source, open_source
+from tokenizer import Tokenizer, RegexTokenizer
+from tokens import TokenType
+
+
+def run_tokenizer(tokenizer_class, code: str) -> list:
+    tokenizer = tokenizer_class(code)
+    tokens = [tokenizer.get_next_token()]
+    while tokens[-1].type is not TokenType.EOF:
+        tokens.append(tokenizer.get_next_token())
+    return [(token.type, token.value, token.lineno, token.column) for token in tokens]
+
+
+class TestTokenizer(TestCase):
+    def test_tokenizers_agree(self):
+        code = """\
+        program main; {program
+        header}
+        var a_b, _c : integer;
+            d : real;
+        begin
+            a_b := 12 // 5 % 3;
+            d := 12.5 / 2.;
+            if (a_b <= 2) and not (_c >= 3) or (a_b <> _c) then _c := -1
+        end.
+        """
+        tokens = run_tokenizer(Tokenizer, code)
+        assert tokens == run_tokenizer(RegexTokenizer, code)
+        assert (TokenType.REAL_CONST, 12.5, 7, 18) in tokens
+        assert (TokenType.ID, 'a_b', 3, 13) in tokens
+        assert (TokenType.ASSIGN, ':=', 6, 17) in tokens
+
+    def test_keywords_are_case_insensitive(self):
+        for tokenizer_class in (Tokenizer, RegexTokenizer):
+            tokens = run_tokenizer(tokenizer_class, 'Begin END true')
+            assert [token[:2] for token in tokens] == [
+                (TokenType.BEGIN, 'BEGIN'),
+                (TokenType.END, 'END'),
+                (TokenType.TRUE, 'TRUE'),
+                (TokenType.EOF, None),
+            ]
+
+    def test_lexer_errors(self):
+        for tokenizer_class in (Tokenizer, RegexTokenizer):
+            with self.assertRaises(LexerError):
+                run_tokenizer(tokenizer_class, 'a := 1;\n b := $')
+            with self.assertRaises(LexerError):
+                run_tokenizer(tokenizer_class, 'a := 1 { unclosed')
+
+    def test_chunked_source(self):
+        code = """\
+        program main; {déjà vu
+        across chunks}
+        var a : real;
+        begin
+            a := 12.5 // 3 {again} <> 7
+        end.
+        """
+        expected = run_tokenizer(Tokenizer, code)
+        for tokenizer_class in (Tokenizer, RegexTokenizer):
+            for chunk_size in (1, 2, 5, 64):
+                source = Source(io.BytesIO(code.encode()), chunk_size=chunk_size)
+                assert run_tokenizer(tokenizer_class, source) == expected
+
+    def test_memory_mapped_source(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.pas', delete=False) as file:
+            file.write('program main; begin end.')
+        try:
+            for tokenizer_class in (Tokenizer, RegexTokenizer):
+                with open_source(file.name, chunk_size=4) as source:
+                    tokens = [token.type for token in tokenizer_class(source)]
+                assert tokens == [TokenType.PROGRAM, TokenType.ID, TokenType.SEMI,
+                                  TokenType.BEGIN, TokenType.END, TokenType.DOT]
+        finally:
+            os.remove(file.name)
@@ -0,0 +1,126 @@
+from unittest import TestCase
+from errors import RuntimeError, ErrorCode
+from parser import Parser
+from tokenizer import Tokenizer
+from transpiler import Transpiler
+
+
+def parse(code: str):
+    return Parser(Tokenizer(code)).parse()
+
+
+def run_code(code: str) -> dict:
+    return Transpiler().compile(parse(code))()
+
+
+class TestTranspiler(TestCase):
+    def test_transpile(self):
+        source = Transpiler().transpile(parse("""\
+        program main;
+        var total : integer;
+
+        procedure add(n : integer);
+        begin
+            total := total + n
+        end;
+
+        begin
+            total := 0;
+            while total < 10 do add(3)
+        end.
+        """))
+        assert source.splitlines() == [
+            'def program():',
+            '    v_total = None',
+            '    def f_add(v_n):',
+            '        nonlocal v_total',
+            '        v_total = v_total + v_n',
+            '    v_total = 0',
+            '    while v_total < 10:',
+            '        f_add(3)',
+            "    return {'total': v_total}",
+        ]
+
+    def test_parentheses(self):
+        result = run_code("""\
+        program main;
+        var a, b, c, d : integer;
+            e, f : boolean;
+        begin
+            a := 10 - (4 - 3) - 2;
+            b := -(a + 1) * (2 + 3) // (7 % 4);
+            c := a - b * 2 + (a - b) * 2;
+            e := (a < b) = (b < c);
+            f := not (a > 1) or (c >= b);
+            d := """ + ' + '.join(['a'] * 300) + """
+        end.
+        """)
+        assert result == {'a': 7, 'b': -14, 'c': 77, 'd': 2100, 'e': False, 'f': True}
+        # a long chain of operators nests no parentheses, python refuses more than 200
+        source = Transpiler().transpile(parse('program main; var d : integer; begin d := '
+                                              + ' - '.join(['1'] * 300) + ' end.'))
+        assert '    v_d = ' + ' - '.join(['1'] * 300) in source.splitlines()
+
+    def test_function_result(self):
+        result = run_code("""\
+        program main;
+        var result : integer;
+
+        function triangle(n : integer) : integer;
+        var i : integer;
+
+            procedure accumulate;
+            begin
+                triangle := triangle + i
+            end;
+
+        begin
+            triangle := 0;
+            i := 0;
+            while i < n do
+            begin
+                i := i + 1;
+                accumulate()
+            end
+        end;
+
+        begin
+            result := triangle(10)
+        end.
+        """)
+        assert result == {'result': 55}
+
+    def test_while_is_true(self):
+        # a WHILE goes on only while its condition is exactly True
+        result = run_code("""\
+        program main;
+        var n, steps : integer;
+        begin
+            n := 3;
+            steps := 0;
+            while n do
+            begin
+                steps := steps + 1;
+                n := n - 1
+            end
+        end.
+        """)
+        assert result == {'n': 3, 'steps': 0}
+
+    def test_missing_return(self):
+        with self.assertRaises(RuntimeError) as context:
+            run_code("""\
+            program main;
+            var result : integer;
+
+            function nothing(n : integer) : integer;
+            begin
+                n := n + 1
+            end;
+
+            begin
+                result := nothing(1)
+            end.
+            """)
+        assert context.exception.error_code is ErrorCode.MISSING_RETURN
+        assert context.exception.token.value == 'nothing'
@@ -0,0 +1,37 @@
+from unittest import TestCase
+from astnodes import Num, Boolean, Break
+from tokenizer import Token
+from tokens import TokenType
+from visitor import Visitor
+
+
+class NodeNameVisitor(Visitor):
+    def visit_num(self, node: Num):
+        return 'num'
+
+    def visit_boolean(self, node: Boolean):
+        return 'boolean'
+
+    def visit_break(self, node: Break):
+        return 'break'
+
+
+class TestVisitor(TestCase):
+    def test_dispatch(self):
+        visitor = NodeNameVisitor()
+        assert visitor.visit(Num(Token(TokenType.INTEGER_CONST, 1))) == 'num'
+        assert visitor.visit(Boolean(Token(TokenType.TRUE, 'TRUE'))) == 'boolean'
+        assert visitor.visit(Break(None)) == 'break'
+
+    def test_dispatch_node_subclass(self):
+        class Hex(Num):
+            __slots__ = ()
+
+        visitor = NodeNameVisitor()
+        assert visitor.visit(Hex(Token(TokenType.INTEGER_CONST, 16))) == 'num'
+        # the base visitor has its own table and default methods
+        assert Visitor().visit(Hex(Token(TokenType.INTEGER_CONST, 16))) is None
+
+    def test_invalid_node(self):
+        with self.assertRaises(Exception):
+            NodeNameVisitor().visit(object())
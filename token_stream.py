@@ -0,0 +1,97 @@
+from array import array
+
+from tokenizer import Token
+from tokens import TokenType
+
+# token types are stored as their index in the TokenType enumeration
+TOKEN_TYPES = tuple(TokenType)
+TOKEN_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+
+# line and column numbers are packed in a single unsigned 64 bits integer
+COLUMN_BITS = 32
+COLUMN_MASK = (1 << COLUMN_BITS) - 1
+
+
+class TokenStream(object):
+    """
+    TokenStream lexes the whole input up front and stores the tokens in
+    compact parallel arrays: type codes, indices into a table of distinct
+    values and packed line/column numbers. Token objects are only built
+    when they are asked for, and any token ahead can be peeked cheaply
+    """
+
+    def __init__(self, tokenizer):
+        types = self.types = array('B')
+        values = self.values = array('I')
+        positions = self.positions = array('Q')
+        value_table = self.value_table = []
+        # one index of the distinct values per token type, so that
+        # the values 1, 1.0 and True are never mixed up
+        value_indices = [{} for _ in TOKEN_TYPES]
+        codes = TOKEN_CODES
+        if hasattr(tokenizer, 'records'):
+            records = tokenizer.records()
+        else:
+            records = ((token.type, token.value, token.lineno, token.column)
+                       for token in tokenizer)
+        for token_type, value, lineno, column in records:
+            code = codes[token_type]
+            value_index = value_indices[code]
+            index = value_index.get(value)
+            if index is None:
+                index = value_index[value] = len(value_table)
+                value_table.append(value)
+            types.append(code)
+            values.append(index)
+            positions.append(lineno << COLUMN_BITS | column)
+        # the stream always ends with EOF, the index of the last token
+        self.end = len(types)
+        types.append(codes[TokenType.EOF])
+        values.append(len(value_table))
+        positions.append(0)
+        value_table.append(None)
+        self.pos = 0
+
+    def __len__(self):
+        return self.end
+
+    def advance(self) -> TokenType:
+        """Move to the next token and return its type, EOF sticks once reached."""
+        pos = self.pos
+        if pos < self.end:
+            self.pos = pos = pos + 1
+        return TOKEN_TYPES[self.types[pos]]
+
+    def peek_type(self, k: int = 0) -> TokenType:
+        """Return the type of the k-th token after the current one."""
+        index = self.pos + k
+        if index > self.end:
+            index = self.end
+        return TOKEN_TYPES[self.types[index]]
+
+    def peek(self, k: int = 0) -> Token:
+        """Build the k-th token after the current one."""
+        index = self.pos + k
+        if index >= self.end:
+            return Token(TokenType.EOF, None)
+        position = self.positions[index]
+        return Token(
+            TOKEN_TYPES[self.types[index]],
+            self.value_table[self.values[index]],
+            position >> COLUMN_BITS,
+            position & COLUMN_MASK,
+        )
+
+    def take(self) -> Token:
+        """Build the current token and move to the next one."""
+        index = self.pos
+        if index >= self.end:
+            return Token(TokenType.EOF, None)
+        self.pos = index + 1
+        position = self.positions[index]
+        return Token(
+            TOKEN_TYPES[self.types[index]],
+            self.value_table[self.values[index]],
+            position >> COLUMN_BITS,
+            position & COLUMN_MASK,
+        )
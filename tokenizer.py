@@ -1,8 +1,13 @@
+import re
+
 from errors import LexerError
+from source import Source, TextSource
 from tokens import TokenType, RESERVED_KEYWORDS
 
 
 class Token(object):
+    __slots__ = ('type', 'value', 'lineno', 'column')
+
     def __init__(self, type: TokenType, value, lineno=None, column=None):
         self.type = type
         self.value = value
@@ -26,6 +31,11 @@ class Token(object):
     def __repr__(self):
         return self.__str__()
 
+    def __reduce__(self):
+        # pickled as its constructor's arguments, smaller and faster to load
+        # than the state of its slots
+        return Token, (self.type, self.value, self.lineno, self.column)
+
 
 class Tokenizer(object):
     """
@@ -33,12 +43,15 @@ class Tokenizer(object):
     it also names Lexer
     """
 
-    def __init__(self, text: str):
+    def __init__(self, text):
         # client string input, e.g. "3 + 5", "12 - 5 + 3", etc
-        self.text = text
+        # or a Source which is consumed chunk by chunk
+        self.source = TextSource(text) if isinstance(text, str) else text
+        # self.text only holds the chunks which are not consumed yet
+        self.text = self.source.read()
         # self.pos is an index into self.text
         self.pos = 0
-        self.current_char = self.text[self.pos]
+        self.current_char = self.text[self.pos] if self.text else None
         # token line number and column number
         self.lineno = 1
         self.column = 1
@@ -52,19 +65,27 @@ class Tokenizer(object):
         raise LexerError(message=s)
 
     def skip_comment(self):
-        while self.current_char is not '}':
-            if self.pos == len(self.text) - 1:
-                raise Exception('Unclosed comment')
+        while self.current_char != '}':
+            if self.current_char is None:
+                raise LexerError(message='Unclosed comment')
             self.advance()
         self.advance()
 
+    def fill(self) -> bool:
+        """Drop the consumed text and append the next chunk of the source."""
+        chunk = self.source.read()
+        if not chunk:
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
     def peek(self) -> str:
         """peek return the next character but don't change the pos."""
-        peek_pos = self.pos + 1
-        if peek_pos is len(self.text):
+        if self.pos + 1 >= len(self.text) and not self.fill():
             return None
         else:
-            return self.text[peek_pos]
+            return self.text[self.pos + 1]
 
     def identify(self) -> Token:
         """Handle identifiers and reserved keywords"""
@@ -73,7 +94,7 @@ class Tokenizer(object):
         token = Token(type=None, value=None, lineno=self.lineno, column=self.column)
 
         value = ''
-        while self.current_char is not None and self.current_char.isalnum():
+        while self.current_char is not None and (self.current_char.isalnum() or self.current_char == '_'):
             value += self.current_char
             self.advance()
 
@@ -90,11 +111,11 @@ class Tokenizer(object):
 
     def advance(self):
         """Advance the `pos` pointer and set the `current_char` variable."""
-        if self.current_char is '\n':
+        if self.current_char == '\n':
             self.lineno += 1
             self.column = 0
         self.pos += 1
-        if self.pos > len(self.text) - 1:
+        if self.pos > len(self.text) - 1 and not self.fill():
             self.current_char = None  # Indicates end of input
         else:
             self.current_char = self.text[self.pos]
@@ -106,12 +127,14 @@ class Tokenizer(object):
 
     def number(self):
         """Return a (multidigit) integer or float consumed from the input."""
+        lineno, column = self.lineno, self.column
         result = ''
         while self.current_char is not None and self.current_char.isdigit():
             result += self.current_char
             self.advance()
 
-        if self.current_char is '.':
+        if self.current_char == '.':
+            result += self.current_char
             self.advance()
             while self.current_char is not None and self.current_char.isdigit():
                 result += self.current_char
@@ -119,15 +142,15 @@ class Tokenizer(object):
             return Token(
                 type=TokenType.REAL_CONST,
                 value=float(result),
-                lineno=self.lineno,
-                column=self.column
+                lineno=lineno,
+                column=column
             )
         else:
             return Token(
                 type=TokenType.INTEGER_CONST,
                 value=int(result),
-                lineno=self.lineno,
-                column=self.column
+                lineno=lineno,
+                column=column
             )
 
     def get_next_token(self) -> Token:
@@ -137,7 +160,7 @@ class Tokenizer(object):
         apart into tokens. One token at a time.
         """
         while self.current_char is not None:
-            if self.current_char is '{':
+            if self.current_char == '{':
                 self.advance()
                 self.skip_comment()
                 continue
@@ -149,58 +172,63 @@ class Tokenizer(object):
             if self.current_char.isdigit():
                 return self.number()
 
-            if self.current_char is '/' and self.peek() is '/':
-                self.advance()
-                self.advance()
-                return Token(
+            if self.current_char == '/' and self.peek() == '/':
+                token = Token(
                     type=TokenType.INTEGER_DIV,
                     value='//',
                     lineno=self.lineno,
                     column=self.column
                 )
+                self.advance()
+                self.advance()
+                return token
 
-            if self.current_char.isalpha() or self.current_char is '_':
+            if self.current_char.isalpha() or self.current_char == '_':
                 return self.identify()
 
-            if self.current_char is ':' and self.peek() is '=':
-                self.advance()
-                self.advance()
-                return Token(
+            if self.current_char == ':' and self.peek() == '=':
+                token = Token(
                     type=TokenType.ASSIGN,
                     value=':=',
                     lineno=self.lineno,
                     column=self.column
                 )
-
-            if self.current_char is '<' and self.peek() is '>':
                 self.advance()
                 self.advance()
-                return Token(
+                return token
+
+            if self.current_char == '<' and self.peek() == '>':
+                token = Token(
                     type=TokenType.NOT_EQUALS,
                     value='<>',
                     lineno=self.lineno,
                     column=self.column
                 )
-
-            if self.current_char is '<' and self.peek() is '=':
                 self.advance()
                 self.advance()
-                return Token(
+                return token
+
+            if self.current_char == '<' and self.peek() == '=':
+                token = Token(
                     type=TokenType.LESS_EQUALS,
                     value='<=',
                     lineno=self.lineno,
                     column=self.column
                 )
-
-            if self.current_char is '>' and self.peek() is '=':
                 self.advance()
                 self.advance()
-                return Token(
+                return token
+
+            if self.current_char == '>' and self.peek() == '=':
+                token = Token(
                     type=TokenType.GREATER_EQUALS,
                     value='>=',
                     lineno=self.lineno,
                     column=self.column
                 )
+                self.advance()
+                self.advance()
+                return token
 
             # single-character token
             try:
@@ -222,3 +250,165 @@ class Tokenizer(object):
                 return token
 
         return Token(TokenType.EOF, None)
+
+    def __iter__(self):
+        """Lazily generate the tokens up to, but excluding, EOF."""
+        token = self.get_next_token()
+        while token.type is not TokenType.EOF:
+            yield token
+            token = self.get_next_token()
+
+
+# single and double character lexemes, e.g. {';': <TokenType.SEMI: ';'>}
+SYMBOLS = {
+    token_type.value: token_type
+    for token_type in TokenType
+    if not token_type.value[0].isalpha()
+}
+
+# one master pattern: leading whitespace is swallowed by every match and
+# the alternatives are tried from left to right, so the double character
+# symbols must come before their single character prefixes
+TOKEN_PATTERN = re.compile(r'''
+    \s*
+    (?:
+        (?P<ID>[^\W\d]\w*)
+      | (?P<SYMBOL>:=|<>|<=|>=|//|[-+*/%=<>();.:,])
+      | (?P<REAL_CONST>\d+\.\d*)
+      | (?P<INTEGER_CONST>\d+)
+      | (?P<COMMENT>\{[^}]*\})
+      | (?P<EOF>\Z)
+      | (?P<ERROR>.)
+    )
+''', re.VERBOSE | re.DOTALL)
+
+
+class RegexTokenizer(object):
+    """
+    RegexTokenizer is a drop-in replacement of Tokenizer which scans the
+    text with a single compiled alternation pattern instead of walking
+    it one character at a time, it produces exactly the same tokens
+    """
+
+    def __init__(self, text):
+        self.source = TextSource(text) if isinstance(text, str) else text
+        # self.text only holds the chunks which are not consumed yet
+        self.text = self.source.read()
+        # self.pos is the index of the first character not consumed yet
+        self.pos = 0
+        self.lineno = 1
+        # index of the first character of the current line in self.text,
+        # negative once the line started in an already dropped chunk
+        self.line_start = 0
+        self.__records = self.scan()
+        self.__tokens = (Token(*record) for record in self.__records)
+
+    @property
+    def current_char(self):
+        """The character right after the last returned token, as in Tokenizer."""
+        if self.pos < len(self.text):
+            return self.text[self.pos]
+        return None
+
+    def error(self, lexeme, pos):
+        s = "Lexer error on '{lexeme}' line: {lineno} column: {column}".format(
+            lexeme=lexeme,
+            lineno=self.lineno,
+            column=pos - self.line_start + 1,
+        )
+        raise LexerError(message=s)
+
+    def fill(self, cut: int) -> bool:
+        """Drop the text before `cut` and append the next chunk of the source."""
+        chunk = self.source.read()
+        if not chunk:
+            return False
+        self.text = self.text[cut:] + chunk
+        self.pos -= cut
+        self.line_start -= cut
+        return True
+
+    def scan(self):
+        """Generate (type, value, lineno, column) records of all the tokens, EOF excluded."""
+        symbols = SYMBOLS
+        keywords = RESERVED_KEYWORDS
+        source = self.source
+        text = self.text
+        lineno = self.lineno
+        line_start = self.line_start
+        # newlines are located lazily, only when a token lies past them
+        next_newline = text.find('\n')
+        pos = 0
+        while True:
+            for match in TOKEN_PATTERN.finditer(text, pos):
+                kind = match.lastgroup
+                start = match.start(kind)
+                if start > next_newline >= 0:
+                    while start > next_newline >= 0:
+                        lineno += 1
+                        line_start = next_newline + 1
+                        next_newline = text.find('\n', line_start)
+                    self.lineno = lineno
+                    self.line_start = line_start
+                pos = match.end()
+                if not source.exhausted and (pos == len(text) or match.group(kind) == '{'):
+                    # the lexeme (or the comment) may go on in the next chunk,
+                    # scan it again once the chunk is appended
+                    pos = match.start()
+                    break
+                self.pos = pos
+                column = start - line_start + 1
+
+                if kind == 'ID':
+                    value = match.group(kind)
+                    token_type = keywords.get(value.upper())
+                    if token_type is None:
+                        yield TokenType.ID, value, lineno, column
+                    else:
+                        yield token_type, token_type.value, lineno, column
+                elif kind == 'SYMBOL':
+                    value = match.group(kind)
+                    yield symbols[value], value, lineno, column
+                elif kind == 'INTEGER_CONST':
+                    yield TokenType.INTEGER_CONST, int(match.group(kind)), lineno, column
+                elif kind == 'REAL_CONST':
+                    yield TokenType.REAL_CONST, float(match.group(kind)), lineno, column
+                elif kind == 'COMMENT':
+                    continue
+                elif kind == 'EOF':
+                    return
+                elif match.group(kind) == '{':
+                    raise LexerError(message='Unclosed comment')
+                else:
+                    self.error(match.group(kind), start)
+            else:
+                return
+
+            # keep the text from the end of the last returned token on
+            cut = self.pos
+            if self.fill(cut):
+                text = self.text
+                pos -= cut
+                line_start = self.line_start
+                # the newlines before line_start are counted already
+                next_newline = text.find('\n', max(line_start, 0))
+
+    def get_next_token(self) -> Token:
+        """Return the next token, EOF once the text is exhausted."""
+        for token in self.__tokens:
+            return token
+        return Token(TokenType.EOF, None)
+
+    def __iter__(self):
+        """Lazily generate the tokens up to, but excluding, EOF."""
+        return self.__tokens
+
+    def records(self):
+        """Lazily generate the tokens as plain (type, value, lineno, column) tuples."""
+        return self.__records
+
+
+TOKENIZERS = {
+    'char': Tokenizer,
+    'regex': RegexTokenizer,
+}
@@ -0,0 +1,49 @@
+# Leveled tracing of the analysis and of the execution of a program
+import sys
+from enum import IntEnum
+
+TRACE_BUFFER_SIZE = 1 << 16
+
+
+class TraceLevel(IntEnum):
+    OFF = 0
+    # the program's ENTER and LEAVE and its frame once it ends
+    SUMMARY = 1
+    # also the ENTER and LEAVE of every procedure and function call
+    CALLS = 2
+    # also the call stack as each call ends and every symbol table operation
+    FULL = 3
+
+
+class Tracer(object):
+    """
+    Tracer writes trace lines to a sink, stdout by default.
+
+    Callers test the level flags before building a message, so the
+    disabled path costs one attribute test and formats nothing:
+
+        if tracer.calls:
+            tracer.write(f'ENTER: PROCEDURE {name}')
+    """
+
+    def __init__(self, level: TraceLevel = TraceLevel.OFF, sink=None):
+        self.level = TraceLevel(level)
+        # a file like object, None writes to the current sys.stdout
+        self.sink = sink
+        self.summary = self.level >= TraceLevel.SUMMARY
+        self.calls = self.level >= TraceLevel.CALLS
+        self.full = self.level >= TraceLevel.FULL
+
+    def write(self, message: str):
+        sink = self.sink if self.sink is not None else sys.stdout
+        sink.write(message)
+        sink.write('\n')
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.flush()
+
+
+def open_trace_file(path: str):
+    """Open a file sink, buffered as full traces write a lot of small lines."""
+    return open(path, 'w', encoding='utf-8', buffering=TRACE_BUFFER_SIZE)
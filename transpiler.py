@@ -0,0 +1,356 @@
+# Translates the checked AST into python source, compiled and run natively
+from typing import List
+
+from astnodes import AST, BinOp, Num, UnaryOp, Compound, Var, Assign, NoOp, Program, Block, VarDecl, \
+    ProcedureDecl, ProcedureCall, Boolean, Condition, Then, Else, FunctionDecl, FunctionCall, WhileLoop, \
+    Continue, Break, declared_variables
+from analysis import calls
+from errors import RuntimeError, ErrorCode
+from tokens import TokenType
+from visitor import Visitor
+
+BINARY_OPERATORS = {
+    TokenType.PLUS: '+',
+    TokenType.MINUS: '-',
+    TokenType.MUL: '*',
+    TokenType.INTEGER_DIV: '//',
+    TokenType.FLOAT_DIV: '/',
+    TokenType.MOD: '%',
+    TokenType.AND: 'and',
+    TokenType.OR: 'or',
+    TokenType.EQUALS: '==',
+    TokenType.NOT_EQUALS: '!=',
+    TokenType.GREATER: '>',
+    TokenType.GREATER_EQUALS: '>=',
+    TokenType.LESS: '<',
+    TokenType.LESS_EQUALS: '<=',
+}
+
+UNARY_OPERATORS = {
+    TokenType.PLUS: '+',
+    TokenType.MINUS: '-',
+    TokenType.NOT: 'not ',
+}
+
+# operators whose result is always a bool, a WHILE on them needs no `is True`
+BOOLEAN_OPERATORS = {
+    TokenType.EQUALS, TokenType.NOT_EQUALS, TokenType.GREATER,
+    TokenType.GREATER_EQUALS, TokenType.LESS, TokenType.LESS_EQUALS,
+}
+
+# binding power of the operators in python, the comparisons chain so
+# one is never the operand of another without parentheses
+PYTHON_POWERS = {
+    TokenType.OR: 1,
+    TokenType.AND: 2,
+    TokenType.EQUALS: 3, TokenType.NOT_EQUALS: 3, TokenType.GREATER: 3,
+    TokenType.GREATER_EQUALS: 3, TokenType.LESS: 3, TokenType.LESS_EQUALS: 3,
+    TokenType.PLUS: 4, TokenType.MINUS: 4,
+    TokenType.MUL: 5, TokenType.INTEGER_DIV: 5, TokenType.FLOAT_DIV: 5, TokenType.MOD: 5,
+}
+COMPARISON_POWER = 3
+
+INDENT = '    '
+
+
+def variable(name: str) -> str:
+    """Python name of a pascal variable, prefixed so it can't clash with python's names."""
+    return f'v_{name}'
+
+
+def routine(name: str) -> str:
+    """Python name of a pascal procedure or function."""
+    return f'f_{name}'
+
+
+# operators which may raise on the values they are given
+DIVIDING_OPERATORS = (TokenType.INTEGER_DIV, TokenType.FLOAT_DIV, TokenType.MOD)
+
+
+def cannot_fail(node: AST) -> bool:
+    """Whether evaluating the expression neither calls a function, which may have side
+    effects, nor divides, which may raise."""
+    if isinstance(node, (Num, Boolean, Var)):
+        return True
+    if isinstance(node, BinOp):
+        return node.op.type not in DIVIDING_OPERATORS and cannot_fail(node.left) and cannot_fail(node.right)
+    if isinstance(node, UnaryOp):
+        return cannot_fail(node.factor)
+    return False
+
+
+def both_operands(node: BinOp) -> bool:
+    """Whether the AND or OR is translated to a call evaluating both of its operands."""
+    return node.op.type in (TokenType.AND, TokenType.OR) and not cannot_fail(node.right)
+
+
+# AND and OR evaluate both their operands in Interpreter.visit_binop,
+# calling a function or raising does as well where python's operators would not,
+# a chain of them is one call so its parentheses do not nest
+def both_and(*operands):
+    for operand in operands:
+        if not operand:
+            return operand
+    return operand
+
+
+def both_or(*operands):
+    for operand in operands:
+        if operand:
+            return operand
+    return operand
+
+
+class Routine(object):
+    """State of the procedure or function whose body is being translated"""
+
+    def __init__(self, locals: set, header: int, params=()):
+        # python names bound in the routine's own scope
+        self.locals = locals
+        self.params = params
+        # index of the line the nonlocal declaration goes to
+        self.header = header
+        # names assigned in the body but bound in an enclosing scope
+        self.nonlocals = set()
+
+
+class Transpiler(Visitor):
+    """
+    Transpiler translates a checked AST into the source of a python
+    function returning the program's globals: WHILE loops become python
+    loops, procedures and functions nested python functions which reach
+    the variables of the enclosing routines through closures.
+
+    Statements append lines to the source, expressions return their code
+    """
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.depth = 0
+        self.routine: Routine = None
+        # tokens of the functions, reported when one misses its return value
+        self.tokens = []
+
+    def transpile(self, node: Program) -> str:
+        """Return the python source of the program, a function named program."""
+        self.visit(node)
+        return '\n'.join(self.lines) + '\n'
+
+    def compile(self, node: Program):
+        """Compile the program, the returned function runs it and returns its globals."""
+        source = self.transpile(node)
+        namespace = {
+            'missing_return': self.missing_return,
+            'both_and': both_and,
+            'both_or': both_or,
+        }
+        exec(compile(source, f'<pascal program {node.name}>', 'exec'), namespace)
+        return namespace['program']
+
+    def missing_return(self, index: int):
+        token = self.tokens[index]
+        raise RuntimeError(
+            error_code=ErrorCode.MISSING_RETURN,
+            token=token,
+            message=f'{ErrorCode.MISSING_RETURN.value} -> {token}',
+        )
+
+    def emit(self, line: str):
+        self.lines.append(INDENT * self.depth + line)
+
+    def emit_body(self, node: AST):
+        """Emit the statements of an indented python block, never an empty one."""
+        self.depth += 1
+        length = len(self.lines)
+        self.visit(node)
+        if len(self.lines) == length:
+            self.emit('pass')
+        self.depth -= 1
+
+    def begin_routine(self, header: str, names: List[str], params=()) -> Routine:
+        self.emit(header)
+        self.depth += 1
+        enclosing = self.routine
+        self.routine = Routine(set(names), header=len(self.lines), params=params)
+        self.lines.append(None)
+        return enclosing
+
+    def begin_tail_loop(self, node: AST) -> bool:
+        """Loop over the body of a routine calling itself last, each of its tail calls starts it over."""
+        if not any(call.tail for call in calls(node.block.compound_statement)):
+            return False
+        self.emit('while True:')
+        self.depth += 1
+        return True
+
+    def tail_call(self, actual_params: List[AST]):
+        # the arguments are all computed before the parameters change
+        params = self.routine.params
+        if params:
+            self.emit(f'{", ".join(params)} = {", ".join(self.visit(param) for param in actual_params)}')
+        self.emit('continue')
+
+    def end_routine(self, enclosing: Routine):
+        nonlocals = sorted(self.routine.nonlocals)
+        if nonlocals:
+            self.lines[self.routine.header] = INDENT * self.depth + 'nonlocal ' + ', '.join(nonlocals)
+        else:
+            del self.lines[self.routine.header]
+        self.depth -= 1
+        self.routine = enclosing
+
+    def visit_program(self, node: Program):
+        names = [variable(name) for name in declared_variables(node.block)]
+        enclosing = self.begin_routine('def program():', names)
+        self.visit(node.block)
+        items = ', '.join(f'{name!r}: {variable(name)}' for name in declared_variables(node.block, temporaries=False))
+        self.emit(f'return {{{items}}}')
+        self.end_routine(enclosing)
+
+    def visit_block(self, node: Block):
+        for declaration in node.declarations:
+            self.visit(declaration)
+        self.visit(node.compound_statement)
+
+    def visit_vardecl(self, node: VarDecl):
+        self.emit(f'{variable(node.var_node.name)} = None')
+
+    def visit_procdecl(self, node: ProcedureDecl):
+        params = [variable(param.var_node.name) for param in node.params]
+        header = f'def {routine(node.token.value)}({", ".join(params)}):'
+        names = params + [variable(name) for name in declared_variables(node.block)]
+        enclosing = self.begin_routine(header, names, params)
+        length = len(self.lines)
+        if self.begin_tail_loop(node):
+            # the block declares the variables again, as a new call would
+            self.visit(node.block)
+            self.emit('return')
+            self.depth -= 1
+        else:
+            self.visit(node.block)
+        if len(self.lines) == length:
+            self.emit('pass')
+        self.end_routine(enclosing)
+
+    def visit_funcdecl(self, node: FunctionDecl):
+        name = node.token.value
+        params = [variable(param.var_node.name) for param in node.params]
+        header = f'def {routine(name)}({", ".join(params)}):'
+        # the function's name is its result variable inside its body
+        result = variable(name)
+        names = params + [variable(name) for name in declared_variables(node.block)] + [result]
+        enclosing = self.begin_routine(header, names, params)
+        tail_loop = self.begin_tail_loop(node)
+        self.emit(f'{result} = None')
+        self.visit(node.block)
+        self.emit(f'if {result} is None:')
+        self.emit(f'{INDENT}missing_return({len(self.tokens)})')
+        self.tokens.append(node.token)
+        self.emit(f'return {result}')
+        if tail_loop:
+            self.depth -= 1
+        self.end_routine(enclosing)
+
+    def visit_compound(self, node: Compound):
+        for child in node.childrens:
+            self.visit(child)
+
+    def visit_noop(self, node: NoOp):
+        pass
+
+    def visit_assign(self, node: Assign):
+        if isinstance(node.right, FunctionCall) and node.right.tail:
+            self.tail_call(node.right.actual_params)
+            return
+        name = variable(node.left.name)
+        if name not in self.routine.locals:
+            self.routine.nonlocals.add(name)
+        self.emit(f'{name} = {self.visit(node.right)}')
+
+    def visit_proccall(self, node: ProcedureCall):
+        if node.tail:
+            self.tail_call(node.actual_params)
+            return
+        self.emit(self.call(node.proc_name, node.actual_params))
+
+    def visit_funccall(self, node: FunctionCall):
+        return self.call(node.func_name, node.actual_params)
+
+    def call(self, name: str, actual_params: List[AST]) -> str:
+        return f'{routine(name)}({", ".join(self.visit(param) for param in actual_params)})'
+
+    def visit_condition(self, node: Condition):
+        self.emit(f'if {self.visit(node.condition_node)}:')
+        self.emit_body(node.then_node)
+        if node.else_node is not None:
+            self.emit('else:')
+            self.emit_body(node.else_node)
+
+    def visit_then(self, node: Then):
+        self.visit(node.child)
+
+    def visit_else(self, node: Else):
+        self.visit(node.child)
+
+    def visit_while(self, node: WhileLoop):
+        condition = node.conditon_node
+        code = self.visit(condition)
+        if not (isinstance(condition, Boolean) or
+                isinstance(condition, BinOp) and condition.op.type in BOOLEAN_OPERATORS or
+                isinstance(condition, UnaryOp) and condition.op.type is TokenType.NOT):
+            # the tree walker only goes on while the condition is exactly True
+            code = f'({code}) is True'
+        self.emit(f'while {code}:')
+        self.emit_body(node.body_node)
+
+    def visit_continue(self, node: Continue):
+        self.emit('continue')
+
+    def visit_break(self, node: Break):
+        self.emit('break')
+
+    def visit_binop(self, node: BinOp):
+        op = BINARY_OPERATORS[node.op.type]
+        if both_operands(node):
+            # python could skip the right operand, its calls' side effects and its errors
+            return f'both_{op}({", ".join(self.both_operands(node))})'
+        power = PYTHON_POWERS[node.op.type]
+        left = self.operand(node.left, power, left=True)
+        right = self.operand(node.right, power, left=False)
+        return f'{left} {op} {right}'
+
+    def both_operands(self, node: BinOp) -> List[str]:
+        """Translate the operands of a chain of the same AND or OR, left to right."""
+        operands = []
+        while isinstance(node.left, BinOp) and node.left.op.type == node.op.type and both_operands(node.left):
+            operands.append(node.right)
+            node = node.left
+        operands += (node.right, node.left)
+        return [self.visit(operand) for operand in reversed(operands)]
+
+    def operand(self, node: AST, power: int, left: bool) -> str:
+        """Translate an operand, in parentheses unless python would group it alike without them."""
+        code = self.visit(node)
+        if not isinstance(node, BinOp) or both_operands(node):
+            return code
+        operand_power = PYTHON_POWERS[node.op.type]
+        # a long chain of left associative operators nests no parentheses,
+        # python refuses more than 200 of them
+        if operand_power > power or operand_power == power and left and power != COMPARISON_POWER:
+            return code
+        return f'({code})'
+
+    def visit_unaryop(self, node: UnaryOp):
+        factor = self.visit(node.factor)
+        if isinstance(node.factor, BinOp) and not both_operands(node.factor):
+            factor = f'({factor})'
+        return f'({UNARY_OPERATORS[node.op.type]}{factor})'
+
+    def visit_num(self, node: Num):
+        return repr(node.value)
+
+    def visit_boolean(self, node: Boolean):
+        return repr(node.value)
+
+    def visit_var(self, node: Var):
+        return variable(node.name)
@@ -3,57 +3,62 @@ from astnodes import AST, BinOp, Num, UnaryOp, Compound, Var, Assign, NoOp, \
     FunctionDecl, WhileLoop, Continue, Break
 
 
+# visitor method handling each kind of node
+VISIT_METHODS = {
+    BinOp: 'visit_binop',
+    Num: 'visit_num',
+    Boolean: 'visit_boolean',
+    UnaryOp: 'visit_unaryop',
+    Compound: 'visit_compound',
+    Var: 'visit_var',
+    Assign: 'visit_assign',
+    NoOp: 'visit_noop',
+    Program: 'visit_program',
+    Block: 'visit_block',
+    VarDecl: 'visit_vardecl',
+    Type: 'visit_type',
+    ProcedureDecl: 'visit_procdecl',
+    ProcedureCall: 'visit_proccall',
+    FunctionDecl: 'visit_funcdecl',
+    FunctionCall: 'visit_funccall',
+    Condition: 'visit_condition',
+    Then: 'visit_then',
+    Else: 'visit_else',
+    WhileLoop: 'visit_while',
+    Continue: 'visit_continue',
+    Break: 'visit_break',
+}
+
+
 class Visitor(object):
     """
     Visitor is common base class to visit abstract syntax tree
     each concrete visitor should implement its visit method
     """
 
+    # node class -> visit function, filled lazily for each visitor class
+    __dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.__dispatch = {}
+
     def visit(self, node: AST):
-        if isinstance(node, BinOp):
-            return self.visit_binop(node)
-        elif isinstance(node, Num):
-            return self.visit_num(node)
-        elif isinstance(node, UnaryOp):
-            return self.visit_unaryop(node)
-        elif isinstance(node, Compound):
-            return self.visit_compound(node)
-        elif isinstance(node, Var):
-            return self.visit_var(node)
-        elif isinstance(node, Assign):
-            return self.visit_assign(node)
-        elif isinstance(node, NoOp):
-            return self.visit_noop(node)
-        elif isinstance(node, Program):
-            return self.visit_program(node)
-        elif isinstance(node, Block):
-            return self.visit_block(node)
-        elif isinstance(node, VarDecl):
-            return self.visit_vardecl(node)
-        elif isinstance(node, Type):
-            return self.visit_type(node)
-        elif isinstance(node, ProcedureDecl):
-            return self.visit_procdecl(node)
-        elif isinstance(node, ProcedureCall):
-            return self.visit_proccall(node)
-        elif isinstance(node, FunctionDecl):
-            return self.visit_funcdecl(node)
-        elif isinstance(node, FunctionCall):
-            return self.visit_funccall(node)
-        elif isinstance(node, Condition):
-            return self.visit_condition(node)
-        elif isinstance(node, Then):
-            return self.visit_then(node)
-        elif isinstance(node, Else):
-            return self.visit_else(node)
-        elif isinstance(node, WhileLoop):
-            return self.visit_while(node)
-        elif isinstance(node, Continue):
-            return self.visit_continue(node)
-        elif isinstance(node, Break):
-            return self.visit_break(node)
-        else:
-            raise Exception("Invalid AST node: %s" % node)
+        try:
+            method = self.__dispatch[node.__class__]
+        except KeyError:
+            method = self.__resolve(node)
+        return method(self, node)
+
+    @classmethod
+    def __resolve(cls, node: AST):
+        """Find the visit method of the node's class, or of its closest base."""
+        for node_class in type(node).__mro__:
+            name = VISIT_METHODS.get(node_class)
+            if name is not None:
+                method = cls.__dispatch[type(node)] = getattr(cls, name)
+                return method
+        raise Exception("Invalid AST node: %s" % node)
 
     def visit_binop(self, node: BinOp):
         pass
@@ -0,0 +1,189 @@
+# Stack based virtual machine running the bytecode of bytecode.Compiler
+from bytecode import Module, Opcode, LEVEL_BITS, LEVEL_MASK
+from budget import Budget
+from errors import RuntimeError, ErrorCode
+
+LOAD_CONST = Opcode.LOAD_CONST.value
+LOAD_LOCAL = Opcode.LOAD_LOCAL.value
+STORE_LOCAL = Opcode.STORE_LOCAL.value
+LOAD_NONLOCAL = Opcode.LOAD_NONLOCAL.value
+STORE_NONLOCAL = Opcode.STORE_NONLOCAL.value
+ADD = Opcode.ADD.value
+SUB = Opcode.SUB.value
+MUL = Opcode.MUL.value
+INTEGER_DIV = Opcode.INTEGER_DIV.value
+FLOAT_DIV = Opcode.FLOAT_DIV.value
+MOD = Opcode.MOD.value
+AND = Opcode.AND.value
+OR = Opcode.OR.value
+EQUALS = Opcode.EQUALS.value
+NOT_EQUALS = Opcode.NOT_EQUALS.value
+GREATER = Opcode.GREATER.value
+GREATER_EQUALS = Opcode.GREATER_EQUALS.value
+LESS = Opcode.LESS.value
+LESS_EQUALS = Opcode.LESS_EQUALS.value
+POS = Opcode.POS.value
+NEG = Opcode.NEG.value
+NOT = Opcode.NOT.value
+JUMP = Opcode.JUMP.value
+POP_JUMP_IF_FALSE = Opcode.POP_JUMP_IF_FALSE.value
+POP_JUMP_IF_NOT_TRUE = Opcode.POP_JUMP_IF_NOT_TRUE.value
+CALL = Opcode.CALL.value
+RETURN = Opcode.RETURN.value
+RETURN_VALUE = Opcode.RETURN_VALUE.value
+
+
+class VirtualMachine(object):
+    """
+    VirtualMachine executes a compiled Module in a single dispatch loop.
+
+    A frame is a plain list of local slots. Calls never recurse in python:
+    the caller's state is saved on an explicit frame stack, and
+    display[level] holds the innermost active frame of every lexical
+    scope level, which is how nonlocal variables are reached
+    """
+
+    def __init__(self, module: Module, budget: Budget = None):
+        self.module = module
+        # limits of the run, None runs without any
+        self.budget = budget
+
+    def error(self, error_code: ErrorCode, token):
+        raise RuntimeError(
+            error_code=error_code,
+            token=token,
+            message=f'{error_code.value} -> {token}',
+        )
+
+    def run(self) -> dict:
+        """Run the program and return the final values of its global variables."""
+        routines = self.module.routines
+        # the instructions are unpacked to (opcode, operand) pairs, one index per dispatch
+        codes = [
+            list(zip(routine.instructions[::2], routine.instructions[1::2]))
+            for routine in routines
+        ]
+        constants = self.module.constants
+        program = routines[0]
+
+        display = [None] * (max(routine.level for routine in routines) + 1)
+        frames = []
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        budget = self.budget
+        routine = program
+        code = codes[0]
+        local_slots = display[program.level] = [None] * program.local_count
+        if budget is not None:
+            budget.enter(program.local_count, program.name)
+        pc = 0
+        while True:
+            opcode, operand = code[pc]
+            pc += 1
+            if opcode == LOAD_LOCAL:
+                push(local_slots[operand])
+            elif opcode == LOAD_CONST:
+                push(constants[operand])
+            elif opcode == STORE_LOCAL:
+                local_slots[operand] = pop()
+            elif opcode == LOAD_NONLOCAL:
+                push(display[operand & LEVEL_MASK][operand >> LEVEL_BITS])
+            elif opcode == STORE_NONLOCAL:
+                display[operand & LEVEL_MASK][operand >> LEVEL_BITS] = pop()
+            elif opcode == JUMP:
+                pc = operand
+            elif opcode == POP_JUMP_IF_NOT_TRUE:
+                if pop() is not True:
+                    pc = operand
+                elif budget is not None:
+                    # the condition of a loop held, another iteration starts
+                    budget.step(routine.name)
+            elif opcode == POP_JUMP_IF_FALSE:
+                if not pop():
+                    pc = operand
+            elif opcode == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif opcode == SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif opcode == MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif opcode == LESS:
+                right = pop()
+                stack[-1] = stack[-1] < right
+            elif opcode == LESS_EQUALS:
+                right = pop()
+                stack[-1] = stack[-1] <= right
+            elif opcode == GREATER:
+                right = pop()
+                stack[-1] = stack[-1] > right
+            elif opcode == GREATER_EQUALS:
+                right = pop()
+                stack[-1] = stack[-1] >= right
+            elif opcode == EQUALS:
+                right = pop()
+                stack[-1] = stack[-1] == right
+            elif opcode == NOT_EQUALS:
+                right = pop()
+                stack[-1] = stack[-1] != right
+            elif opcode == MOD:
+                right = pop()
+                stack[-1] = stack[-1] % right
+            elif opcode == INTEGER_DIV:
+                right = pop()
+                stack[-1] = stack[-1] // right
+            elif opcode == FLOAT_DIV:
+                right = pop()
+                stack[-1] = stack[-1] / right
+            elif opcode == AND:
+                right = pop()
+                stack[-1] = stack[-1] and right
+            elif opcode == OR:
+                right = pop()
+                stack[-1] = stack[-1] or right
+            elif opcode == NEG:
+                stack[-1] = -stack[-1]
+            elif opcode == POS:
+                stack[-1] = +stack[-1]
+            elif opcode == NOT:
+                stack[-1] = not stack[-1]
+            elif opcode == CALL:
+                callee = routines[operand]
+                slots = [None] * callee.local_count
+                count = callee.param_count
+                if count:
+                    slots[:count] = stack[-count:]
+                    del stack[-count:]
+                if budget is not None:
+                    budget.enter(callee.local_count, callee.name)
+                level = callee.level
+                frames.append((routine, code, pc, local_slots, display[level]))
+                display[level] = local_slots = slots
+                routine = callee
+                code = codes[operand]
+                pc = 0
+            elif opcode == RETURN_VALUE:
+                result = local_slots[routine.result_slot]
+                if result is None:
+                    self.error(error_code=ErrorCode.MISSING_RETURN, token=routine.token)
+                push(result)
+                if budget is not None:
+                    budget.leave(routine.local_count)
+                level = routine.level
+                routine, code, pc, local_slots, display[level] = frames.pop()
+            elif opcode == RETURN:
+                if budget is not None:
+                    budget.leave(routine.local_count)
+                if not frames:
+                    break
+                level = routine.level
+                routine, code, pc, local_slots, display[level] = frames.pop()
+            else:
+                raise ValueError(f'invalid opcode {opcode} at {pc - 1} in {routine.name}')
+
+        values = dict(zip(program.local_names, local_slots))
+        return {name: values[name] for name in self.module.variables}